@@ -1,40 +1,134 @@
+import os
 import re
+import io
+import mmap
+import struct
+import hashlib
+import csv
 import json
-import yaml
-import psycopg2
-from psycopg2 import sql
+import time
+import heapq
+import textwrap
+import threading
+import shutil
 from typing import List
 from abc import ABC, abstractmethod
-from psycopg2.extras import DictCursor
-
-class BaseClientShortInfo:
-    def __init__(self, client_id, fullname, document):
-        self.set_id(client_id)
-        self.set_fullname(fullname)
-        self.set_document(document)
+from contextlib import contextmanager
+from cache import ClientCache
+from search import ClientSearchIndex, PostgresClientSearch
+from sorting import SortedViews, parse_sort_keys, order_by_sql
+
+class ClientValidator:
+    """Проверка полей клиента по заранее скомпилированным шаблонам, в том числе сразу для пачки записей."""
+    DOCUMENT_PATTERN = re.compile(r'\d{4} \d{6}')
+    PHONE_PATTERN = re.compile(r'((8|\+7)[\- ]?)?(\(?\d{3}\)?[\- ]?)?[\d\- ]{7,10}')
+    EMAIL_PATTERN = re.compile(r'(.+)@(.+)\.(.+)')
+    REQUIRED_FIELDS = ('client_id', 'fullname', 'document')
+    OPTIONAL_FIELDS = ('age', 'phone_number', 'address', 'email')
+    # Верхняя граница одинакова для всех хранилищ; двоичное хранит возраст в 16 битах
+    MAX_AGE = 150
 
     @staticmethod
-    def __validate_client_id(client_id):
+    def check_client_id(client_id):
         if not isinstance(client_id, int) or client_id <= 0:
-            raise ValueError("ID клиента должен быть положительным целым числом.")
-        return client_id
+            return "ID клиента должен быть положительным целым числом."
 
     @staticmethod
-    def __validate_fullname(fullname):
+    def check_fullname(fullname):
         if not isinstance(fullname, str) or len(fullname) == 0:
-            raise ValueError("ФИО введено неверно (не может быть пустым значением, должны быть только буквы).")
-        return fullname
+            return "ФИО введено неверно (не может быть пустым значением, должны быть только буквы)."
+
+    @classmethod
+    def check_document(cls, document):
+        if not isinstance(document, str) or not cls.DOCUMENT_PATTERN.fullmatch(document):
+            return 'Неверные данные паспорта (документа).'
+
+    @classmethod
+    def check_age(cls, age):
+        if not isinstance(age, int) or age <= 18:
+            return "Вы должны быть старше 18 лет, чтобы использовать эту услугу."
+        if age > cls.MAX_AGE:
+            return f"Возраст указан неверно (больше {cls.MAX_AGE} лет)."
+
+    @classmethod
+    def check_phone_number(cls, phone_number):
+        if not isinstance(phone_number, str) or not cls.PHONE_PATTERN.fullmatch(phone_number):
+            return "Номер телефона введен неверно."
 
     @staticmethod
-    def __validate_document(document):
-        if not isinstance(document, str) or not re.fullmatch(r'\d{4} \d{6}', document):
-            raise ValueError('Неверные данные паспорта (документа).')
-        return document
-    
+    def check_address(address):
+        if not isinstance(address, str) or not address.strip():
+            return "Address должно быть непустой строкой."
+
+    @classmethod
+    def check_email(cls, email):
+        if not isinstance(email, str) or not cls.EMAIL_PATTERN.fullmatch(email):
+            return "Электронная почта введена неверно."
+
+    @classmethod
+    def check(cls, field, value):
+        """Возвращает значение или бросает ValueError с текстом ошибки поля."""
+        error = getattr(cls, f'check_{field}')(value)
+        if error:
+            raise ValueError(error)
+        return value
+
+    @classmethod
+    def validate(cls, record):
+        """Проверяет словарь клиента целиком и возвращает {поле: ошибка} (пустой, если ошибок нет)."""
+        if not isinstance(record, dict):
+            return {'record': "Запись клиента должна быть словарём."}
+        errors = {}
+        for field in cls.REQUIRED_FIELDS:
+            if field not in record:
+                errors[field] = "Отсутствует обязательное поле."
+                continue
+            error = getattr(cls, f'check_{field}')(record[field])
+            if error:
+                errors[field] = error
+        for field in cls.OPTIONAL_FIELDS:
+            # Пустые необязательные поля допустимы, как и в конструкторе BaseClient
+            value = record.get(field)
+            if value:
+                error = getattr(cls, f'check_{field}')(value)
+                if error:
+                    errors[field] = error
+        return errors
+
+    @classmethod
+    def validate_batch(cls, records):
+        """Проверяет все записи, не останавливаясь на первой ошибке; корректные сразу превращает в клиентов."""
+        report = ValidationReport()
+        for index, record in enumerate(records):
+            errors = cls.validate(record)
+            if errors:
+                report.errors[index] = errors
+            else:
+                report.clients.append(BaseClient.from_dict(record, validate=False))
+        return report
+
+class ValidationReport:
+    def __init__(self):
+        self.clients = []
+        # номер записи -> {поле: ошибка}
+        self.errors = {}
+
+    def is_valid(self):
+        return not self.errors
+
+class BaseClientShortInfo:
+    # Без __dict__: при миллионах клиентов это заметная экономия памяти
+    __slots__ = ('__client_id', '__fullname', '__document')
+
+    def __init__(self, client_id, fullname, document):
+        self.set_id(client_id)
+        self.set_fullname(fullname)
+        self.set_document(document)
+
     @staticmethod
     def from_string(data_str):
         try:
-            data = data_str.split(',')
+            data = next(csv.reader([data_str]))
             if len(data) != 3:
                 raise ValueError("Неверное количество полей в строке.")
             
@@ -42,7 +136,7 @@ class BaseClientShortInfo:
             fullname = data[1].strip()
             document = data[2].strip()
             
-            return BaseClient(client_id, fullname, document)
+            return BaseClientShortInfo(client_id, fullname, document)
         except Exception as e:
             raise ValueError(f"Ошибка при разборе данных клиента: {e}")
         
@@ -56,33 +150,45 @@ class BaseClientShortInfo:
         return self.__document
     
     def set_id(self, client_id):
-        self.__client_id = self.__validate_client_id(client_id)
+        self.__client_id = ClientValidator.check('client_id', client_id)
 
     def set_fullname(self, fullname):
-        self.__fullname = self.__validate_fullname(fullname)
+        self.__fullname = ClientValidator.check('fullname', fullname)
 
     def set_document(self, document):
-        self.__document = self.__validate_document(document)
+        self.__document = ClientValidator.check('document', document)
+
+    @classmethod
+    def from_trusted(cls, client_id, fullname, document):
+        """Создаёт объект без проверки полей — для уже проверенных данных, например строк из БД."""
+        info = cls.__new__(cls)
+        info.__client_id = client_id
+        info.__fullname = fullname
+        info.__document = document
+        return info
         
     def __eq__(self, other):
-        if isinstance(other, BaseClientShortInfo):
-            return (self.__client_id == other.__client_id and
-                    self.__fullname == other.__fullname and
-                    self.__document == other.__document)
-        return False
+        # Только объекты одного класса: иначе short == full и full == short давали бы разный ответ
+        if type(self) is not type(other):
+            return NotImplemented
+        return (self.__client_id == other.__client_id and
+                self.__fullname == other.__fullname and
+                self.__document == other.__document)
     
     def __str__(self):
         return f"Client short info [ID: {self.__client_id}, FIO: {self.__fullname}, Document: {self.__document}]"
 
     def __hash__(self):
-        return hash(self.get_fullname()) + hash(self.get_client_id()) + hash(self.get_document())
+        return hash((self.__client_id, self.__fullname, self.__document))
+
+class BaseClient(BaseClientShortInfo):
+    __slots__ = ('__age', '__phone_number', '__address', '__email')
 
-class BaseClient:
     def __init__(self, client_id, fullname, document, age=None, phone_number=None, address=None, email=None, short_info=None):
         if short_info:
-            self.short_info = short_info
-        else:
-            self.short_info = BaseClientShortInfo(client_id, fullname, document)
+            client_id, fullname, document = short_info.get_client_id(), short_info.get_fullname(), short_info.get_document()
+        super().__init__(client_id, fullname, document)
+        self.__age = self.__phone_number = self.__address = self.__email = None
         if phone_number:
             self.set_phone_number(phone_number)
         if address:
@@ -92,54 +198,36 @@ class BaseClient:
         if age:
             self.set_age(age)
             
-    @staticmethod
-    def __validate_non_empty_string(value, field_name):
-        if isinstance(value, str) and value.strip():
-            return value
-        raise ValueError(f"{field_name} должно быть непустой строкой.")
-
-    @staticmethod
-    def __validate_phone_number(phone_number):
-        if not isinstance(phone_number, str) or not re.fullmatch(r'((8|\+7)[\- ]?)?(\(?\d{3}\)?[\- ]?)?[\d\- ]{7,10}', phone_number):
-            raise ValueError("Номер телефона введен неверно.")
-        return phone_number
-    
-    @staticmethod
-    def __validate_age(age):
-        if not isinstance(age, int) or age <= 18:
-            raise ValueError("Вы должны быть старше 18 лет, чтобы использовать эту услугу.")
-        return age
-
-    @staticmethod
-    def __validate_email(email):
-        if not isinstance(email, str) or not re.fullmatch(r'(.+)@(.+)\.(.+)', email):
-            raise ValueError("Электронная почта введена неверно.")
-        return email
-
     @staticmethod
     def from_string(data_str):
         try:
-            data = data_str.split(',')
+            data = next(csv.reader([data_str]))
             if len(data) != 7:
                 raise ValueError("Неверное количество полей в строке.")
             
             client_id = int(data[0].strip())
             fullname = data[1].strip()
             document = data[2].strip()
-            age = data[3].strip()
+            age = int(data[3].strip()) if data[3].strip() else None
             phone_number = data[4].strip()
             address = data[5].strip()
             email = data[6].strip()
             
-            return BaseClient(client_id, fullname, document, age, phone_number, address, email)
+            record = {'client_id': client_id, 'fullname': fullname, 'document': document, 'age': age,
+                      'phone_number': phone_number, 'address': address, 'email': email}
+            errors = ClientValidator.validate(record)
+            if errors:
+                raise ValueError(' '.join(errors.values()))
+            return BaseClient.from_dict(record, validate=False)
         except Exception as e:
             raise ValueError(f"Ошибка при разборе данных клиента: {e}")
         
     @staticmethod
-    def from_dict(data: dict):
-        return BaseClient(
-            data['client_id'], data['fullname'], data['document'], data['age'], 
-            data['phone_number'], data['address'], data['email'],)
+    def from_dict(data: dict, validate=True):
+        factory = BaseClient if validate else BaseClient.from_trusted
+        return factory(
+            data['client_id'], data['fullname'], data['document'], data.get('age'),
+            data.get('phone_number'), data.get('address'), data.get('email'))
         
     def to_dict(self):
         return {
@@ -152,15 +240,6 @@ class BaseClient:
             'email': self.get_email()
         }
 
-    def get_client_id(self):
-        return self.short_info.get_client_id()
-
-    def get_fullname(self):
-        return self.short_info.get_fullname()
-
-    def get_document(self):
-        return self.short_info.get_document()
-    
     def get_age(self):
         return self.__age
 
@@ -174,17 +253,30 @@ class BaseClient:
         return self.__phone_number
     
     def set_age(self, age):
-        self.__age = self.__validate_age(age)
+        self.__age = ClientValidator.check('age', age)
 
     def set_address(self, address):
-        self.__address = self.__validate_non_empty_string(address, "Address")
+        self.__address = ClientValidator.check('address', address)
 
     def set_email(self, email):
-        self.__email = self.__validate_email(email)
+        self.__email = ClientValidator.check('email', email)
 
     def set_phone_number(self, phone_number):
-        self.__phone_number = self.__validate_phone_number(phone_number)
+        self.__phone_number = ClientValidator.check('phone_number', phone_number)
+
+    @classmethod
+    def from_trusted(cls, client_id, fullname, document, age=None, phone_number=None, address=None, email=None):
+        client = super().from_trusted(client_id, fullname, document)
+        client.__age = age or None
+        client.__phone_number = phone_number or None
+        client.__address = address or None
+        client.__email = email or None
+        return client
     
+    @property
+    def short_info(self):
+        return BaseClientShortInfo(self.get_client_id(), self.get_fullname(), self.get_document())
+
     def get_short_info(self):
         return self.short_info
 
@@ -193,13 +285,10 @@ class BaseClient:
                 f"Document: {self.get_document()}, Age: {self.__age}, Phone_Number: {self.__phone_number}, "
                 f"Address: {self.__address}, Email: {self.__email}]")
 
-    def __eq__(self, other):
-        if isinstance(other, BaseClient):
-            return (self.short_info == other.short_info)
-        return False
-
 class BaseClient_Rep_Strategy(ABC):
-    
+    # Можно ли вызывать методы хранилища из нескольких потоков одновременно
+    THREAD_SAFE = False
+
     @abstractmethod
     def read_all(self):
         pass
@@ -208,128 +297,388 @@ class BaseClient_Rep_Strategy(ABC):
     def save_all(self, data):
         pass
 
+    # Клиенты загружаются при первом обращении, а не в конструкторе
+    _by_id = None
+    # Индекс поиска строится при первом поиске и дальше обновляется вместе с _by_id
+    _search_index = None
+    # Отсортированные представления тоже создаются при первой сортировке и обновляются при изменениях
+    _sorted_views = None
+    # Глубина вложенных batch(); внутри пакета изменения копятся в памяти и сохраняются при выходе
+    _batch_depth = 0
+    _batch_dirty = False
+
     def __init__(self):
-        self.clients = self.read_all()
+        pass
+
+    def _ensure_loaded(self):
+        if self._by_id is None:
+            self.clients = self.read_all()
+
+    @property
+    def clients(self):
+        self._ensure_loaded()
+        if self._clients is None:
+            self._clients = list(self._by_id.values())
+        return self._clients
+
+    @clients.setter
+    def clients(self, clients):
+        """Заменяет набор клиентов и перестраивает индексы за один проход."""
+        self._by_id = {}
+        self._by_document = {}
+        self._max_id = 0
+        self._search_index = None
+        self._sorted_views = None
+        for client in clients:
+            self._index_client(client)
+        self._clients = None
+
+    def _index_client(self, client):
+        client_id = client.get_client_id()
+        previous = self._by_id.get(client_id)
+        self._by_id[client_id] = client
+        self._by_document[client.get_document()] = client_id
+        if client_id > self._max_id:
+            self._max_id = client_id
+        if self._search_index is not None:
+            self._search_index.add(client)
+        if self._sorted_views is not None:
+            if previous is not None:
+                self._sorted_views.remove(previous)
+            self._sorted_views.add(client)
+        self._clients = None
+
+    def _unindex_client(self, client_id):
+        client = self._by_id.pop(client_id, None)
+        if client is not None and self._by_document.get(client.get_document()) == client_id:
+            del self._by_document[client.get_document()]
+        if self._search_index is not None:
+            self._search_index.remove(client_id)
+        if self._sorted_views is not None and client is not None:
+            self._sorted_views.remove(client)
+        self._clients = None
+        return client
 
     def __is_unique(self, document, unverifiable_client_id=None):
-        for client in self.clients:
-            if client.get_client_id() != unverifiable_client_id and client.get_document() == document:
-                return False
-        return True
+        self._ensure_loaded()
+        owner_id = self._by_document.get(document)
+        return owner_id is None or owner_id == unverifiable_client_id
 
     def add_client(self, fullname, document, age, phone_number, address, email):
-        new_id = max([client.get_client_id() for client in self.clients], default=0) + 1
+        self._ensure_loaded()
+        new_id = self._max_id + 1
         if not self.__is_unique(document):
             raise ValueError(f"Client with this document already exists.")
         new_client = BaseClient(new_id, fullname, document, age, phone_number, address, email)
-        self.clients.append(new_client)
-        self.save_all(self.clients)
+        self._index_client(new_client)
+        self._persist(self._persist_add, new_client)
 
     def replace_by_id(self, client_id, new_client):
         if not self.__is_unique(new_client.get_document(), client_id):
             raise ValueError(f"Client with this document already exists.")
-        for i, client in enumerate(self.clients):
-            if client.get_client_id() == client_id:
-                self.clients[i] = new_client
-                self.save_all(self.clients)
-                return True
-        return False
+        if client_id not in self._by_id:
+            return False
+        if new_client.get_client_id() != client_id and new_client.get_client_id() in self._by_id:
+            # Как в BaseClient_Rep_Binary: иначе чужой клиент молча перезаписался бы в индексах
+            raise ValueError("Client with this ID already exists.")
+        if new_client.get_client_id() == client_id:
+            # Сохраняем позицию клиента в списке
+            old_client = self._by_id[client_id]
+            if self._by_document.get(old_client.get_document()) == client_id:
+                del self._by_document[old_client.get_document()]
+        else:
+            self._unindex_client(client_id)
+        self._index_client(new_client)
+        self._persist(self._persist_replace, client_id, new_client)
+        return True
 
     def delete_by_id(self, client_id):
-        self.clients = [client for client in self.clients if client.get_client_id() != client_id]
+        self._ensure_loaded()
+        if self._unindex_client(client_id) is not None:
+            self._persist(self._persist_delete, client_id)
+
+    def add_clients(self, clients):
+        """Добавляет готовых клиентов с их client_id за одну операцию сохранения.
+
+        Возвращает список отклонённых клиентов в виде пар (клиент, причина).
+        """
+        self._ensure_loaded()
+        added, rejected = [], []
+        for client in clients:
+            if client.get_client_id() in self._by_id:
+                rejected.append((client, "Client with this ID already exists."))
+            elif not self.__is_unique(client.get_document()):
+                rejected.append((client, "Client with this document already exists."))
+            else:
+                self._index_client(client)
+                added.append(client)
+        if added:
+            self._persist(self._persist_add_many, added)
+        return rejected
+
+    @contextmanager
+    def batch(self):
+        """Единица работы: изменения внутри блока with сохраняются одной записью при выходе из него.
+
+        Уникальность документа проверяется по состоянию с учётом всех изменений пакета. При исключении
+        изменения отменяются. Вложенный batch() входит во внешний.
+        """
+        self._ensure_loaded()
+        self._batch_depth += 1
+        try:
+            yield self
+            if self._batch_depth == 1 and self._batch_dirty:
+                self._flush_batch()
+        except BaseException:
+            if self._batch_depth == 1:
+                # В хранилище пакет ещё не записан, поэтому достаточно перечитать его
+                self.clients = self.read_all()
+            raise
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._batch_dirty = False
+
+    def _flush_batch(self):
+        self.save_all(self.clients)
+
+    def _persist(self, persist, *args):
+        if self._batch_depth:
+            self._batch_dirty = True
+        else:
+            persist(*args)
+
+    def _persist_add(self, client):
+        self.save_all(self.clients)
+
+    def _persist_add_many(self, clients):
+        self.save_all(self.clients)
+
+    def _persist_replace(self, client_id, client):
+        self.save_all(self.clients)
+
+    def _persist_delete(self, client_id):
         self.save_all(self.clients)
 
     def get_by_id(self, client_id):
-        for client in self.clients:
-            if client.get_client_id() == client_id:
-                return client
-        raise ValueError(f"Client with ID {client_id} not found")
+        self._ensure_loaded()
+        client = self._by_id.get(client_id)
+        if client is None:
+            raise ValueError(f"Client with ID {client_id} not found")
+        return client
 
     def get_k_n_short_list(self, k, n):
         start = (k - 1) * n
         end = start + n
-        return self.clients[start:end]
+        return [client.get_short_info() for client in self.clients[start:end]]
+
+    def get_short_page(self, n, after_id=None):
+        """Возвращает n клиентов с client_id больше after_id в порядке client_id."""
+        self._ensure_loaded()
+        candidates = (client for client_id, client in self._by_id.items() if after_id is None or client_id > after_id)
+        return [client.get_short_info() for client in heapq.nsmallest(n, candidates, key=BaseClient.get_client_id)]
+
+    def search(self, query, limit=10):
+        """До limit клиентов, лучше всего подходящих под query (ФИО, документ или телефон), по убыванию оценки."""
+        self._ensure_loaded()
+        if self._search_index is None:
+            self._search_index = ClientSearchIndex(self._by_id.values())
+        return [self._by_id[client_id] for _, client_id in self._search_index.search(query, limit)]
+
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        """Клиенты по полям fields ('fullname', '-age', ('email', 'desc')), по умолчанию по client_id.
+
+        Строки сравниваются без учёта регистра, «ё» — как «е». Порядок запоминается и
+        поддерживается при изменениях, поэтому следующие страницы не сортируют всё заново.
+        """
+        self._ensure_loaded()
+        if self._sorted_views is None:
+            self._sorted_views = SortedViews()
+        view = self._sorted_views.get(parse_sort_keys(fields), self._by_id.values())
+        return [self._by_id[client_id] for client_id in view.page(offset, limit)]
 
-    def sort_by_field(self):
-        self.clients.sort(key=lambda client: client.client_id)
-        
     def get_count(self):
-        return len(self.clients)
-    
-class DatabaseConnection:
-    _instance = None
-
-    def __new__(cls, db_config):
-        if not cls._instance:
-            cls._instance = super().__new__(cls)
-            cls._instance.connection = None
-            cls._instance.db_config = db_config
-            cls._instance.connect()
-        return cls._instance
-
-    def connect(self):
-        """Устанавливает соединение с базой данных, если оно не активно."""
-        if self.connection is None or self.connection.closed:
-            print("Соединение с базой данных устанавливается...")
-            self.connection = psycopg2.connect(**self.db_config)
-
-    def execute_query(self, query, params=None):
-        self.connect()  # Проверяем соединение перед запросом
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, params or ())
-            self.connection.commit()
-
-    def fetch_all(self, query, params=None):
-        self.connect()  # Проверяем соединение перед запросом
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
-
-    def fetch_one(self, query, params=None):
-        self.connect()  # Проверяем соединение перед запросом
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, params or ())
-            return cursor.fetchone()
-
-    def close(self):
-        """Закрывает соединение с базой данных, если оно активно."""
-        if self.connection is not None and not self.connection.closed:
-            print("Соединение с базой данных закрывается...")
-            self.connection.close()
-
+        self._ensure_loaded()
+        return len(self._by_id)
 
+    def iter_clients(self, batch_size=1000):
+        """Перебирает клиентов по одному; batch_size задаёт размер порции чтения из хранилища."""
+        yield from self.clients
+    
 class BaseClientPostgresRep(BaseClient_Rep_Strategy):
-    def __init__(self, db_config):
-        self.db = DatabaseConnection(db_config)
-        self.clients = self.read_all()
+    THREAD_SAFE = True
+    COLUMNS = "client_id, fullname, document, age, phone_number, address, email"
+    BATCH_SIZE = 1000
+    # Операции (вид, client_id, клиент), накопленные в batch(); None вне пакета
+    _batch = None
+
+    def __init__(self, db_config, validate_rows=False, cache=None, replicas=()):
+        # Драйвер PostgreSQL загружается только при создании хранилища, а не при импорте модуля
+        from database import DatabaseConnection
+        # Чтения, не требующие транзакции, распределяются по репликам replicas
+        self.db = DatabaseConnection(db_config, replicas=replicas)
+        # Кэш строк по client_id общий с ClientModel, работающей с той же базой
+        self.cache = cache or ClientCache.shared(db_config)
+        # Строки из БД уже прошли проверку при записи, повторная проверка по умолчанию не нужна
+        self.validate_rows = validate_rows
+        self.db_config = db_config
+        # (n, k) -> client_id последней строки страницы k при размере страницы n
+        self._page_boundaries = {}
+        # Лента изменений clients (track_changes) и счётчик полученных из неё изменений
+        self._change_feed = None
+        self._changes = 0
+        self.search_engine = PostgresClientSearch(self.db)
+
+    def _row_to_client(self, row):
+        if self.validate_rows:
+            return BaseClient(*row)
+        return BaseClient.from_trusted(*row)
+
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        """Сортировка и постраничная выборка выполняются в БД в том же порядке, что и в файловых хранилищах."""
+        query = f"SELECT {self.COLUMNS} FROM clients ORDER BY {order_by_sql(parse_sort_keys(fields))} LIMIT %s OFFSET %s"
+        return [self._row_to_client(row) for row in self.db.fetch_all(query, (limit, offset))]
+
+    def ensure_search_indexes(self):
+        self.search_engine.ensure_indexes()
+
+    def search(self, query, limit=10):
+        rows = self.search_engine.search(query, limit, self.COLUMNS)
+        return [self._row_to_client(row[:-1]) for row in rows]
+
+    @staticmethod
+    def _client_to_row(client):
+        return (client.get_client_id(), client.get_fullname(), client.get_document(), client.get_age(),
+                client.get_phone_number(), client.get_address(), client.get_email())
 
     def read_all(self):
-        query = "SELECT * FROM clients"
+        query = f"SELECT {self.COLUMNS} FROM clients"
         rows = self.db.fetch_all(query)
-        return [BaseClient(client_id=row[0], fullname=row[1], document=row[2],
-                           age=row[3], phone_number=row[4], address=row[5], email=row[6]) for row in rows]
+        return [self._row_to_client(row) for row in rows]
 
     def save_all(self, data):
-        query = "DELETE FROM clients"
-        self.db.execute_query(query)
-        for client in data:
-            query = """
-                INSERT INTO clients (client_id, fullname, document, age, phone_number, address, email)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            self.db.execute_query(query, (client.get_client_id(), client.get_fullname(), client.get_document(),
-                                          client.get_age(), client.get_phone_number(), client.get_address(),
-                                          client.get_email()))
+        """Приводит таблицу к переданному списку, изменяя только отличающиеся строки, в одной транзакции."""
+        rows = {row[0]: row for row in map(self._client_to_row, data)}
+        self._page_boundaries.clear()
+        with self.db.transaction() as cursor:
+            cursor.execute(f"SELECT {self.COLUMNS} FROM clients FOR UPDATE")
+            existing = {row[0]: tuple(row) for row in cursor.fetchall()}
+            deleted = [client_id for client_id in existing if client_id not in rows]
+            updated = [row for client_id, row in rows.items() if client_id in existing and existing[client_id] != row]
+            inserted = [row for client_id, row in rows.items() if client_id not in existing]
+            self.__write_changes(cursor, deleted, updated, inserted)
+        self.cache.invalidate(*deleted, *(row[0] for row in updated))
+
+    @staticmethod
+    @contextmanager
+    def _deleting_clients():
+        """Удаление клиента, у которого есть залоги (pawnshop.py, ON DELETE RESTRICT), — ValueError, а не
+        ошибка драйвера; транзакция при этом откатывается целиком."""
+        from psycopg2 import errors
+        try:
+            yield
+        except errors.ForeignKeyViolation as e:
+            raise ValueError(f"Client with pawnshop records cannot be deleted: {e.diag.message_detail}") from None
+
+    def __write_changes(self, cursor, deleted, updated, inserted):
+        from psycopg2.extras import execute_values
+        # Сначала удаление, затем обновление и вставка, чтобы освободившиеся документы не конфликтовали
+        if deleted:
+            with self._deleting_clients():
+                cursor.execute("DELETE FROM clients WHERE client_id = ANY(%s)", (deleted,))
+        if updated:
+            execute_values(cursor, f"""
+                UPDATE clients AS c
+                SET fullname = v.fullname, document = v.document, age = v.age,
+                    phone_number = v.phone_number, address = v.address, email = v.email
+                FROM (VALUES %s) AS v({self.COLUMNS})
+                WHERE c.client_id = v.client_id
+            """, updated, template="(%s, %s, %s, %s::integer, %s, %s, %s)", page_size=self.BATCH_SIZE)
+        if inserted:
+            execute_values(cursor, f"INSERT INTO clients ({self.COLUMNS}) VALUES %s",
+                           inserted, page_size=self.BATCH_SIZE)
+
+    @contextmanager
+    def batch(self):
+        """Изменения внутри блока with копятся в памяти и записываются при выходе одной транзакцией.
+
+        Уникальность документов проверяется при записи по всему пакету сразу; при конфликте или исключении
+        в блоке ничего не записывается. Чтения внутри блока изменений пакета ещё не видят.
+        """
+        if self._batch is not None:
+            yield self
+            return
+        self._batch = []
+        self._batch_next_id = None
+        try:
+            yield self
+            if self._batch:
+                self.__flush_batch(self._batch)
+        finally:
+            self._batch = None
+
+    def __batch_id(self):
+        if self._batch_next_id is None:
+            self._batch_next_id = self.get_new_id()
+        self._batch_next_id += 1
+        return self._batch_next_id - 1
+
+    def __flush_batch(self, operations):
+        client_ids = list({client_id for _, client_id, _ in operations})
+        documents = list({client.get_document() for _, _, client in operations if client is not None})
+        with self.db.transaction() as cursor:
+            # Параллельная запись не должна занять документ или id между проверкой и записью
+            cursor.execute("LOCK TABLE clients IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute("SELECT client_id, document FROM clients WHERE client_id = ANY(%s) OR document = ANY(%s)",
+                           (client_ids, documents))
+            document_of = dict(cursor.fetchall())
+            existing = set(document_of)
+            owners = {document: client_id for client_id, document in document_of.items()}
+            # client_id -> итоговый клиент или None, если удалён
+            final = {}
+            for op, client_id, client in operations:
+                if op == 'add':
+                    if client_id in document_of:
+                        raise ValueError(f"Client with ID {client_id} already exists.")
+                elif client_id not in document_of:
+                    # Как и UPDATE/DELETE вне пакета, изменение отсутствующего клиента ничего не делает
+                    continue
+                else:
+                    del owners[document_of.pop(client_id)]
+                if op == 'delete':
+                    final[client_id] = None
+                    continue
+                document = client.get_document()
+                if document in owners:
+                    raise ValueError(f"Client with document {document} already exists.")
+                owners[document] = client_id
+                document_of[client_id] = document
+                final[client_id] = self._client_to_row(client)[1:]
+            deleted = [client_id for client_id, row in final.items() if row is None and client_id in existing]
+            updated = [(client_id, *row) for client_id, row in final.items() if row is not None and client_id in existing]
+            inserted = [(client_id, *row) for client_id, row in final.items()
+                        if row is not None and client_id not in existing]
+            self.__write_changes(cursor, deleted, updated, inserted)
+        self._page_boundaries.clear()
+        self.cache.invalidate(*deleted, *(row[0] for row in updated))
 
     def add_client(self, fullname, document, age, phone_number, address, email):
+        if self._batch is not None:
+            new_client = BaseClient(self.__batch_id(), fullname, document, age, phone_number, address, email)
+            self._batch.append(('add', new_client.get_client_id(), new_client))
+            return
         new_id = self.get_new_id()
         if not self.__is_unique(document):
             raise ValueError(f"Client with this document already exists.")
         new_client = BaseClient(new_id, fullname, document, age, phone_number, address, email)
-        self.clients.append(new_client)
-        self.save_all(self.clients)
+        query = f"INSERT INTO clients ({self.COLUMNS}) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+        self.db.execute_query(query, self._client_to_row(new_client))
+        self._page_boundaries.clear()
 
     def replace_by_id(self, client_id, new_client):
+        if self._batch is not None:
+            self._batch.append(('replace', client_id, new_client))
+            return True
         if not self.__is_unique(new_client.get_document(), client_id):
             raise ValueError(f"Client with this document already exists.")
         query = """
@@ -340,18 +689,60 @@ class BaseClientPostgresRep(BaseClient_Rep_Strategy):
         self.db.execute_query(query, (new_client.get_fullname(), new_client.get_document(), new_client.get_age(),
                                       new_client.get_phone_number(), new_client.get_address(), new_client.get_email(),
                                       client_id))
+        self.cache.invalidate(client_id)
         return True
 
+    def add_clients(self, clients):
+        """Массовая вставка через COPY во временную таблицу; строки с занятым client_id или документом отклоняются.
+
+        Внутри batch() клиенты добавляются в пакет, а конфликт вызывает ошибку при его записи.
+        """
+        clients = list(clients)
+        if self._batch is not None:
+            self._batch.extend(('add', client.get_client_id(), client) for client in clients)
+            return []
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for client in clients:
+            writer.writerow(self._client_to_row(client))
+        buffer.seek(0)
+        with self.db.transaction() as cursor:
+            cursor.execute("CREATE TEMP TABLE clients_import (LIKE clients INCLUDING DEFAULTS) ON COMMIT DROP")
+            cursor.copy_expert(f"COPY clients_import ({self.COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(f"""
+                INSERT INTO clients ({self.COLUMNS})
+                SELECT DISTINCT ON (i.document) i.*
+                FROM (SELECT {self.COLUMNS} FROM clients_import) AS i
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM clients c WHERE c.client_id = i.client_id OR c.document = i.document
+                )
+                ORDER BY i.document, i.client_id
+                ON CONFLICT DO NOTHING
+                RETURNING client_id, document
+            """)
+            inserted = set(map(tuple, cursor.fetchall()))
+        self._page_boundaries.clear()
+        return [(client, "Client with this ID or document already exists.") for client in clients
+                if (client.get_client_id(), client.get_document()) not in inserted]
+
     def delete_by_id(self, client_id):
+        if self._batch is not None:
+            self._batch.append(('delete', client_id, None))
+            return
         query = "DELETE FROM clients WHERE client_id = %s"
-        self.db.execute_query(query, (client_id,))
+        with self._deleting_clients():
+            self.db.execute_query(query, (client_id,))
+        self._page_boundaries.clear()
+        self.cache.invalidate(client_id)
+
+    def __fetch_row(self, client_id):
+        query = f"SELECT {self.COLUMNS} FROM clients WHERE client_id = %s"
+        return self.db.fetch_one(query, (client_id,))
 
     def get_by_id(self, client_id):
-        query = "SELECT * FROM clients WHERE client_id = %s"
-        row = self.db.fetch_one(query, (client_id,))
+        row = self.cache.get(client_id, self.__fetch_row)
         if row:
-            return BaseClient(client_id=row[0], fullname=row[1], document=row[2],
-                              age=row[3], phone_number=row[4], address=row[5], email=row[6])
+            return self._row_to_client(row)
         else:
             raise ValueError(f"Client with ID {client_id} not found")
 
@@ -360,48 +751,950 @@ class BaseClientPostgresRep(BaseClient_Rep_Strategy):
         result = self.db.fetch_one(query, (document,))
         return result is None or result[0] == unverifiable_client_id
 
+    def get_short_page(self, n, after_id=None):
+        """Страница по ключу: ищет по индексу client_id вместо OFFSET, поэтому время не зависит от номера страницы."""
+        query = "SELECT client_id, fullname, document FROM clients WHERE client_id > %s ORDER BY client_id LIMIT %s"
+        rows = self.db.fetch_all(query, (after_id or 0, n))
+        factory = BaseClientShortInfo if self.validate_rows else BaseClientShortInfo.from_trusted
+        return [factory(*row) for row in rows]
+
+    def get_k_n_short_list(self, k, n):
+        """Страница k по n клиентов.
+
+        Границы пройденных страниц запоминаются между вызовами только после track_changes(): без ленты
+        изменений удаления и вставки других процессов сдвигают страницы незаметно для этого экземпляра.
+        Для последовательного листания без этого подходит get_short_page(n, after_id).
+        """
+        if self._change_feed is None:
+            self._page_boundaries.clear()
+        changes = self._changes
+        after_id = self.__page_start(k, n, changes)
+        if after_id is None:
+            return []
+        page = self.get_short_page(n, after_id)
+        if page:
+            self.__remember_boundary((n, k), page[-1].get_client_id(), changes)
+        return page
+
+    def __remember_boundary(self, key, client_id, changes):
+        # Граница, вычисленная до пришедшего изменения, уже может быть неверной
+        if changes == self._changes:
+            self._page_boundaries[key] = client_id
+
+    def __page_start(self, k, n, changes):
+        if k <= 1:
+            return 0
+        boundaries = dict(self._page_boundaries)
+        if (n, k - 1) in boundaries:
+            return boundaries[(n, k - 1)]
+        # Ближайшая известная граница перед страницей; остаток пропускаем по индексу client_id
+        known = max((page for size, page in boundaries if size == n and page < k), default=0)
+        after_id = boundaries.get((n, known), 0)
+        query = "SELECT client_id FROM clients WHERE client_id > %s ORDER BY client_id OFFSET %s LIMIT 1"
+        row = self.db.fetch_one(query, (after_id, (k - 1 - known) * n - 1))
+        if row is None:
+            return None
+        self.__remember_boundary((n, k - 1), row[0], changes)
+        return row[0]
+
+    def track_changes(self):
+        """Подписывается на ленту изменений clients: границы страниц и кэш строк сбрасываются при
+        изменениях из любых процессов, поэтому границы можно хранить между вызовами get_k_n_short_list.
+
+        Требует установленного триггера (python cli.py install-change-feed), иначе RuntimeError.
+        """
+        if self._change_feed is not None:
+            return
+        from change_feed import ClientChangeFeed
+        change_feed = ClientChangeFeed(self.db_config, self.__on_change)
+        change_feed.start()
+        self._change_feed = change_feed
+
+    def __on_change(self, delta):
+        # Вызывается из потока ленты изменений
+        self._changes += 1
+        self._page_boundaries.clear()
+        if delta.client_id is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(delta.client_id)
+
+    def iter_clients(self, batch_size=1000):
+        """Читает таблицу потоком через серверный курсор, не загружая её целиком."""
+        for row in self.db.iter_rows(f"SELECT {self.COLUMNS} FROM clients ORDER BY client_id", batch_size=batch_size):
+            yield self._row_to_client(row)
+
+    def get_count(self):
+        return self.db.fetch_one("SELECT COUNT(*) FROM clients")[0]
+
     def get_new_id(self):
         query = "SELECT MAX(client_id) FROM clients"
         result = self.db.fetch_one(query)
         return (result[0] or 0) + 1
 
     def close(self):
+        if self._change_feed is not None:
+            self._change_feed.stop()
+            self._change_feed = None
         self.db.close()
 
-class BaseClient_Rep_Json(BaseClient_Rep_Strategy):
-    def __init__(self, filename):
+class ClientJournal:
+    """Журнал изменений (append-only) для файловых репозиториев."""
+    FSYNC_ALWAYS = 'always'
+    FSYNC_INTERVAL = 'interval'
+    FSYNC_NEVER = 'never'
+
+    def __init__(self, filename, fsync_policy=FSYNC_ALWAYS, fsync_interval=1.0):
+        if fsync_policy not in (self.FSYNC_ALWAYS, self.FSYNC_INTERVAL, self.FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
         self.filename = filename
-        self.clients = self.read_all()
-        
-    def read_all(self):
+        self.rotated_filename = filename + '.old'
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._size = None
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, op, client_id, data=None):
+        self.append_many([(op, client_id, data)])
+
+    def append_many(self, records):
+        """Дописывает несколько записей (op, client_id, data) одной операцией записи и синхронизации."""
+        chunk = ''.join(json.dumps({'op': op, 'client_id': client_id, 'data': data}, ensure_ascii=False) + '\n'
+                        for op, client_id, data in records)
+        with self._lock:
+            size = self.size()
+            if self._file is None:
+                self._file = open(self.filename, 'a', encoding='utf-8')
+            self._file.write(chunk)
+            self._file.flush()
+            self._size = size + len(chunk.encode('utf-8'))
+            now = time.monotonic()
+            if (self.fsync_policy == self.FSYNC_ALWAYS or
+                    (self.fsync_policy == self.FSYNC_INTERVAL and now - self._last_sync >= self.fsync_interval)):
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+
+    def size(self):
+        if self._size is None:
+            try:
+                self._size = os.path.getsize(self.filename)
+            except FileNotFoundError:
+                self._size = 0
+        return self._size
+
+    def replay(self, clients):
+        """Применяет записи журнала к снимку и возвращает итоговый список клиентов."""
+        by_id = {client.get_client_id(): client for client in clients}
+        for filename in (self.rotated_filename, self.filename):
+            for record in self.__read_records(filename):
+                client_id = record['client_id']
+                if record['op'] == 'delete':
+                    by_id.pop(client_id, None)
+                    continue
+                client = BaseClient.from_dict(record['data'], validate=False)
+                if record['op'] == 'replace' and client.get_client_id() != client_id:
+                    by_id.pop(client_id, None)
+                by_id[client.get_client_id()] = client
+        return list(by_id.values())
+
+    @staticmethod
+    def __read_records(filename):
         try:
-            with open(self.filename, 'r') as file:
-                data = json.load(file)
-                return [BaseClient.from_dict(client) for client in data]
+            with open(filename, 'r', encoding='utf-8') as file:
+                lines = file.readlines()
         except FileNotFoundError:
             return []
+        records = []
+        for i, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Последняя строка могла быть записана не полностью при сбое
+                if i == len(lines) - 1:
+                    break
+                raise ValueError(f"Journal {filename} is corrupted at line {i + 1}.")
+        return records
+
+    def is_empty(self):
+        return self.size() == 0 and not os.path.exists(self.rotated_filename)
+
+    def rotate(self):
+        """Переносит текущий журнал в .old, чтобы новые записи шли в пустой файл."""
+        with self._lock:
+            if os.path.exists(self.rotated_filename):
+                return False
+            self.__close_file()
+            if os.path.exists(self.filename):
+                os.replace(self.filename, self.rotated_filename)
+            self._size = 0
+            return True
+
+    def discard_rotated(self):
+        try:
+            os.remove(self.rotated_filename)
+        except FileNotFoundError:
+            pass
+
+    def reset(self):
+        with self._lock:
+            self.__close_file()
+            for filename in (self.filename, self.rotated_filename):
+                try:
+                    os.remove(filename)
+                except FileNotFoundError:
+                    pass
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self.__close_file()
+
+    def __close_file(self):
+        if self._file is not None:
+            self._file.flush()
+            if self.fsync_policy != self.FSYNC_NEVER:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+class BaseClient_Rep_File(BaseClient_Rep_Strategy):
+    ON_ERROR_RAISE = 'raise'
+    ON_ERROR_SKIP = 'skip'
+    ON_ERROR_COLLECT = 'collect'
+
+    def __init__(self, filename, journal=False, fsync_policy=ClientJournal.FSYNC_ALWAYS,
+                 compact_threshold=4 * 1024 * 1024, background_compaction=True,
+                 on_error=ON_ERROR_COLLECT, progress=None, progress_every=10000):
+        if on_error not in (self.ON_ERROR_RAISE, self.ON_ERROR_SKIP, self.ON_ERROR_COLLECT):
+            raise ValueError(f"Unknown on_error mode: {on_error}")
+        self.filename = filename
+        self.on_error = on_error
+        # progress(records, bytes_read, total_bytes) вызывается каждые progress_every записей
+        self.progress = progress
+        self.progress_every = progress_every
+        # (номер записи, запись, {поле: ошибка}) для некорректных записей в режиме collect
+        self.load_errors = []
+        self.journal = ClientJournal(filename + '.journal', fsync_policy) if journal else None
+        # Журнал, оставшийся от запуска в режиме журналирования, применяется и без него
+        self._replay_journal = self.journal or ClientJournal(filename + '.journal')
+        self.compact_threshold = compact_threshold
+        self.background_compaction = background_compaction
+        self._compaction_lock = threading.RLock()
+        self._compaction_thread = None
+        self._generation = 0
+
+    @abstractmethod
+    def iter_records(self, file):
+        """Разбирает файл потоково, возвращая словари клиентов по одному."""
+        pass
+
+    @abstractmethod
+    def write_snapshot(self, data, file):
+        """Записывает клиентов потоково, не собирая полный список словарей."""
+        pass
+
+    def iter_snapshot(self):
+        self.load_errors = []
+        try:
+            file = open(self.filename, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with file:
+            total_bytes = os.fstat(file.fileno()).st_size
+            count = 0
+            for index, record in enumerate(self.iter_records(file)):
+                errors = ClientValidator.validate(record)
+                if errors:
+                    if self.on_error == self.ON_ERROR_RAISE:
+                        raise ValueError(f"Invalid client record #{index}: {errors}")
+                    if self.on_error == self.ON_ERROR_COLLECT:
+                        self.load_errors.append((index, record, errors))
+                    continue
+                client = BaseClient.from_dict(record, validate=False)
+                count += 1
+                yield client
+                if self.progress and count % self.progress_every == 0:
+                    self.progress(count, file.tell(), total_bytes)
+            if self.progress:
+                self.progress(count, total_bytes, total_bytes)
+
+    def read_snapshot(self):
+        return list(self.iter_snapshot())
+
+    def read_all(self):
+        return self._replay_journal.replay(self.iter_snapshot())
+
+    def iter_clients(self, batch_size=1000):
+        if self._by_id is None and self._replay_journal.is_empty():
+            # Без журнала снимок можно отдавать прямо из файла, не загружая его
+            yield from self.iter_snapshot()
+        else:
+            yield from self.clients
 
     def save_all(self, data):
-        with open(self.filename, 'w') as file:
-            json.dump([client.to_dict() for client in data], file, indent=4)
+        with self._compaction_lock:
+            self._generation += 1
+            self.__write_snapshot_atomic(data)
+            self._replay_journal.reset()
+
+    def __write_snapshot_atomic(self, data):
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            self.write_snapshot(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, self.filename)
+
+    def _persist_add(self, client):
+        self.__journal_or_save('add', client.get_client_id(), client.to_dict())
+
+    def _persist_add_many(self, clients):
+        if self.journal is None:
+            self.save_all(self.clients)
+            return
+        self.journal.append_many(('add', client.get_client_id(), client.to_dict()) for client in clients)
+        if self.journal.size() >= self.compact_threshold:
+            self.compact(background=self.background_compaction)
+
+    def _persist_replace(self, client_id, client):
+        self.__journal_or_save('replace', client_id, client.to_dict())
+
+    def _persist_delete(self, client_id):
+        self.__journal_or_save('delete', client_id)
+
+    def __journal_or_save(self, op, client_id, data=None):
+        if self.journal is None:
+            self.save_all(self.clients)
+            return
+        self.journal.append(op, client_id, data)
+        if self.journal.size() >= self.compact_threshold:
+            self.compact(background=self.background_compaction)
+
+    def compact(self, background=False):
+        """Записывает полный снимок и очищает журнал."""
+        if self.journal is None:
+            self.save_all(self.clients)
+            return
+        # Проверяем до захвата блокировки: фоновая запись держит её всё время записи снимка
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        with self._compaction_lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            if not self.journal.rotate():
+                # Предыдущее уплотнение прервалось: пишем снимок синхронно
+                self.save_all(self.clients)
+                return
+            snapshot = list(self.clients)
+            generation = self._generation
+            if background:
+                self._compaction_thread = threading.Thread(
+                    target=self.__write_compacted, args=(snapshot, generation), daemon=True)
+                self._compaction_thread.start()
+                return
+        self.__write_compacted(snapshot, generation)
+
+    def __write_compacted(self, snapshot, generation):
+        with self._compaction_lock:
+            # Снимок, записанный через save_all после ротации, новее нашего
+            if generation != self._generation:
+                return
+            self.__write_snapshot_atomic(snapshot)
+            self.journal.discard_rotated()
 
-class BaseClient_Rep_Yaml(BaseClient_Rep_Strategy):
-    def __init__(self, filename):
+    def close(self):
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        if self.journal:
+            self.journal.close()
+
+class BaseClient_Rep_Json(BaseClient_Rep_File):
+    CHUNK_SIZE = 64 * 1024
+    _WHITESPACE = re.compile(r'\s*')
+
+    def iter_records(self, file):
+        decoder = json.JSONDecoder()
+        buffer, pos, eof = '', 0, False
+        state = 'start'
+        while True:
+            pos = self._WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer) and not eof:
+                chunk = file.read(self.CHUNK_SIZE)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            if pos == len(buffer):
+                if state == 'start':
+                    return
+                raise ValueError("Unexpected end of JSON file.")
+            char = buffer[pos]
+            if state == 'start':
+                if char != '[':
+                    raise ValueError("JSON file must contain a list of clients.")
+                pos, state = pos + 1, 'first'
+            elif char == ']' and state in ('first', 'next'):
+                return
+            elif state == 'next':
+                if char != ',':
+                    raise ValueError(f"Malformed JSON: expected ',' or ']' but got {char!r}.")
+                pos, state = pos + 1, 'value'
+            else:
+                # Значение может оказаться разрезанным границей блока: дочитываем и пробуем снова
+                while True:
+                    try:
+                        value, end = decoder.raw_decode(buffer, pos)
+                        if end < len(buffer) or eof:
+                            break
+                    except json.JSONDecodeError as e:
+                        if eof:
+                            raise ValueError(f"Malformed JSON: {e}")
+                    chunk = file.read(self.CHUNK_SIZE)
+                    buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                pos, state = end, 'next'
+                yield value
+
+    def write_snapshot(self, data, file):
+        empty = True
+        file.write('[')
+        for client in data:
+            file.write('\n' if empty else ',\n')
+            file.write(textwrap.indent(json.dumps(client.to_dict(), indent=4), '    '))
+            empty = False
+        file.write(']' if empty else '\n]')
+
+class BaseClient_Rep_Yaml(BaseClient_Rep_File):
+    def iter_records(self, file):
+        import yaml
+        loader = yaml.SafeLoader(file)
+        try:
+            loader.get_event()
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+            loader.get_event()
+            if loader.check_event(yaml.ScalarEvent):
+                # Пустой документ (null)
+                return
+            if not loader.check_event(yaml.SequenceStartEvent):
+                raise ValueError("YAML file must contain a list of clients.")
+            loader.get_event()
+            while not loader.check_event(yaml.SequenceEndEvent):
+                node = loader.compose_node(None, None)
+                yield loader.construct_document(node)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Malformed YAML: {e}")
+        finally:
+            loader.dispose()
+
+    def write_snapshot(self, data, file):
+        import yaml
+        empty = True
+        for client in data:
+            yaml.safe_dump([client.to_dict()], file)
+            empty = False
+        if empty:
+            file.write('[]\n')
+
+class DiskHashIndex:
+    """Хеш-индекс в отдельном mmap-файле: ключ (целое 1..2**64-2) -> номер слота, открытая адресация."""
+    MAGIC = b'CLIDX001'
+    HEADER = struct.Struct('<8sIII')
+    ENTRY = struct.Struct('<QI')
+    EMPTY = 0
+    DELETED = 2 ** 64 - 1
+    MAX_LOAD = 0.7
+
+    def __init__(self, filename, capacity=1024):
         self.filename = filename
-        self.clients = self.read_all()
-    
+        self._file = None
+        self._map = None
+        if os.path.exists(filename):
+            self.__open()
+        else:
+            self.__create(filename, capacity, [])
+
+    def __open(self):
+        self._file = open(self.filename, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self.capacity, self.count, self.used = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"{self.filename} is not a client index file.")
+        self._mask = self.capacity - 1
+
+    def __create(self, filename, capacity, entries):
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as file:
+            file.truncate(self.HEADER.size + capacity * self.ENTRY.size)
+        with open(tmp_filename, 'r+b') as file, mmap.mmap(file.fileno(), 0) as target:
+            mask = capacity - 1
+            for key, value in entries:
+                position = self._probe_start(key, mask)
+                while self.ENTRY.unpack_from(target, self.HEADER.size + position * self.ENTRY.size)[0] != self.EMPTY:
+                    position = (position + 1) & mask
+                self.ENTRY.pack_into(target, self.HEADER.size + position * self.ENTRY.size, key, value)
+            self.HEADER.pack_into(target, 0, self.MAGIC, capacity, len(entries), len(entries))
+        self.close()
+        os.replace(tmp_filename, filename)
+        self.__open()
+
+    @staticmethod
+    def _probe_start(key, mask):
+        # Умножение Фибоначчи перемешивает последовательные client_id
+        return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 32 & mask
+
+    def _entries(self):
+        for position in range(self.capacity):
+            key, value = self.ENTRY.unpack_from(self._map, self.HEADER.size + position * self.ENTRY.size)
+            if key != self.EMPTY and key != self.DELETED:
+                yield key, value
+
+    def values(self, key):
+        position = self._probe_start(key, self._mask)
+        while True:
+            entry_key, value = self.ENTRY.unpack_from(self._map, self.HEADER.size + position * self.ENTRY.size)
+            if entry_key == self.EMPTY:
+                return
+            if entry_key == key:
+                yield value
+            position = (position + 1) & self._mask
+
+    def get(self, key):
+        return next(self.values(key), None)
+
+    def insert(self, key, value):
+        if (self.used + 1) > self.capacity * self.MAX_LOAD:
+            # Если место занято в основном удалёнными записями, хватит перестройки того же размера
+            capacity = self.capacity * 2 if (self.count + 1) > self.capacity * self.MAX_LOAD / 2 else self.capacity
+            self.__create(self.filename, capacity, list(self._entries()))
+        position = self._probe_start(key, self._mask)
+        while True:
+            offset = self.HEADER.size + position * self.ENTRY.size
+            entry_key = self.ENTRY.unpack_from(self._map, offset)[0]
+            if entry_key == self.EMPTY or entry_key == self.DELETED:
+                break
+            position = (position + 1) & self._mask
+        self.ENTRY.pack_into(self._map, offset, key, value)
+        self.count += 1
+        self.used += entry_key == self.EMPTY
+        self.__write_header()
+
+    def remove(self, key, value):
+        position = self._probe_start(key, self._mask)
+        while True:
+            offset = self.HEADER.size + position * self.ENTRY.size
+            entry_key, entry_value = self.ENTRY.unpack_from(self._map, offset)
+            if entry_key == self.EMPTY:
+                return False
+            if entry_key == key and entry_value == value:
+                self.ENTRY.pack_into(self._map, offset, self.DELETED, 0)
+                self.count -= 1
+                self.__write_header()
+                return True
+            position = (position + 1) & self._mask
+
+    def rebuild(self, entries, capacity=None):
+        """Перезаписывает индекс целиком (например, после некорректного завершения)."""
+        entries = list(entries)
+        if capacity is None:
+            capacity = 1024
+            while len(entries) > capacity * self.MAX_LOAD / 2:
+                capacity *= 2
+        self.__create(self.filename, capacity, entries)
+
+    def __write_header(self):
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.capacity, self.count, self.used)
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class BaseClient_Rep_Binary(BaseClient_Rep_Strategy):
+    """Клиенты в mmap-файле записями фиксированной длины с хеш-индексами по client_id и документу.
+
+    Чтение и изменение одного клиента не разбирают остальной файл, а открытие файла его не загружает.
+    """
+    MAGIC = b'CLBIN001'
+    # magic, record_size, capacity, count, free_head, max_id, dirty
+    HEADER = struct.Struct('<8sIIIIQB')
+    HEADER_SIZE = 64
+    # (поле, байт на значение в UTF-8); более длинные значения в этом хранилище не помещаются
+    STRING_FIELDS = (('fullname', 192), ('document', 16), ('phone_number', 24), ('address', 192), ('email', 96))
+    # status, следующий свободный слот, client_id, age (0 — не указан), затем строки длиной + байтами
+    RECORD = struct.Struct('<BxxxIIh' + ''.join(f'H{size}s' for _, size in STRING_FIELDS))
+    SHORT_FIELDS = struct.Struct('<BxxxIIxx' + ''.join(f'H{size}s' for _, size in STRING_FIELDS[:2]))
+    RECORD_SIZE = (RECORD.size + 7) // 8 * 8
+    MAX_AGE = 2 ** 15 - 1
+    FREE, LIVE = 0, 1
+    NO_SLOT = 0xFFFFFFFF
+    MIN_CAPACITY = 1024
+    # Файл данных и файлы его индексов
+    FILE_SUFFIXES = ('', '.id.idx', '.doc.idx')
+
+    def __init__(self, filename, fsync=False, validate_rows=False):
+        self.filename = filename
+        # fsync=True сбрасывает изменения на диск после каждой операции
+        self.fsync = fsync
+        self.validate_rows = validate_rows
+        self._file = None
+        self._map = None
+        self._search_index = None
+        self._sorted_views = None
+        self.__open()
+
+    def __open(self):
+        if not os.path.exists(self.filename):
+            self.__create(self.filename, [])
+        self._file = open(self.filename, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        (magic, record_size, self._capacity, self._count, self._free_head,
+         self._max_id, dirty) = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC or record_size != self.RECORD_SIZE:
+            raise ValueError(f"{self.filename} is not a client binary file of this format.")
+        indexes_exist = os.path.exists(self.filename + '.id.idx') and os.path.exists(self.filename + '.doc.idx')
+        self._id_index = DiskHashIndex(self.filename + '.id.idx')
+        self._document_index = DiskHashIndex(self.filename + '.doc.idx')
+        if dirty or not indexes_exist or self._id_index.count != self._count:
+            # Файл не был закрыт корректно: индексы могли не успеть за данными
+            self.__rebuild_indexes()
+        self.__write_header(dirty=True)
+
+    def __create(self, filename, clients):
+        """Пишет новый файл данных с клиентами подряд и без свободных слотов."""
+        clients = list(clients)
+        capacity = max(self.MIN_CAPACITY, len(clients))
+        with open(filename, 'wb') as file:
+            free_head = len(clients) if capacity > len(clients) else self.NO_SLOT
+            file.write(self.HEADER.pack(self.MAGIC, self.RECORD_SIZE, capacity, len(clients), free_head,
+                                        max((client.get_client_id() for client in clients), default=0), 0)
+                       .ljust(self.HEADER_SIZE, b'\0'))
+            padding = b'\0' * (self.RECORD_SIZE - self.RECORD.size)
+            for client in clients:
+                file.write(self._encode(client) + padding)
+            # Незанятые слоты сразу связываем в список свободных
+            for slot in range(len(clients), capacity):
+                next_slot = slot + 1 if slot + 1 < capacity else self.NO_SLOT
+                file.write(struct.pack('<BxxxI', self.FREE, next_slot).ljust(self.RECORD_SIZE, b'\0'))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def __write_header(self, dirty=True):
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.RECORD_SIZE, self._capacity, self._count,
+                              self._free_head, self._max_id, int(dirty))
+
+    @staticmethod
+    def _document_key(document):
+        key = int.from_bytes(hashlib.blake2b(document.encode('utf-8'), digest_size=8).digest(), 'little')
+        # 0 и 2**64-1 в индексе означают пустую и удалённую ячейку
+        return key % (DiskHashIndex.DELETED - 1) + 1
+
+    def _encode(self, client):
+        values = []
+        for field, size in self.STRING_FIELDS:
+            encoded = (getattr(client, f'get_{field}')() or '').encode('utf-8')
+            if len(encoded) > size:
+                raise ValueError(f"Field {field} is longer than {size} bytes and does not fit the binary storage.")
+            values += (len(encoded), encoded)
+        age = client.get_age() or 0
+        # Клиенты из from_trusted не проверялись: переполнение должно быть ValueError до записи, а не struct.error
+        if not 0 <= age <= self.MAX_AGE:
+            raise ValueError(f"Age {age} does not fit the binary storage.")
+        return self.RECORD.pack(self.LIVE, 0, client.get_client_id(), age, *values)
+
+    def _decode(self, slot):
+        status, _, client_id, age, *values = self.RECORD.unpack_from(self._map, self._offset(slot))
+        fields = [data[:length].decode('utf-8') for length, data in zip(values[::2], values[1::2])]
+        factory = BaseClient if self.validate_rows else BaseClient.from_trusted
+        fullname, document, phone_number, address, email = fields
+        return factory(client_id, fullname, document, age or None, phone_number or None, address or None, email or None)
+
+    def _decode_short(self, slot):
+        _, _, client_id, fullname_length, fullname, document_length, document = \
+            self.SHORT_FIELDS.unpack_from(self._map, self._offset(slot))
+        factory = BaseClientShortInfo if self.validate_rows else BaseClientShortInfo.from_trusted
+        return factory(client_id, fullname[:fullname_length].decode('utf-8'), document[:document_length].decode('utf-8'))
+
+    def _offset(self, slot):
+        return self.HEADER_SIZE + slot * self.RECORD_SIZE
+
+    def _slot_header(self, slot):
+        """(status, следующий свободный слот, client_id) без разбора строковых полей."""
+        return struct.unpack_from('<BxxxII', self._map, self._offset(slot))
+
+    def _live_slots(self):
+        for slot in range(self._capacity):
+            if self._map[self._offset(slot)] == self.LIVE:
+                yield slot
+
+    def __rebuild_indexes(self):
+        ids, documents = [], []
+        for slot in self._live_slots():
+            client = self._decode_short(slot)
+            ids.append((client.get_client_id(), slot))
+            documents.append((self._document_key(client.get_document()), slot))
+        self._id_index.rebuild(ids)
+        self._document_index.rebuild(documents)
+        self._count = len(ids)
+        self._max_id = max((client_id for client_id, _ in ids), default=0)
+        # Свободные слоты собираем заново, в порядке возрастания
+        self._free_head = self.NO_SLOT
+        for slot in reversed(range(self._capacity)):
+            if self._map[self._offset(slot)] != self.LIVE:
+                struct.pack_into('<BxxxI', self._map, self._offset(slot), self.FREE, self._free_head)
+                self._free_head = slot
+
+    def _find_slot(self, client_id):
+        for slot in self._id_index.values(client_id):
+            status, _, slot_client_id = self._slot_header(slot)
+            if status == self.LIVE and slot_client_id == client_id:
+                return slot
+        return None
+
+    def _document_owner(self, document):
+        for slot in self._document_index.values(self._document_key(document)):
+            short_info = self._decode_short(slot)
+            if short_info.get_document() == document:
+                return short_info.get_client_id()
+        return None
+
+    def __is_unique(self, document, unverifiable_client_id=None):
+        owner_id = self._document_owner(document)
+        return owner_id is None or owner_id == unverifiable_client_id
+
+    def __allocate_slot(self):
+        if self._free_head == self.NO_SLOT:
+            self.__grow()
+        slot = self._free_head
+        self._free_head = self._slot_header(slot)[1]
+        return slot
+
+    def __grow(self):
+        old_capacity = self._capacity
+        self._capacity = old_capacity * 2
+        self._map.close()
+        self._file.truncate(self._offset(self._capacity))
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        for slot in reversed(range(old_capacity, self._capacity)):
+            struct.pack_into('<BxxxI', self._map, self._offset(slot), self.FREE, self._free_head)
+            self._free_head = slot
+
+    def __store(self, slot, client):
+        self._map[self._offset(slot):self._offset(slot) + self.RECORD.size] = self._encode(client)
+
+    def __insert(self, client):
+        # Кодируем до выделения слота, чтобы слишком длинное поле не оставило занятый слот
+        record = self._encode(client)
+        slot = self.__allocate_slot()
+        self._map[self._offset(slot):self._offset(slot) + self.RECORD.size] = record
+        self._id_index.insert(client.get_client_id(), slot)
+        self._document_index.insert(self._document_key(client.get_document()), slot)
+        self._count += 1
+        self._max_id = max(self._max_id, client.get_client_id())
+        if self._search_index is not None:
+            self._search_index.add(client)
+        if self._sorted_views is not None:
+            self._sorted_views.add(client)
+
+    def __commit(self):
+        self.__write_header()
+        # Копия файла в batch() сбрасывается на диск один раз, перед заменой оригинала
+        if self.fsync and not self._batch_depth:
+            self._map.flush()
+            self._id_index.flush()
+            self._document_index.flush()
+
     def read_all(self):
+        return [self._decode(slot) for slot in self._live_slots()]
+
+    def iter_clients(self, batch_size=1000):
+        for slot in self._live_slots():
+            yield self._decode(slot)
+
+    @contextmanager
+    def batch(self):
+        """Изменения внутри блока with вносятся в копию файла, которая при выходе заменяет его переименованием.
+
+        При исключении копия удаляется, и файл остаётся прежним.
+        """
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+        original, working = self.filename, self.filename + '.batch'
+        self.close()
+        for suffix in self.FILE_SUFFIXES:
+            shutil.copyfile(original + suffix, working + suffix)
+        self.filename = working
+        self._batch_depth = 1
         try:
-            with open(self.filename, 'r', encoding='utf-8') as file:
-                data = yaml.safe_load(file)
-                print(f"Загруженные данные из YAML: {data}")
-                return [BaseClient.from_dict(client) for client in data] if data else []
-        except FileNotFoundError:
-            return []
+            self.__open()
+            yield self
+            self.close()
+            # Пока файлы заменяются по одному, оригинал помечен незакрытым, и после сбоя его индексы перестроятся
+            with open(original, 'r+b') as file:
+                file.seek(self.HEADER.size - 1)
+                file.write(b'\x01')
+                file.flush()
+                os.fsync(file.fileno())
+            for suffix in reversed(self.FILE_SUFFIXES):
+                os.replace(working + suffix, original + suffix)
+        except BaseException:
+            self.close()
+            for suffix in self.FILE_SUFFIXES:
+                if os.path.exists(working + suffix):
+                    os.remove(working + suffix)
+            self._search_index = None
+            self._sorted_views = None
+            raise
+        finally:
+            self._batch_depth = 0
+            self.filename = original
+            self.__open()
 
     def save_all(self, data):
-        with open(self.filename, 'w') as file:
-            yaml.safe_dump([client.to_dict() for client in data], file)
+        """Перезаписывает файл целиком: клиенты подряд, без свободных слотов."""
+        data = list(data)
+        self.close()
+        tmp_filename = self.filename + '.tmp'
+        self.__create(tmp_filename, data)
+        os.replace(tmp_filename, self.filename)
+        for suffix in self.FILE_SUFFIXES[1:]:
+            if os.path.exists(self.filename + suffix):
+                os.remove(self.filename + suffix)
+        self._search_index = None
+        self._sorted_views = None
+        self.__open()
+
+    def get_by_id(self, client_id):
+        slot = self._find_slot(client_id)
+        if slot is None:
+            raise ValueError(f"Client with ID {client_id} not found")
+        return self._decode(slot)
+
+    def add_client(self, fullname, document, age, phone_number, address, email):
+        new_id = self._max_id + 1
+        if not self.__is_unique(document):
+            raise ValueError(f"Client with this document already exists.")
+        new_client = BaseClient(new_id, fullname, document, age, phone_number, address, email)
+        self.__insert(new_client)
+        self.__commit()
+
+    def add_clients(self, clients):
+        rejected = []
+        for client in clients:
+            if self._find_slot(client.get_client_id()) is not None:
+                rejected.append((client, "Client with this ID already exists."))
+            elif not self.__is_unique(client.get_document()):
+                rejected.append((client, "Client with this document already exists."))
+            else:
+                try:
+                    self.__insert(client)
+                except ValueError as e:
+                    rejected.append((client, str(e)))
+        self.__commit()
+        return rejected
+
+    def replace_by_id(self, client_id, new_client):
+        if not self.__is_unique(new_client.get_document(), client_id):
+            raise ValueError(f"Client with this document already exists.")
+        slot = self._find_slot(client_id)
+        if slot is None:
+            return False
+        new_id = new_client.get_client_id()
+        if new_id != client_id and self._find_slot(new_id) is not None:
+            raise ValueError("Client with this ID already exists.")
+        old_client = self._decode(slot) if self._sorted_views is not None else None
+        old_document = self._decode_short(slot).get_document()
+        # Запись на месте: остальной файл не трогается
+        self.__store(slot, new_client)
+        if new_id != client_id:
+            self._id_index.remove(client_id, slot)
+            self._id_index.insert(new_id, slot)
+            self._max_id = max(self._max_id, new_id)
+        if old_document != new_client.get_document():
+            self._document_index.remove(self._document_key(old_document), slot)
+            self._document_index.insert(self._document_key(new_client.get_document()), slot)
+        if self._search_index is not None:
+            self._search_index.remove(client_id)
+            self._search_index.add(new_client)
+        if old_client is not None:
+            self._sorted_views.remove(old_client)
+            self._sorted_views.add(new_client)
+        self.__commit()
+        return True
+
+    def delete_by_id(self, client_id):
+        slot = self._find_slot(client_id)
+        if slot is None:
+            return
+        document = self._decode_short(slot).get_document()
+        if self._sorted_views is not None:
+            self._sorted_views.remove(self._decode(slot))
+        self._id_index.remove(client_id, slot)
+        self._document_index.remove(self._document_key(document), slot)
+        struct.pack_into('<BxxxI', self._map, self._offset(slot), self.FREE, self._free_head)
+        self._free_head = slot
+        self._count -= 1
+        if self._search_index is not None:
+            self._search_index.remove(client_id)
+        self.__commit()
+
+    def get_k_n_short_list(self, k, n):
+        start = (k - 1) * n
+        page = []
+        for index, slot in enumerate(self._live_slots()):
+            if index >= start + n:
+                break
+            if index >= start:
+                page.append(self._decode_short(slot))
+        return page
+
+    def get_short_page(self, n, after_id=None):
+        candidates = ((self._slot_header(slot)[2], slot) for slot in self._live_slots())
+        smallest = heapq.nsmallest(n, ((client_id, slot) for client_id, slot in candidates
+                                       if after_id is None or client_id > after_id))
+        return [self._decode_short(slot) for _, slot in smallest]
+
+    def get_count(self):
+        return self._count
+
+    def get_new_id(self):
+        return self._max_id + 1
+
+    def search(self, query, limit=10):
+        if self._search_index is None:
+            self._search_index = ClientSearchIndex(self.iter_clients())
+        return [self.get_by_id(client_id) for _, client_id in self._search_index.search(query, limit)]
+
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        if self._sorted_views is None:
+            self._sorted_views = SortedViews()
+        view = self._sorted_views.get(parse_sort_keys(fields), self.iter_clients())
+        return [self.get_by_id(client_id) for client_id in view.page(offset, limit)]
+
+    def close(self):
+        """Помечает файл корректно закрытым; при следующем открытии индексы не перестраиваются."""
+        if self._map is None:
+            return
+        self._map.flush()
+        self._id_index.close()
+        self._document_index.close()
+        self.__write_header(dirty=False)
+        self._map.flush()
+        self._map.close()
+        self._map = None
+        self._file.close()
+        self._file = None
 
 class BaseClientPostgresAdapter(BaseClient_Rep_Strategy):
     def __init__(self, postgres_rep):
@@ -426,6 +1719,27 @@ class BaseClientPostgresAdapter(BaseClient_Rep_Strategy):
     def get_by_id(self, client_id):
         return self.postgres_rep.get_by_id(client_id)
 
+    def get_k_n_short_list(self, k, n):
+        return self.postgres_rep.get_k_n_short_list(k, n)
+
+    def get_short_page(self, n, after_id=None):
+        return self.postgres_rep.get_short_page(n, after_id)
+
+    def iter_clients(self, batch_size=1000):
+        return self.postgres_rep.iter_clients(batch_size)
+
+    def add_clients(self, clients):
+        return self.postgres_rep.add_clients(clients)
+
+    def search(self, query, limit=10):
+        return self.postgres_rep.search(query, limit)
+
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        return self.postgres_rep.sort_by_field(*fields, offset=offset, limit=limit)
+
+    def batch(self):
+        return self.postgres_rep.batch()
+
     def close(self):
         self.postgres_rep.close()
 
@@ -451,6 +1765,27 @@ class BaseClientJsonAdapter(BaseClient_Rep_Strategy):
     def get_by_id(self, client_id):
         return self.json_rep.get_by_id(client_id)
 
+    def get_k_n_short_list(self, k, n):
+        return self.json_rep.get_k_n_short_list(k, n)
+
+    def get_short_page(self, n, after_id=None):
+        return self.json_rep.get_short_page(n, after_id)
+
+    def iter_clients(self, batch_size=1000):
+        return self.json_rep.iter_clients(batch_size)
+
+    def add_clients(self, clients):
+        return self.json_rep.add_clients(clients)
+
+    def search(self, query, limit=10):
+        return self.json_rep.search(query, limit)
+
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        return self.json_rep.sort_by_field(*fields, offset=offset, limit=limit)
+
+    def batch(self):
+        return self.json_rep.batch()
+
     def close(self):
         self.json_rep.close()
 
@@ -476,9 +1811,79 @@ class BaseClientYamlAdapter(BaseClient_Rep_Strategy):
     def get_by_id(self, client_id):
         return self.yaml_rep.get_by_id(client_id)
 
+    def get_k_n_short_list(self, k, n):
+        return self.yaml_rep.get_k_n_short_list(k, n)
+
+    def get_short_page(self, n, after_id=None):
+        return self.yaml_rep.get_short_page(n, after_id)
+
+    def iter_clients(self, batch_size=1000):
+        return self.yaml_rep.iter_clients(batch_size)
+
+    def add_clients(self, clients):
+        return self.yaml_rep.add_clients(clients)
+
+    def search(self, query, limit=10):
+        return self.yaml_rep.search(query, limit)
+
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        return self.yaml_rep.sort_by_field(*fields, offset=offset, limit=limit)
+
+    def batch(self):
+        return self.yaml_rep.batch()
+
     def close(self):
         self.yaml_rep.close()
         
+class BaseClientBinaryAdapter(BaseClient_Rep_Strategy):
+    def __init__(self, binary_rep):
+        self.binary_rep = binary_rep
+
+    def read_all(self):
+        return self.binary_rep.read_all()
+
+    def save_all(self, data):
+        return self.binary_rep.save_all(data)
+
+    def add_client(self, fullname, document, age, phone_number, address, email):
+        return self.binary_rep.add_client(fullname, document, age, phone_number, address, email)
+
+    def replace_by_id(self, client_id, new_client):
+        return self.binary_rep.replace_by_id(client_id, new_client)
+
+    def delete_by_id(self, client_id):
+        return self.binary_rep.delete_by_id(client_id)
+
+    def get_by_id(self, client_id):
+        return self.binary_rep.get_by_id(client_id)
+
+    def get_k_n_short_list(self, k, n):
+        return self.binary_rep.get_k_n_short_list(k, n)
+
+    def get_short_page(self, n, after_id=None):
+        return self.binary_rep.get_short_page(n, after_id)
+
+    def iter_clients(self, batch_size=1000):
+        return self.binary_rep.iter_clients(batch_size)
+
+    def add_clients(self, clients):
+        return self.binary_rep.add_clients(clients)
+
+    def search(self, query, limit=10):
+        return self.binary_rep.search(query, limit)
+
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        return self.binary_rep.sort_by_field(*fields, offset=offset, limit=limit)
+
+    def batch(self):
+        return self.binary_rep.batch()
+
+    def get_count(self):
+        return self.binary_rep.get_count()
+
+    def close(self):
+        self.binary_rep.close()
+
 class BaseClientManagerStrategy:
     def __init__(self, repository_strategy: BaseClient_Rep_Strategy):
         self.repository = repository_strategy
@@ -496,40 +1901,35 @@ class BaseClientManagerStrategy:
         return self.repository.delete_by_id(client_id)
 
     def get_all_clients(self):
-        return self.repository.read_all()
+        # Через iter_clients: уже загруженный индекс и изменения в памяти не перечитываются с диска заново
+        return list(self.repository.iter_clients())
     
     def get_k_n_short_list(self, k, n):
         return self.repository.get_k_n_short_list(k, n)
-    
-    def sort_by_field(self):
-        return self.repository.sort_by_field()
-
-db_config = {
-    'dbname': 'clients',
-    'user': 'postgres',
-    'password': '123',
-    'host': 'localhost',
-    'port': '5432',
-}
-
-postgres_repository = BaseClientPostgresRep(db_config)
-client_manager = BaseClientManagerStrategy(postgres_repository)
 
-#client_manager.add_client("Иван Иванов", "1211 111112", 30, "89728845782", "Москва", "ivan2@mail.com")
+    def get_short_page(self, n, after_id=None):
+        return self.repository.get_short_page(n, after_id)
 
-clients = client_manager.get_all_clients()
-for client in clients:
-    print(client)
-
-postgres_repository.close()
+    def iter_clients(self, batch_size=1000):
+        return self.repository.iter_clients(batch_size)
 
+    def add_clients(self, clients):
+        return self.repository.add_clients(clients)
+    
+    def search_clients(self, query, limit=10):
+        return self.repository.search(query, limit)
 
-#json_repository = BaseClient_Rep_Yaml('clients.yaml')
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        return self.repository.sort_by_field(*fields, offset=offset, limit=limit)
 
-#client_manager = BaseClientManagerStrategy(json_repository)
+    def batch(self):
+        """Единица работы для массовых правок:
 
-#client_manager.add_client("Иван Иванов", "1211 111111", 30, "89728845781", "Москва", "ivan@mail.com")
+            with manager.batch():
+                manager.add_client(...)
+                manager.delete_client(...)
 
-#clients = client_manager.get_all_clients()
-#for client in clients:
-#    print(client)
\ No newline at end of file
+        Изменения сохраняются один раз при выходе из блока (одна транзакция в PostgreSQL, одна атомарная
+        замена файла в файловых хранилищах), а при исключении отменяются.
+        """
+        return self.repository.batch()
@@ -0,0 +1,384 @@
+import operator
+from array import array
+from datetime import date
+from decimal import Decimal
+from itertools import compress
+from collections import defaultdict
+from pawnshop import Agreement, PaymentSchedule, ensure_schema
+
+# (название, столбец сводки, от, до) — дни просрочки неоплаченного платежа; None — без верхней границы
+AGING_BUCKETS = (
+    ('1-30', 'overdue_1_30', 1, 30),
+    ('31-60', 'overdue_31_60', 31, 60),
+    ('61-90', 'overdue_61_90', 61, 90),
+    ('90+', 'overdue_90_plus', 91, None),
+)
+SUMMARY_COLUMNS = ('client_id', 'agreements', 'loan_total', 'commission_total', 'collateral_value', 'outstanding',
+                   *(column for _, column, _, _ in AGING_BUCKETS))
+
+def _bucket_condition(low, high):
+    if high is None:
+        return f"%(as_of)s::date - p.payment_date >= {low}"
+    return f"%(as_of)s::date - p.payment_date BETWEEN {low} AND {high}"
+
+# Показатели по клиентам с действующими соглашениями:
+# займы и комиссии, стоимость залогов, остаток неоплаченных платежей и просрочка по корзинам
+SUMMARY_SELECT = f"""
+    WITH active AS (
+        SELECT i.client_id, a.agreement_id, a.pledged_item_id, a.loan_amount, a.commission
+        FROM agreements a JOIN pledged_items i ON i.item_id = a.pledged_item_id
+        WHERE a.status_agreements <> '{Agreement.REPAID}' {{client_filter}}
+    ), loans AS (
+        SELECT client_id, count(*) AS agreements, sum(loan_amount) AS loan_total,
+               coalesce(sum(commission), 0) AS commission_total
+        FROM active GROUP BY client_id
+    ), collateral AS (
+        -- Один товар может быть залогом нескольких соглашений, но его стоимость учитывается один раз
+        SELECT i.client_id, coalesce(sum(i.item_value), 0) AS collateral_value
+        FROM pledged_items i
+        WHERE i.item_id IN (SELECT pledged_item_id FROM active)
+        GROUP BY i.client_id
+    ), unpaid AS (
+        SELECT active.client_id, sum(p.payment_amount) AS outstanding,
+               {', '.join(f"coalesce(sum(p.payment_amount) FILTER (WHERE {_bucket_condition(low, high)}), 0) AS {column}"
+                          for _, column, low, high in AGING_BUCKETS)}
+        FROM active JOIN payment_schedules p ON p.agreement_id = active.agreement_id
+        WHERE p.status_payment <> '{PaymentSchedule.PAID}'
+        GROUP BY active.client_id
+    )
+    SELECT l.client_id, l.agreements, l.loan_total, l.commission_total, coalesce(c.collateral_value, 0),
+           coalesce(u.outstanding, 0), {', '.join(f"coalesce(u.{column}, 0)" for _, column, _, _ in AGING_BUCKETS)}
+    FROM loans l
+    LEFT JOIN collateral c USING (client_id)
+    LEFT JOIN unpaid u USING (client_id)
+"""
+
+# Какие клиенты затронуты изменёнными строками каждой таблицы; {rows} — таблица переходов триггера
+_DIRTY_CLIENTS = {
+    'pledged_items': "SELECT r.client_id FROM {rows} r",
+    'agreements': "SELECT i.client_id FROM {rows} r JOIN pledged_items i ON i.item_id = r.pledged_item_id",
+    'payment_schedules': """
+        SELECT i.client_id FROM {rows} r
+        JOIN agreements a ON a.agreement_id = r.agreement_id
+        JOIN pledged_items i ON i.item_id = a.pledged_item_id
+    """,
+}
+
+def _money(value):
+    return Decimal(value).scaleb(-2)
+
+class PortfolioAnalytics:
+    """Показатели портфеля ломбарда по клиентам, посчитанные в PostgreSQL и сохранённые в сводной таблице.
+
+    Триггеры отмечают клиентов, чьи залоги, соглашения или платежи изменились, и refresh() пересчитывает
+    только их. Панели читают готовую сводку, поэтому не зависят от размера графиков платежей.
+    """
+
+    def __init__(self, db_config, db=None):
+        from database import DatabaseConnection
+        self.db = db or DatabaseConnection(db_config)
+
+    def install(self):
+        """Создаёт таблицы ломбарда, сводку, таблицу изменённых клиентов и триггеры, которые её заполняют."""
+        ensure_schema(self.db)
+        with self.db.transaction() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS portfolio_client_summary (
+                    client_id integer PRIMARY KEY,
+                    agreements integer NOT NULL,
+                    loan_total numeric(14, 2) NOT NULL,
+                    commission_total numeric(14, 2) NOT NULL,
+                    collateral_value numeric(14, 2) NOT NULL,
+                    outstanding numeric(14, 2) NOT NULL,
+                    {', '.join(f"{column} numeric(14, 2) NOT NULL" for _, column, _, _ in AGING_BUCKETS)}
+                );
+                CREATE INDEX IF NOT EXISTS portfolio_client_summary_outstanding
+                    ON portfolio_client_summary (outstanding DESC);
+                CREATE TABLE IF NOT EXISTS portfolio_summary_state (
+                    singleton boolean PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+                    as_of date NOT NULL,
+                    refreshed_at timestamptz NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS portfolio_dirty_clients (client_id integer PRIMARY KEY);
+            """)
+            for table, clients in _DIRTY_CLIENTS.items():
+                # Триггеры уровня оператора: массовая загрузка графиков отмечает клиентов одним запросом
+                cursor.execute(f"""
+                    CREATE OR REPLACE FUNCTION portfolio_mark_{table}() RETURNS trigger AS $$
+                    BEGIN
+                        IF TG_OP <> 'DELETE' THEN
+                            INSERT INTO portfolio_dirty_clients {clients.format(rows='new_rows')}
+                            ON CONFLICT DO NOTHING;
+                        END IF;
+                        IF TG_OP <> 'INSERT' THEN
+                            INSERT INTO portfolio_dirty_clients {clients.format(rows='old_rows')}
+                            ON CONFLICT DO NOTHING;
+                        END IF;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql;
+                """)
+                for event, referencing in (('INSERT', 'NEW TABLE AS new_rows'),
+                                           ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+                                           ('DELETE', 'OLD TABLE AS old_rows')):
+                    trigger = f"portfolio_mark_{table}_{event.lower()}"
+                    cursor.execute(f"""
+                        DROP TRIGGER IF EXISTS {trigger} ON {table};
+                        CREATE TRIGGER {trigger} AFTER {event} ON {table}
+                            REFERENCING {referencing}
+                            FOR EACH STATEMENT EXECUTE FUNCTION portfolio_mark_{table}();
+                    """)
+
+    def refresh(self, as_of=None, full=False):
+        """Обновляет сводку и возвращает число пересчитанных клиентов.
+
+        Пересчитываются только изменившиеся клиенты; со сменой даты as_of сдвигается просрочка,
+        поэтому тогда (и при full=True) сводка строится заново целиком.
+        """
+        as_of = as_of or date.today()
+        with self.db.transaction() as cursor:
+            cursor.execute("SELECT as_of FROM portfolio_summary_state FOR UPDATE")
+            state = cursor.fetchone()
+            columns = ', '.join(SUMMARY_COLUMNS)
+            if full or state is None or state[0] != as_of:
+                cursor.execute("DELETE FROM portfolio_dirty_clients")
+                cursor.execute("DELETE FROM portfolio_client_summary")
+                cursor.execute(f"INSERT INTO portfolio_client_summary ({columns}) "
+                               f"{SUMMARY_SELECT.format(client_filter='')}", {'as_of': as_of})
+                refreshed = cursor.rowcount
+            else:
+                cursor.execute("DELETE FROM portfolio_dirty_clients RETURNING client_id")
+                client_ids = [row[0] for row in cursor.fetchall()]
+                if not client_ids:
+                    return 0
+                cursor.execute("DELETE FROM portfolio_client_summary WHERE client_id = ANY(%(client_ids)s)",
+                               {'client_ids': client_ids})
+                cursor.execute(f"INSERT INTO portfolio_client_summary ({columns}) "
+                               f"{SUMMARY_SELECT.format(client_filter='AND i.client_id = ANY(%(client_ids)s)')}",
+                               {'as_of': as_of, 'client_ids': client_ids})
+                refreshed = len(client_ids)
+            cursor.execute("""
+                INSERT INTO portfolio_summary_state (singleton, as_of, refreshed_at) VALUES (TRUE, %s, now())
+                ON CONFLICT (singleton) DO UPDATE SET as_of = EXCLUDED.as_of, refreshed_at = EXCLUDED.refreshed_at
+            """, (as_of,))
+        return refreshed
+
+    def compute_exposure(self, client_ids=None, as_of=None):
+        """Те же показатели, что в сводке, но посчитанные сейчас, без материализации."""
+        params = {'as_of': as_of or date.today(), 'client_ids': list(client_ids or ())}
+        client_filter = 'AND i.client_id = ANY(%(client_ids)s)' if client_ids is not None else ''
+        rows = self.db.fetch_all(SUMMARY_SELECT.format(client_filter=client_filter) + " ORDER BY l.client_id", params)
+        return [self._exposure(row) for row in rows]
+
+    @staticmethod
+    def _exposure(row):
+        exposure = dict(zip(SUMMARY_COLUMNS, row))
+        loan_total = exposure['loan_total']
+        exposure['collateral_ratio'] = exposure['collateral_value'] / loan_total if loan_total else None
+        return exposure
+
+    def client_exposure(self, client_id):
+        row = self.db.fetch_one(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM portfolio_client_summary "
+                                f"WHERE client_id = %s", (client_id,))
+        return self._exposure(row) if row else None
+
+    def top_exposures(self, limit=20):
+        rows = self.db.fetch_all(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM portfolio_client_summary "
+                                 f"ORDER BY outstanding DESC, client_id LIMIT %s", (limit,))
+        return [self._exposure(row) for row in rows]
+
+    def undercollateralized(self, ratio=1, limit=100):
+        """Клиенты, у которых стоимость залогов меньше ratio от суммы займов, начиная с наихудших."""
+        rows = self.db.fetch_all(f"""
+            SELECT {', '.join(SUMMARY_COLUMNS)} FROM portfolio_client_summary
+            WHERE loan_total > 0 AND collateral_value < %s * loan_total
+            ORDER BY collateral_value / loan_total, client_id
+            LIMIT %s
+        """, (ratio, limit))
+        return [self._exposure(row) for row in rows]
+
+    def aging_buckets(self):
+        """Сумма просроченных платежей по корзинам дней просрочки на дату последнего обновления."""
+        row = self.db.fetch_one(f"SELECT {', '.join(f'coalesce(sum({column}), 0)' for _, column, _, _ in AGING_BUCKETS)} "
+                                f"FROM portfolio_client_summary")
+        return {name: value for (name, _, _, _), value in zip(AGING_BUCKETS, row)}
+
+    def portfolio_totals(self):
+        row = self.db.fetch_one(f"""
+            SELECT count(*), coalesce(sum(agreements), 0), coalesce(sum(loan_total), 0),
+                   coalesce(sum(commission_total), 0), coalesce(sum(collateral_value), 0),
+                   coalesce(sum(outstanding), 0), (SELECT as_of FROM portfolio_summary_state)
+            FROM portfolio_client_summary
+        """)
+        totals = dict(zip(('clients', 'agreements', 'loan_total', 'commission_total', 'collateral_value',
+                           'outstanding', 'as_of'), row))
+        totals['collateral_ratio'] = totals['collateral_value'] / totals['loan_total'] if totals['loan_total'] else None
+        return totals
+
+    def agreement_collateral_ratios(self, client_id):
+        """(agreement_id, loan_amount, item_value, отношение) по действующим соглашениям клиента."""
+        return self.db.fetch_all(f"""
+            SELECT a.agreement_id, a.loan_amount, i.item_value, i.item_value / NULLIF(a.loan_amount, 0)
+            FROM pledged_items i JOIN agreements a ON a.pledged_item_id = i.item_id
+            WHERE i.client_id = %s AND a.status_agreements <> '{Agreement.REPAID}'
+            ORDER BY a.agreement_id
+        """, (client_id,))
+
+    def close(self):
+        self.db.close()
+
+class ColumnarPortfolio:
+    """Те же показатели без базы данных: данные хранятся по столбцам в array, суммы — в копейках.
+
+    Отбор строк выполняется целыми столбцами (map и compress работают в C), а в цикле Python
+    обрабатываются только неоплаченные платежи действующих соглашений. Результаты по клиентам
+    запоминаются; после изменений пересчитываются только затронутые клиенты.
+    """
+
+    def __init__(self, items=(), agreements=(), payments=()):
+        # Залоги: item_id -> client_id и стоимость в копейках
+        self._item_client = {}
+        self._item_value = {}
+        # Соглашения по столбцам; позиция в столбцах — индекс соглашения
+        self._agreement_index = {}
+        self._agreement_item = array('q')
+        self._loan = array('q')
+        self._commission = array('q')
+        self._active = bytearray()
+        # Платежи по столбцам: индекс соглашения, дата (порядковый номер дня), сумма, признак неоплаченного
+        self._payment_index = {}
+        self._payment_agreement = array('q')
+        self._payment_day = array('l')
+        self._payment_amount = array('q')
+        self._unpaid = bytearray()
+        self._client_agreements = defaultdict(list)
+        self._agreement_payments = defaultdict(list)
+        # client_id -> показатели на дату _as_of; _dirty — клиенты, которые нужно пересчитать
+        self._summary = {}
+        self._as_of = None
+        self._dirty = set()
+        for item in items:
+            self.add_item(item)
+        for agreement in agreements:
+            self.add_agreement(agreement)
+        for payment in payments:
+            self.add_payment(payment)
+
+    @classmethod
+    def from_repositories(cls, items_rep, agreements_rep, payments_rep, batch_size=10000):
+        return cls(items_rep.iter_all(batch_size), agreements_rep.iter_all(batch_size),
+                   payments_rep.iter_all(batch_size))
+
+    @staticmethod
+    def _cents(value):
+        return int(value * 100) if value is not None else 0
+
+    def add_item(self, item):
+        self._item_client[item.get_item_id()] = item.get_client_id()
+        self._item_value[item.get_item_id()] = self._cents(item.get_item_value())
+        self._dirty.add(item.get_client_id())
+
+    def add_agreement(self, agreement):
+        index = len(self._loan)
+        self._agreement_index[agreement.get_agreement_id()] = index
+        self._agreement_item.append(agreement.get_pledged_item_id())
+        self._loan.append(self._cents(agreement.get_loan_amount()))
+        self._commission.append(self._cents(agreement.get_commission()))
+        self._active.append(agreement.get_status() != Agreement.REPAID)
+        client_id = self._item_client[agreement.get_pledged_item_id()]
+        self._client_agreements[client_id].append(index)
+        self._dirty.add(client_id)
+
+    def add_payment(self, payment):
+        agreement = self._agreement_index[payment.get_agreement_id()]
+        index = len(self._payment_amount)
+        self._payment_index[payment.get_payment_id()] = index
+        self._payment_agreement.append(agreement)
+        self._payment_day.append(payment.get_payment_date().toordinal())
+        self._payment_amount.append(self._cents(payment.get_payment_amount()))
+        self._unpaid.append(payment.get_status() != PaymentSchedule.PAID)
+        self._agreement_payments[agreement].append(index)
+        self._dirty.add(self._agreement_client(agreement))
+
+    def set_payment_status(self, payment_id, status):
+        index = self._payment_index[payment_id]
+        self._unpaid[index] = status != PaymentSchedule.PAID
+        self._dirty.add(self._agreement_client(self._payment_agreement[index]))
+
+    def set_agreement_status(self, agreement_id, status):
+        index = self._agreement_index[agreement_id]
+        self._active[index] = status != Agreement.REPAID
+        self._dirty.add(self._agreement_client(index))
+
+    def _agreement_client(self, agreement):
+        return self._item_client[self._agreement_item[agreement]]
+
+    def summary(self, as_of=None):
+        """client_id -> показатели, как в PortfolioAnalytics (только клиенты с действующими соглашениями)."""
+        as_of = as_of or date.today()
+        if as_of != self._as_of:
+            self._summary = self.__compute(None, as_of)
+            self._as_of = as_of
+        elif self._dirty:
+            for client_id in self._dirty:
+                self._summary.pop(client_id, None)
+            self._summary.update(self.__compute(self._dirty, as_of))
+        self._dirty = set()
+        return self._summary
+
+    def __compute(self, client_ids, as_of):
+        today = as_of.toordinal()
+        if client_ids is None:
+            # Неоплаченные платежи действующих соглашений отбираются маской по всему столбцу
+            active = self._active
+            mask = map(operator.and_, self._unpaid, map(active.__getitem__, self._payment_agreement))
+            payments = compress(range(len(self._payment_amount)), mask)
+            agreements = compress(range(len(self._loan)), active)
+        else:
+            agreements = [index for client_id in client_ids for index in self._client_agreements.get(client_id, ())
+                          if self._active[index]]
+            payments = (index for agreement in agreements for index in self._agreement_payments.get(agreement, ())
+                        if self._unpaid[index])
+        totals = {}
+        items = defaultdict(set)
+        for index in agreements:
+            item_id = self._agreement_item[index]
+            client_id = self._item_client[item_id]
+            row = totals.get(client_id)
+            if row is None:
+                row = totals[client_id] = [0] * (len(SUMMARY_COLUMNS) - 1)
+            row[0] += 1
+            row[1] += self._loan[index]
+            row[2] += self._commission[index]
+            items[client_id].add(item_id)
+        for client_id, item_ids in items.items():
+            totals[client_id][3] = sum(map(self._item_value.__getitem__, item_ids))
+        bounds = [(low, high if high is not None else float('inf')) for _, _, low, high in AGING_BUCKETS]
+        for index in payments:
+            row = totals[self._agreement_client(self._payment_agreement[index])]
+            amount = self._payment_amount[index]
+            row[4] += amount
+            overdue = today - self._payment_day[index]
+            if overdue > 0:
+                for bucket, (low, high) in enumerate(bounds):
+                    if low <= overdue <= high:
+                        row[5 + bucket] += amount
+                        break
+        summary = {}
+        for client_id, row in totals.items():
+            exposure = {'client_id': client_id, 'agreements': row[0]}
+            exposure.update(zip(SUMMARY_COLUMNS[2:], map(_money, row[1:])))
+            exposure['collateral_ratio'] = exposure['collateral_value'] / exposure['loan_total'] \
+                if exposure['loan_total'] else None
+            summary[client_id] = exposure
+        return summary
+
+    def client_exposure(self, client_id, as_of=None):
+        return self.summary(as_of).get(client_id)
+
+    def top_exposures(self, limit=20, as_of=None):
+        return sorted(self.summary(as_of).values(), key=lambda row: (-row['outstanding'], row['client_id']))[:limit]
+
+    def aging_buckets(self, as_of=None):
+        summary = self.summary(as_of).values()
+        return {name: sum((row[column] for row in summary), Decimal('0.00')) for name, column, _, _ in AGING_BUCKETS}
@@ -0,0 +1,236 @@
+import time
+import asyncio
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager
+
+async def wait_ready(connection):
+    """Ждёт завершения операции асинхронного соединения psycopg2, не блокируя цикл событий."""
+    from psycopg2.extensions import POLL_OK, POLL_READ
+    loop = asyncio.get_running_loop()
+    while True:
+        state = connection.poll()
+        if state == POLL_OK:
+            return
+        ready = loop.create_future()
+        fileno = connection.fileno()
+        if state == POLL_READ:
+            loop.add_reader(fileno, lambda: ready.done() or ready.set_result(None))
+            remove = loop.remove_reader
+        else:
+            loop.add_writer(fileno, lambda: ready.done() or ready.set_result(None))
+            remove = loop.remove_writer
+        try:
+            await ready
+        finally:
+            remove(fileno)
+
+class AsyncConnectionPool:
+    """Пул асинхронных соединений с PostgreSQL для одного цикла событий."""
+
+    def __init__(self, db_config, min_size=1, max_size=10, timeout=30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must satisfy 0 <= min_size <= max_size and max_size >= 1.")
+        self.db_config = db_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = deque()
+        self._size = 0
+        self._condition = asyncio.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'checkout_time_total': 0.0,
+            'checkout_time_max': 0.0,
+        }
+
+    async def _connect(self):
+        import psycopg2
+        connection = psycopg2.connect(**self.db_config, async_=1)
+        try:
+            await wait_ready(connection)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    async def fill(self):
+        """Открывает соединения до min_size."""
+        while self._size < self.min_size:
+            self._size += 1
+            try:
+                connection = await self._connect()
+            except BaseException:
+                self._size -= 1
+                raise
+            async with self._condition:
+                self._idle.append(connection)
+                self._condition.notify()
+
+    async def getconn(self):
+        started = time.monotonic()
+        waited = False
+        async with self._condition:
+            while True:
+                while self._idle:
+                    connection = self._idle.pop()
+                    if not connection.closed:
+                        break
+                    self._size -= 1
+                else:
+                    connection = None
+                if connection is not None:
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = started + self.timeout - time.monotonic()
+                waited = True
+                try:
+                    await asyncio.wait_for(self._condition.wait(), remaining)
+                except asyncio.TimeoutError:
+                    self._stats['timeouts'] += 1
+                    raise TimeoutError(f"Could not get a database connection within {self.timeout} s.")
+        if connection is None:
+            try:
+                connection = await self._connect()
+            except BaseException:
+                async with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+        elapsed = time.monotonic() - started
+        self._stats['checkouts'] += 1
+        self._stats['waits'] += waited
+        self._stats['checkout_time_total'] += elapsed
+        self._stats['checkout_time_max'] = max(self._stats['checkout_time_max'], elapsed)
+        return connection
+
+    async def putconn(self, connection, discard=False):
+        async with self._condition:
+            if discard or connection.closed:
+                connection.close()
+                self._size -= 1
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+
+    @asynccontextmanager
+    async def connection(self):
+        import psycopg2
+        connection = await self.getconn()
+        try:
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, asyncio.CancelledError):
+            # Разорванное соединение или прерванный посреди запроса обмен повторно не используем
+            await self.putconn(connection, discard=True)
+            raise
+        except BaseException:
+            await self.putconn(connection)
+            raise
+        else:
+            await self.putconn(connection)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['size'] = self._size
+        stats['idle'] = len(self._idle)
+        stats['in_use'] = self._size - len(self._idle)
+        stats['checkout_time_avg'] = (stats['checkout_time_total'] / stats['checkouts']
+                                      if stats['checkouts'] else 0.0)
+        return stats
+
+    async def close(self):
+        """Закрывает свободные соединения; пул остаётся рабочим и откроет новые по требованию."""
+        async with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for connection in idle:
+            connection.close()
+
+class AsyncDatabaseConnection:
+    """Асинхронный аналог DatabaseConnection поверх AsyncConnectionPool."""
+
+    def __init__(self, db_config, pool=None, **pool_options):
+        self.db_config = db_config
+        self.pool = pool or AsyncConnectionPool(db_config, **pool_options)
+        # Соединение транзакции текущей задачи; задачи, запущенные внутри transaction(), его наследуют
+        self._transaction = contextvars.ContextVar('transaction', default=None)
+
+    async def connect(self):
+        await self.pool.fill()
+
+    @staticmethod
+    async def _run(connection, query, params, fetch=None):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params or ())
+            await wait_ready(connection)
+            return fetch(cursor) if fetch else cursor.rowcount
+        finally:
+            cursor.close()
+
+    async def _execute(self, query, params, fetch=None):
+        connection = self._transaction.get()
+        if connection is not None:
+            return await self._run(connection, query, params, fetch)
+        # Соединения работают в режиме autocommit, отдельная фиксация не нужна
+        async with self.pool.connection() as connection:
+            return await self._run(connection, query, params, fetch)
+
+    async def _retry_read(self, query, params, fetch):
+        # Чтение вне транзакции безопасно повторить на новом соединении
+        import psycopg2
+        try:
+            return await self._execute(query, params, fetch)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            if self._transaction.get() is not None:
+                raise
+            return await self._execute(query, params, fetch)
+
+    async def execute_query(self, query, params=None):
+        """Выполняет запрос и возвращает число затронутых строк."""
+        return await self._execute(query, params)
+
+    async def execute_returning(self, query, params=None):
+        """Изменяющий запрос с RETURNING: первая строка результата. В отличие от fetch_one при обрыве
+        соединения не повторяется — запрос мог уже выполниться."""
+        return await self._execute(query, params, lambda cursor: cursor.fetchone())
+
+    async def fetch_all(self, query, params=None):
+        return await self._retry_read(query, params, lambda cursor: cursor.fetchall())
+
+    async def fetch_one(self, query, params=None):
+        return await self._retry_read(query, params, lambda cursor: cursor.fetchone())
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Выполняет запросы в одной транзакции; параллельно внутри неё запросы не запускаются."""
+        if self._transaction.get() is not None:
+            yield
+            return
+        import psycopg2
+        async with self.pool.connection() as connection:
+            token = self._transaction.set(connection)
+            try:
+                await self._run(connection, "BEGIN", None)
+                yield
+                await self._run(connection, "COMMIT", None)
+            except BaseException:
+                if not connection.closed:
+                    try:
+                        await self._run(connection, "ROLLBACK", None)
+                    except psycopg2.Error:
+                        pass
+                raise
+            finally:
+                self._transaction.reset(token)
+
+    def stats(self):
+        return self.pool.stats()
+
+    async def close(self):
+        await self.pool.close()
@@ -0,0 +1,242 @@
+import asyncio
+from BaseClient import BaseClient, BaseClientShortInfo, BaseClientPostgresRep
+from async_database import AsyncDatabaseConnection
+from cache import ClientCache
+from sorting import parse_sort_keys, order_by_sql
+
+class BaseClientAsyncPostgresRep:
+    """Неблокирующий репозиторий клиентов в PostgreSQL для asyncio-сервисов."""
+    COLUMNS = BaseClientPostgresRep.COLUMNS
+    BATCH_SIZE = 1000
+
+    def __init__(self, db_config, validate_rows=False, cache=None, max_concurrency=None, **pool_options):
+        self.db = AsyncDatabaseConnection(db_config, **pool_options)
+        self.cache = cache or ClientCache.shared(db_config)
+        self.validate_rows = validate_rows
+        # Больше операций, чем соединений в пуле, одновременно не выполняется; остальные ждут своей очереди
+        self._limit = asyncio.Semaphore(max_concurrency or self.db.pool.max_size)
+        self.db_config = db_config
+        self._page_boundaries = {}
+        # Как в BaseClientPostgresRep: границы страниц хранятся между вызовами только при track_changes()
+        self._change_feed = None
+        self._changes = 0
+
+    def _row_to_client(self, row):
+        if self.validate_rows:
+            return BaseClient(*row)
+        return BaseClient.from_trusted(*row)
+
+    async def _fetch_all(self, query, params=None):
+        async with self._limit:
+            return await self.db.fetch_all(query, params)
+
+    async def _fetch_one(self, query, params=None):
+        async with self._limit:
+            return await self.db.fetch_one(query, params)
+
+    async def _execute(self, query, params=None):
+        async with self._limit:
+            return await self.db.execute_query(query, params)
+
+    async def __fetch_row(self, client_id):
+        return await self._fetch_one(f"SELECT {self.COLUMNS} FROM clients WHERE client_id = %s", (client_id,))
+
+    async def get_by_id(self, client_id):
+        row = await self.cache.get_async(client_id, self.__fetch_row)
+        if row:
+            return self._row_to_client(row)
+        else:
+            raise ValueError(f"Client with ID {client_id} not found")
+
+    async def get_many(self, client_ids):
+        """Клиенты в порядке client_ids (None для отсутствующих); промахи кэша читаются одним запросом на порцию."""
+        client_ids = list(client_ids)
+        rows, missing = {}, {}
+        for client_id in client_ids:
+            found, row, version = self.cache.lookup(client_id)
+            if found:
+                rows[client_id] = row
+            else:
+                missing.setdefault(client_id, version)
+        missing_ids = list(missing)
+        chunks = [missing_ids[start:start + self.BATCH_SIZE] for start in range(0, len(missing_ids), self.BATCH_SIZE)]
+        results = await asyncio.gather(*(
+            self._fetch_all(f"SELECT {self.COLUMNS} FROM clients WHERE client_id = ANY(%s)", (chunk,))
+            for chunk in chunks))
+        for chunk_rows in results:
+            for row in chunk_rows:
+                rows[row[0]] = row
+                self.cache.put(row[0], row, missing[row[0]])
+        return [self._row_to_client(rows[client_id]) if client_id in rows else None for client_id in client_ids]
+
+    async def __is_unique(self, document, unverifiable_client_id=None):
+        result = await self._fetch_one("SELECT client_id FROM clients WHERE document = %s", (document,))
+        return result is None or result[0] == unverifiable_client_id
+
+    async def get_new_id(self):
+        result = await self._fetch_one("SELECT MAX(client_id) FROM clients")
+        return (result[0] or 0) + 1
+
+    async def add_client(self, fullname, document, age, phone_number, address, email):
+        """client_id назначает сам INSERT; при параллельных вставках он пересчитывается, пока не окажется свободным.
+
+        Уникальность документа обеспечивает ограничение таблицы, а не предварительная проверка.
+        """
+        from psycopg2 import errors
+        # Поля проверяются до обращения к базе; 1 — временный client_id только для проверки
+        fields = BaseClientPostgresRep._client_to_row(BaseClient(1, fullname, document, age, phone_number,
+                                                                  address, email))[1:]
+        while True:
+            try:
+                async with self._limit:
+                    (new_id,) = await self.db.execute_returning(f"""
+                        INSERT INTO clients ({self.COLUMNS})
+                        SELECT COALESCE(MAX(client_id), 0) + 1, %s, %s, %s::integer, %s, %s, %s FROM clients
+                        RETURNING client_id
+                    """, fields)
+                break
+            except errors.UniqueViolation:
+                if not await self.__is_unique(document):
+                    raise ValueError("Client with this document already exists.") from None
+                # Тот же client_id заняла параллельная вставка: следующая попытка возьмёт новый MAX
+        self._page_boundaries.clear()
+        return BaseClient.from_trusted(new_id, *fields)
+
+    async def replace_by_id(self, client_id, new_client):
+        from psycopg2 import errors
+        if not await self.__is_unique(new_client.get_document(), client_id):
+            raise ValueError(f"Client with this document already exists.")
+        query = """
+            UPDATE clients
+            SET fullname = %s, document = %s, age = %s, phone_number = %s, address = %s, email = %s
+            WHERE client_id = %s
+        """
+        try:
+            await self._execute(query, (new_client.get_fullname(), new_client.get_document(), new_client.get_age(),
+                                        new_client.get_phone_number(), new_client.get_address(),
+                                        new_client.get_email(), client_id))
+        except errors.UniqueViolation:
+            # Документ заняли между проверкой и обновлением
+            raise ValueError("Client with this document already exists.") from None
+        self.cache.invalidate(client_id)
+        return True
+
+    async def delete_by_id(self, client_id):
+        await self._execute("DELETE FROM clients WHERE client_id = %s", (client_id,))
+        self._page_boundaries.clear()
+        self.cache.invalidate(client_id)
+
+    async def get_short_page(self, n, after_id=None):
+        query = "SELECT client_id, fullname, document FROM clients WHERE client_id > %s ORDER BY client_id LIMIT %s"
+        rows = await self._fetch_all(query, (after_id or 0, n))
+        factory = BaseClientShortInfo if self.validate_rows else BaseClientShortInfo.from_trusted
+        return [factory(*row) for row in rows]
+
+    async def get_k_n_short_list(self, k, n):
+        if self._change_feed is None:
+            self._page_boundaries.clear()
+        changes = self._changes
+        after_id = await self.__page_start(k, n, changes)
+        if after_id is None:
+            return []
+        page = await self.get_short_page(n, after_id)
+        if page:
+            self.__remember_boundary((n, k), page[-1].get_client_id(), changes)
+        return page
+
+    def __remember_boundary(self, key, client_id, changes):
+        if changes == self._changes:
+            self._page_boundaries[key] = client_id
+
+    async def __page_start(self, k, n, changes):
+        if k <= 1:
+            return 0
+        boundaries = dict(self._page_boundaries)
+        if (n, k - 1) in boundaries:
+            return boundaries[(n, k - 1)]
+        known = max((page for size, page in boundaries if size == n and page < k), default=0)
+        after_id = boundaries.get((n, known), 0)
+        query = "SELECT client_id FROM clients WHERE client_id > %s ORDER BY client_id OFFSET %s LIMIT 1"
+        row = await self._fetch_one(query, (after_id, (k - 1 - known) * n - 1))
+        if row is None:
+            return None
+        self.__remember_boundary((n, k - 1), row[0], changes)
+        return row[0]
+
+    def track_changes(self):
+        """Сбрасывает границы страниц и кэш строк по ленте изменений clients; см. BaseClientPostgresRep."""
+        if self._change_feed is not None:
+            return
+        from change_feed import ClientChangeFeed
+        change_feed = ClientChangeFeed(self.db_config, self.__on_change)
+        change_feed.start()
+        self._change_feed = change_feed
+
+    def __on_change(self, delta):
+        # Вызывается из потока ленты изменений, а не из цикла событий
+        self._changes += 1
+        self._page_boundaries.clear()
+        if delta.client_id is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(delta.client_id)
+
+    async def sort_by_field(self, *fields, offset=0, limit=None):
+        query = f"SELECT {self.COLUMNS} FROM clients ORDER BY {order_by_sql(parse_sort_keys(fields))} LIMIT %s OFFSET %s"
+        return [self._row_to_client(row) for row in await self._fetch_all(query, (limit, offset))]
+
+    async def iter_clients(self, batch_size=1000):
+        """Асинхронно перебирает таблицу порциями по ключу client_id."""
+        after_id = 0
+        while True:
+            rows = await self._fetch_all(
+                f"SELECT {self.COLUMNS} FROM clients WHERE client_id > %s ORDER BY client_id LIMIT %s",
+                (after_id, batch_size))
+            for row in rows:
+                yield self._row_to_client(row)
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1][0]
+
+    async def get_count(self):
+        return (await self._fetch_one("SELECT COUNT(*) FROM clients"))[0]
+
+    async def close(self):
+        if self._change_feed is not None:
+            self._change_feed.stop()
+            self._change_feed = None
+        await self.db.close()
+
+class BaseClientAsyncManager:
+    def __init__(self, repository):
+        self.repository = repository
+
+    async def add_client(self, fullname, document, age, phone_number, address, email):
+        return await self.repository.add_client(fullname, document, age, phone_number, address, email)
+
+    async def get_client_by_id(self, client_id):
+        return await self.repository.get_by_id(client_id)
+
+    async def get_clients_by_ids(self, client_ids):
+        return await self.repository.get_many(client_ids)
+
+    async def replace_client(self, client_id, new_client):
+        return await self.repository.replace_by_id(client_id, new_client)
+
+    async def delete_client(self, client_id):
+        return await self.repository.delete_by_id(client_id)
+
+    async def get_k_n_short_list(self, k, n):
+        return await self.repository.get_k_n_short_list(k, n)
+
+    async def get_short_page(self, n, after_id=None):
+        return await self.repository.get_short_page(n, after_id)
+
+    async def sort_by_field(self, *fields, offset=0, limit=None):
+        return await self.repository.sort_by_field(*fields, offset=offset, limit=limit)
+
+    def iter_clients(self, batch_size=1000):
+        return self.repository.iter_clients(batch_size)
+
+    async def get_count(self):
+        return await self.repository.get_count()
@@ -0,0 +1,62 @@
+import importlib
+from config import replica_configs
+
+class BackendRegistry:
+    """Хранилища клиентов по имени.
+
+    Регистрируется только строка 'модуль:Класс': модуль хранилища и его драйвер (psycopg2, yaml)
+    импортируются при первом обращении к хранилищу, а не при импорте реестра.
+    """
+
+    def __init__(self):
+        # имя -> (цель 'модуль:Класс', модуль драйвера или None, функция настроек -> аргументы конструктора)
+        self._backends = {}
+        self._loaded = {}
+
+    def register(self, name, target, driver=None, arguments=None, options=None):
+        # arguments(config) -> позиционные аргументы конструктора, options(config) -> именованные
+        self._backends[name] = (target, driver, arguments or (lambda config: ()), options or (lambda config: {}))
+        self._loaded.pop(name, None)
+
+    def names(self):
+        return sorted(self._backends)
+
+    def load(self, name):
+        """Класс хранилища name; при первом вызове импортирует его модуль и драйвер."""
+        repository_class = self._loaded.get(name)
+        if repository_class is not None:
+            return repository_class
+        if name not in self._backends:
+            raise ValueError(f"Unknown backend: {name}. Available: {', '.join(self.names())}.")
+        target, driver, _, _ = self._backends[name]
+        if driver is not None:
+            try:
+                importlib.import_module(driver)
+            except ImportError as e:
+                raise RuntimeError(f"Backend '{name}' requires the '{driver}' package: {e}")
+        module_name, class_name = target.split(':')
+        repository_class = self._loaded[name] = getattr(importlib.import_module(module_name), class_name)
+        return repository_class
+
+    def create(self, config, **options):
+        """Хранилище config['backend'], созданное по настройкам из config.load_config()."""
+        name = config['backend']
+        repository_class = self.load(name)
+        _, _, arguments, defaults = self._backends[name]
+        return repository_class(*arguments(config), **dict(defaults(config), **options))
+
+BACKENDS = BackendRegistry()
+BACKENDS.register('postgres', 'BaseClient:BaseClientPostgresRep', driver='psycopg2',
+                  arguments=lambda config: (config['db'],),
+                  options=lambda config: {'replicas': replica_configs(config)})
+BACKENDS.register('json', 'BaseClient:BaseClient_Rep_Json',
+                  arguments=lambda config: (config['filename'] or 'clients.json',))
+BACKENDS.register('yaml', 'BaseClient:BaseClient_Rep_Yaml', driver='yaml',
+                  arguments=lambda config: (config['filename'] or 'clients.yaml',))
+BACKENDS.register('binary', 'BaseClient:BaseClient_Rep_Binary',
+                  arguments=lambda config: (config['filename'] or 'clients.bin',))
+# Шарды и индекс маршрутизации описываются в config['shards'] и config['routing']
+BACKENDS.register('sharded', 'sharding:create_sharded_repository', arguments=lambda config: (config,))
+
+def create_repository(config, **options):
+    return BACKENDS.create(config, **options)
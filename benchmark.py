@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from contextlib import contextmanager
+from BaseClient import (BaseClient, BaseClient_Rep_Json, BaseClient_Rep_Yaml, BaseClient_Rep_Binary,
+                        BaseClientPostgresRep, BaseClientJsonAdapter, BaseClientYamlAdapter,
+                        BaseClientBinaryAdapter, BaseClientPostgresAdapter)
+from config import load_config
+
+FIRST_NAMES = ("Иван", "Пётр", "Анна", "Мария", "Гамлет", "Ольга", "Сергей", "Елена", "Алексей", "Дарья")
+LAST_NAMES = ("Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов", "Новиков")
+CITIES = ("Москва", "Санкт-Петербург", "Казань", "Краснодар", "Новосибирск", "Екатеринбург")
+BACKENDS = ('json', 'yaml', 'binary', 'postgres', 'json-adapter', 'yaml-adapter', 'binary-adapter', 'postgres-adapter')
+OPERATIONS = ('read_all', 'get_by_id', 'get_k_n_short_list', 'sort_by_field', 'replace_by_id',
+              'add_client', 'delete_by_id')
+READ_OPERATIONS = ('read_all', 'get_by_id', 'get_k_n_short_list', 'sort_by_field')
+PAGE_SIZE = 20
+
+def make_client(index, rng):
+    """Корректный клиент с уникальным по index документом."""
+    return BaseClient.from_trusted(
+        index, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        f"{index // 1000000:04d} {index % 1000000:06d}", rng.randint(19, 90),
+        f"89{rng.randint(0, 999999999):09d}", rng.choice(CITIES), f"client{index}@mail.ru")
+
+def generate_clients(count, seed=0):
+    rng = random.Random(seed)
+    return [make_client(index, rng) for index in range(1, count + 1)]
+
+@contextmanager
+def postgres_sandbox(server_config):
+    """Временная база с таблицей clients; удаляется после замеров."""
+    import psycopg2
+    name = f"clients_bench_{os.getpid()}"
+    admin = psycopg2.connect(**dict(server_config, dbname='postgres'))
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+            cursor.execute(f"CREATE DATABASE {name}")
+        config = dict(server_config, dbname=name)
+        with psycopg2.connect(**config) as connection, connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE clients (
+                    client_id integer PRIMARY KEY,
+                    fullname varchar,
+                    document varchar UNIQUE,
+                    age integer,
+                    phone_number varchar,
+                    address varchar,
+                    email varchar
+                )
+            """)
+        connection.close()
+        yield config
+    finally:
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.close()
+
+@contextmanager
+def open_backend(backend, clients, workdir, server_config):
+    """Репозиторий (или адаптер) выбранного вида, заполненный clients."""
+    kind = backend.split('-')[0]
+    with (postgres_sandbox(server_config) if kind == 'postgres' else _nothing()) as config:
+        if kind == 'postgres':
+            repository = BaseClientPostgresRep(config)
+            for start in range(0, len(clients), 100000):
+                repository.add_clients(clients[start:start + 100000])
+            repository.db.execute_query("ANALYZE clients")
+        else:
+            path = os.path.join(workdir, f"clients.{kind}")
+            for filename in (path, path + '.id.idx', path + '.doc.idx'):
+                if os.path.exists(filename):
+                    os.remove(filename)
+            factory = {'json': BaseClient_Rep_Json, 'yaml': BaseClient_Rep_Yaml, 'binary': BaseClient_Rep_Binary}[kind]
+            repository = factory(path)
+            repository.save_all(clients)
+            repository.close()
+            # Следующий экземпляр прочитает файл с диска, как при обычном запуске
+            repository = factory(path)
+        if backend.endswith('-adapter'):
+            adapter = {'json': BaseClientJsonAdapter, 'yaml': BaseClientYamlAdapter,
+                       'binary': BaseClientBinaryAdapter, 'postgres': BaseClientPostgresAdapter}[kind]
+            repository = adapter(repository)
+        try:
+            yield repository
+        finally:
+            repository.close()
+
+@contextmanager
+def _nothing():
+    yield None
+
+class OperationPlan:
+    """Аргументы вызовов каждой операции, заранее выбранные одинаково для всех хранилищ."""
+
+    def __init__(self, size, ops, seed):
+        rng = random.Random(seed)
+        self.size = size
+        self.ids = [rng.randint(1, size) for _ in range(ops)]
+        self.pages = [rng.randint(1, max(1, size // PAGE_SIZE)) for _ in range(ops)]
+        self.replacements = [make_client(client_id, rng) for client_id in self.ids]
+        self.new_clients = [make_client(size + 1 + index, rng) for index in range(ops)]
+
+    def calls(self, repository, operation):
+        if operation == 'read_all':
+            return [lambda: repository.read_all()]
+        if operation == 'get_by_id':
+            return [lambda client_id=client_id: repository.get_by_id(client_id) for client_id in self.ids]
+        if operation == 'get_k_n_short_list':
+            return [lambda k=k: repository.get_k_n_short_list(k, PAGE_SIZE) for k in self.pages]
+        if operation == 'sort_by_field':
+            # Страница списка, упорядоченного по ФИО и убыванию возраста
+            return [lambda k=k: repository.sort_by_field('fullname', '-age', offset=(k - 1) * PAGE_SIZE,
+                                                         limit=PAGE_SIZE) for k in self.pages]
+        if operation == 'replace_by_id':
+            return [lambda client=client: repository.replace_by_id(client.get_client_id(), client)
+                    for client in self.replacements]
+        if operation == 'add_client':
+            return [lambda client=client: repository.add_client(
+                client.get_fullname(), client.get_document(), client.get_age(), client.get_phone_number(),
+                client.get_address(), client.get_email()) for client in self.new_clients]
+        if operation == 'delete_by_id':
+            # add_client выдаёт id подряд после наибольшего; удаляем их, возвращая хранилище к исходному размеру
+            return [lambda client_id=client_id: repository.delete_by_id(client_id)
+                    for client_id in range(self.size + 1, self.size + 1 + len(self.new_clients))]
+        raise ValueError(f"Unknown operation: {operation}")
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def measure(calls):
+    """Задержки вызовов в секундах."""
+    latencies = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def peak_memory(call):
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_operation(repository, plan, operation, trace_memory):
+    result = {'operation': operation}
+    try:
+        calls = plan.calls(repository, operation)
+        if trace_memory:
+            # Вызов под tracemalloc заметно медленнее, поэтому в задержки не входит;
+            # читающие операции затем повторяются, изменяющие — нет
+            result['peak_memory_bytes'] = peak_memory(calls[0])
+            if operation not in READ_OPERATIONS:
+                calls = calls[1:]
+        latencies = measure(calls) if calls else []
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result
+    if not latencies:
+        return result
+    total = sum(latencies)
+    result.update(calls=len(latencies), total_s=total,
+                  throughput_ops_s=len(latencies) / total if total else None,
+                  p50_ms=percentile(latencies, 0.50) * 1000, p99_ms=percentile(latencies, 0.99) * 1000)
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sizes, backends, ops, seed, server_config, workdir, trace_memory=True, progress=print):
+    results = []
+    for size in sizes:
+        clients = generate_clients(size, seed)
+        plan = OperationPlan(size, ops, seed + size)
+        for backend in backends:
+            progress(f"{backend}: {size} rows")
+            started = time.perf_counter()
+            try:
+                with open_backend(backend, clients, workdir, server_config) as repository:
+                    setup = time.perf_counter() - started
+                    for operation in OPERATIONS:
+                        result = run_operation(repository, plan, operation, trace_memory)
+                        result.update(backend=backend, size=size)
+                        results.append(result)
+                        progress(f"  {operation}: " + (result.get('error') or
+                                 f"p50 {result['p50_ms']:.3f} ms, p99 {result['p99_ms']:.3f} ms"))
+            except Exception as e:
+                results.append({'backend': backend, 'size': size, 'operation': 'setup',
+                                'error': f"{type(e).__name__}: {e}"})
+                progress(f"  setup failed: {e}")
+                continue
+            results.append({'backend': backend, 'size': size, 'operation': 'setup', 'calls': 1, 'total_s': setup})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the client repositories.")
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--ops', type=int, default=50, help="calls per point operation")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc peak memory runs")
+    db_config = load_config()['db']
+    parser.add_argument('--pg-host', default=db_config.get('host'))
+    parser.add_argument('--pg-port', default=db_config.get('port'))
+    parser.add_argument('--pg-user', default=db_config.get('user'))
+    parser.add_argument('--pg-password', default=db_config.get('password'))
+    args = parser.parse_args()
+
+    backends = args.backends.split(',')
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+    server_config = {'host': args.pg_host, 'port': args.pg_port, 'user': args.pg_user, 'password': args.pg_password}
+    workdir = tempfile.mkdtemp(prefix='clients_bench_')
+    try:
+        results = run([int(size) for size in args.sizes.split(',')], backends, args.ops, args.seed,
+                      server_config, workdir, trace_memory=not args.no_memory)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'ops': args.ops,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import time
+import threading
+from collections import OrderedDict
+
+class ClientCache:
+    """Потокобезопасный read-through кэш с вытеснением LRU и временем жизни записей."""
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Растёт при каждой инвалидации, чтобы не сохранить значение, прочитанное до неё
+        self._version = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    @classmethod
+    def shared(cls, db_config, **options):
+        """Общий кэш для всех пользователей одной базы данных."""
+        key = tuple(sorted(db_config.items()))
+        with cls._shared_lock:
+            cache = cls._shared.get(key)
+            if cache is None:
+                cache = cls._shared[key] = cls(**options)
+            return cache
+
+    def lookup(self, key):
+        """Возвращает (найдено, значение, версия); версию передают в put после загрузки значения."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return True, value, self._version
+                del self._entries[key]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            return False, None, self._version
+
+    def get(self, key, loader=None):
+        """Возвращает значение из кэша, а при промахе загружает его через loader(key) и запоминает."""
+        found, value, version = self.lookup(key)
+        if found or loader is None:
+            return value
+        value = loader(key)
+        if value is not None:
+            self.put(key, value, version)
+        return value
+
+    async def get_async(self, key, loader):
+        """То же, что get, но loader — корутина."""
+        found, value, version = self.lookup(key)
+        if found:
+            return value
+        value = await loader(key)
+        if value is not None:
+            self.put(key, value, version)
+        return value
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            requests = stats['hits'] + stats['misses']
+            stats['hit_ratio'] = stats['hits'] / requests if requests else 0.0
+            return stats
@@ -0,0 +1,172 @@
+import json
+import time
+import select
+import threading
+
+class ClientDelta:
+    """Изменение одной строки таблицы clients, полученное через LISTEN/NOTIFY."""
+    INSERT = 'INSERT'
+    UPDATE = 'UPDATE'
+    DELETE = 'DELETE'
+    # Уведомления могли потеряться (переподключение, TRUNCATE): нужна полная перезагрузка
+    RESYNC = 'RESYNC'
+    __slots__ = ('op', 'client_id', 'row')
+
+    def __init__(self, op, client_id=None, row=None):
+        self.op = op
+        self.client_id = client_id
+        # (client_id, fullname, document, age, phone_number, address, email) или None для DELETE
+        self.row = row
+
+    def __repr__(self):
+        return f"ClientDelta({self.op}, {self.client_id}, {self.row})"
+
+class ClientChangeFeed:
+    """Получает изменения таблицы clients от триггера через LISTEN/NOTIFY в отдельном потоке."""
+    CHANNEL = 'clients_changes'
+    COLUMNS = ('client_id', 'fullname', 'document', 'age', 'phone_number', 'address', 'email')
+    # Предел pg_notify — 8000 байт; большие строки отправляются без данных и дочитываются запросом
+    MAX_PAYLOAD = 7900
+
+    def __init__(self, db_config, callback, channel=CHANNEL, reconnect_delay=1.0):
+        self.db_config = db_config
+        self.callback = callback
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._connection = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def install(self):
+        """Создаёт (или обновляет) триггер, отправляющий уведомления об изменениях clients.
+
+        Требует прав владельца таблицы и блокирует её целиком, поэтому выполняется отдельно от приложения
+        администратором: python cli.py install-change-feed.
+        """
+        import psycopg2
+        connection = psycopg2.connect(**self.db_config)
+        try:
+            with connection, connection.cursor() as cursor:
+                cursor.execute(f"""
+                    CREATE OR REPLACE FUNCTION clients_notify_change() RETURNS trigger AS $$
+                    DECLARE
+                        payload text;
+                    BEGIN
+                        IF TG_OP = 'TRUNCATE' THEN
+                            payload := json_build_object('op', 'RESYNC')::text;
+                        ELSIF TG_OP = 'DELETE' THEN
+                            payload := json_build_object('op', TG_OP, 'client_id', OLD.client_id)::text;
+                        ELSE
+                            payload := json_build_object(
+                                'op', TG_OP, 'client_id', NEW.client_id,
+                                'old_client_id', CASE WHEN TG_OP = 'UPDATE' THEN OLD.client_id END,
+                                'row', row_to_json(NEW))::text;
+                            IF octet_length(payload) > {self.MAX_PAYLOAD} THEN
+                                payload := json_build_object(
+                                    'op', TG_OP, 'client_id', NEW.client_id,
+                                    'old_client_id', CASE WHEN TG_OP = 'UPDATE' THEN OLD.client_id END)::text;
+                            END IF;
+                        END IF;
+                        PERFORM pg_notify('{self.channel}', payload);
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql;
+                    DROP TRIGGER IF EXISTS clients_notify_change ON clients;
+                    CREATE TRIGGER clients_notify_change AFTER INSERT OR UPDATE OR DELETE ON clients
+                        FOR EACH ROW EXECUTE FUNCTION clients_notify_change();
+                    DROP TRIGGER IF EXISTS clients_notify_truncate ON clients;
+                    CREATE TRIGGER clients_notify_truncate AFTER TRUNCATE ON clients
+                        FOR EACH STATEMENT EXECUTE FUNCTION clients_notify_change();
+                """)
+        finally:
+            connection.close()
+
+    def is_installed(self):
+        import psycopg2
+        connection = psycopg2.connect(**self.db_config)
+        try:
+            with connection, connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_trigger WHERE tgname = 'clients_notify_change' "
+                               "AND tgrelid = to_regclass('clients')")
+                return cursor.fetchone() is not None
+        finally:
+            connection.close()
+
+    def _listen(self):
+        import psycopg2
+        connection = psycopg2.connect(**self.db_config)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        self._connection = connection
+
+    def start(self):
+        """Начинает LISTEN; RuntimeError, если триггер не установлен и уведомлений не будет."""
+        if not self.is_installed():
+            raise RuntimeError("change feed trigger is not installed (run: python cli.py install-change-feed)")
+        self._stopped.clear()
+        self._listen()
+        self._thread = threading.Thread(target=self._run, name='clients-change-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _run(self):
+        import psycopg2
+        while not self._stopped.is_set():
+            try:
+                # Таймаут нужен только для того, чтобы заметить stop()
+                if select.select([self._connection], [], [], 0.5) == ([], [], []):
+                    continue
+                self._connection.poll()
+                while self._connection.notifies:
+                    notify = self._connection.notifies.pop(0)
+                    for delta in self._parse(notify.payload):
+                        self.callback(delta)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._reconnect()
+
+    def _reconnect(self):
+        import psycopg2
+        while not self._stopped.is_set():
+            try:
+                self._connection.close()
+                self._listen()
+            except psycopg2.OperationalError:
+                time.sleep(self.reconnect_delay)
+                continue
+            # Пока соединения не было, уведомления терялись
+            self.callback(ClientDelta(ClientDelta.RESYNC))
+            return
+
+    def _parse(self, payload):
+        data = json.loads(payload)
+        op = data['op']
+        if op == ClientDelta.RESYNC:
+            return [ClientDelta(ClientDelta.RESYNC)]
+        if op == ClientDelta.DELETE:
+            return [ClientDelta(op, data['client_id'])]
+        row = data.get('row')
+        row = tuple(row[column] for column in self.COLUMNS) if row else self._fetch_row(data['client_id'])
+        if row is None:
+            # Строку уже удалили; об этом придёт отдельное уведомление
+            return []
+        deltas = []
+        if op == ClientDelta.UPDATE and data['old_client_id'] != data['client_id']:
+            # Смена первичного ключа: для подписчиков это удаление старой строки и вставка новой
+            deltas.append(ClientDelta(ClientDelta.DELETE, data['old_client_id']))
+            op = ClientDelta.INSERT
+        deltas.append(ClientDelta(op, data['client_id'], row))
+        return deltas
+
+    def _fetch_row(self, client_id):
+        with self._connection.cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(self.COLUMNS)} FROM clients WHERE client_id = %s", (client_id,))
+            return cursor.fetchone()
@@ -0,0 +1,112 @@
+import sys
+import json
+import argparse
+from config import load_config
+from backends import BACKENDS
+
+# Модули хранилищ, драйверы и client_import импортируются только выполняемой командой:
+# холодный старт не платит за psycopg2, yaml и соединение с базой, пока они не нужны
+
+def command_list(repository, args):
+    for short_info in repository.get_short_page(args.limit, args.after):
+        print(short_info)
+
+def command_get(repository, args):
+    print(repository.get_by_id(args.client_id))
+
+def command_add(repository, args):
+    repository.add_client(args.fullname, args.document, args.age, args.phone_number, args.address, args.email)
+
+def command_import(repository, args):
+    from client_import import import_csv
+    # Ход импорта — в stderr, чтобы stdout оставался одной строкой JSON с итогом
+    stats = import_csv(repository, args.csv_path, workers=args.workers, chunk_size=args.chunk_size,
+                       rejected_path=args.rejected, checkpoint_path=args.checkpoint, has_header=args.header,
+                       progress=lambda stats: print(f"{stats['read']} rows, {stats['rows_per_second']:.0f} rows/s",
+                                                    file=sys.stderr))
+    print(json.dumps(stats))
+
+def command_export(repository, args):
+    from client_import import export_csv
+    print(json.dumps(export_csv(repository, args.csv_path)))
+
+def command_install_change_feed(config, args):
+    # Разовая операция администратора: триггер требует прав владельца таблицы clients и блокирует её
+    from change_feed import ClientChangeFeed
+    ClientChangeFeed(config['db'], None).install()
+    print("change feed trigger installed")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="Manage clients from the command line.")
+    parser.add_argument('--config', metavar='FILE', help="JSON config file (default: $CLIENTS_CONFIG or ./clients_config.json)")
+    parser.add_argument('--backend', choices=BACKENDS.names(), help="storage backend (overrides the config)")
+    parser.add_argument('--file', metavar='FILE', help="data file for the json, yaml and binary backends")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help="list clients in client_id order")
+    list_parser.add_argument('--limit', type=int, default=20)
+    list_parser.add_argument('--after', type=int, default=None, metavar='ID', help="start after this client_id")
+    list_parser.set_defaults(handler=command_list)
+
+    get_parser = commands.add_parser('get', help="show one client")
+    get_parser.add_argument('client_id', type=int)
+    get_parser.set_defaults(handler=command_get)
+
+    add_parser = commands.add_parser('add', help="add a client")
+    add_parser.add_argument('fullname')
+    add_parser.add_argument('document')
+    add_parser.add_argument('--age', type=int)
+    add_parser.add_argument('--phone', dest='phone_number')
+    add_parser.add_argument('--address')
+    add_parser.add_argument('--email')
+    add_parser.set_defaults(handler=command_add)
+
+    import_parser = commands.add_parser('import', help="import clients from a CSV file")
+    import_parser.add_argument('csv_path')
+    import_parser.add_argument('--workers', type=int, default=None)
+    import_parser.add_argument('--chunk-size', type=int, default=10000)
+    import_parser.add_argument('--rejected', metavar='FILE')
+    import_parser.add_argument('--checkpoint', metavar='FILE')
+    import_parser.add_argument('--header', action='store_true')
+    import_parser.set_defaults(handler=command_import)
+
+    export_parser = commands.add_parser('export', help="export clients to a CSV file")
+    export_parser.add_argument('csv_path')
+    export_parser.set_defaults(handler=command_export)
+
+    install_parser = commands.add_parser('install-change-feed',
+                                         help="install the clients table trigger used for live updates (admin)")
+    # Работает с базой из настроек напрямую, хранилище клиентов не открывается
+    install_parser.set_defaults(handler=command_install_change_feed, repository=False)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    config = load_config(args.config)
+    if args.backend:
+        config['backend'] = args.backend
+    if args.file:
+        config['filename'] = args.file
+    args.backend = config['backend']
+
+    options = {}
+    if args.command == 'import' and args.backend in ('json', 'yaml'):
+        # Во время импорта изменения пишутся только в журнал, снимок собирается один раз в конце
+        options = {'journal': True, 'compact_threshold': float('inf')}
+    try:
+        if not getattr(args, 'repository', True):
+            args.handler(config, args)
+            return 0
+        repository = BACKENDS.create(config, **options)
+        try:
+            args.handler(repository, args)
+        finally:
+            repository.close()
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
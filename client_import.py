@@ -0,0 +1,155 @@
+import os
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from BaseClient import BaseClient
+
+def parse_chunk(first_line, lines):
+    """Разбирает и проверяет порцию строк CSV. Выполняется в дочернем процессе."""
+    records, rejected = [], []
+    for line_number, raw in enumerate(lines, start=first_line):
+        line = raw.decode('utf-8-sig' if line_number == 1 else 'utf-8', errors='replace').rstrip('\r\n')
+        if not line.strip():
+            continue
+        try:
+            records.append((line_number, line, BaseClient.from_string(line).to_dict()))
+        except ValueError as e:
+            rejected.append((line_number, line, str(e)))
+    return records, rejected
+
+class ClientCsvImporter:
+    """Потоковый импорт больших CSV-файлов в любой репозиторий с параллельным разбором и контрольными точками."""
+
+    def __init__(self, repository, workers=None, chunk_size=10000, rejected_path=None,
+                 checkpoint_path=None, progress=None, has_header=False):
+        self.repository = repository
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunk_size = chunk_size
+        self.rejected_path = rejected_path
+        self.checkpoint_path = checkpoint_path
+        # progress(stats) вызывается после записи каждой порции
+        self.progress = progress
+        self.has_header = has_header
+
+    def _load_checkpoint(self, path):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as file:
+            checkpoint = json.load(file)
+        return checkpoint if checkpoint.get('source') == os.path.abspath(path) else None
+
+    def _save_checkpoint(self, checkpoint):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(checkpoint, file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _read_chunks(self, file, line):
+        while True:
+            lines = []
+            for raw in file:
+                lines.append(raw)
+                if len(lines) >= self.chunk_size:
+                    break
+            if not lines:
+                return
+            yield line, lines, file.tell()
+            line += len(lines)
+
+    def run(self, path):
+        checkpoint = self._load_checkpoint(path) or {
+            'source': os.path.abspath(path), 'offset': 0, 'line': 1, 'imported': 0, 'rejected': 0}
+        stats = {'read': 0, 'imported': 0, 'rejected': 0, 'elapsed': 0.0, 'rows_per_second': 0.0,
+                 'resumed_from_line': checkpoint['line']}
+        started = time.monotonic()
+        rejected_file = None
+        if self.rejected_path:
+            rejected_file = open(self.rejected_path, 'a' if checkpoint['offset'] else 'w',
+                                 encoding='utf-8', newline='')
+            rejected_writer = csv.writer(rejected_file)
+            if not checkpoint['offset']:
+                rejected_writer.writerow(['line', 'data', 'error'])
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            with open(path, 'rb') as file:
+                file.seek(checkpoint['offset'])
+                line = checkpoint['line']
+                if self.has_header and checkpoint['offset'] == 0 and file.readline():
+                    line += 1
+                pending = deque()
+                chunks = self._read_chunks(file, line)
+                while True:
+                    # Не больше двух порций на процесс в полёте, чтобы память оставалась ограниченной
+                    while len(pending) < max(2 * self.workers, 1):
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        first_line, lines, end_offset = chunk
+                        result = (executor.submit(parse_chunk, first_line, lines) if executor
+                                  else parse_chunk(first_line, lines))
+                        pending.append((result, first_line + len(lines), end_offset, len(lines)))
+                    if not pending:
+                        break
+                    result, next_line, end_offset, line_count = pending.popleft()
+                    records, rejected = result.result() if executor else result
+                    clients, origins = [], {}
+                    for line_number, text, record in records:
+                        client = BaseClient.from_dict(record, validate=False)
+                        clients.append(client)
+                        origins[id(client)] = (line_number, text)
+                    duplicates = self.repository.add_clients(clients)
+                    rejected.extend((*origins[id(client)], reason) for client, reason in duplicates)
+                    if rejected_file:
+                        rejected_writer.writerows(rejected)
+                        rejected_file.flush()
+                    imported = len(clients) - len(duplicates)
+                    stats['read'] += line_count
+                    stats['imported'] += imported
+                    stats['rejected'] += len(rejected)
+                    checkpoint.update(offset=end_offset, line=next_line,
+                                      imported=checkpoint['imported'] + imported,
+                                      rejected=checkpoint['rejected'] + len(rejected))
+                    if self.checkpoint_path:
+                        self._save_checkpoint(checkpoint)
+                    self._update_rate(stats, started)
+                    if self.progress:
+                        self.progress(dict(stats))
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            if rejected_file:
+                rejected_file.close()
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            # Импорт завершён: следующий запуск начнёт файл заново
+            os.remove(self.checkpoint_path)
+        self._update_rate(stats, started)
+        return stats
+
+    @staticmethod
+    def _update_rate(stats, started):
+        stats['elapsed'] = time.monotonic() - started
+        stats['rows_per_second'] = stats['read'] / stats['elapsed'] if stats['elapsed'] else 0.0
+
+def import_csv(repository, path, workers=None, chunk_size=10000, rejected_path=None, checkpoint_path=None,
+               has_header=False, progress=None):
+    """Импортирует CSV в repository; журнал файлового хранилища после импорта сворачивается в снимок один раз."""
+    importer = ClientCsvImporter(repository, workers=workers, chunk_size=chunk_size, rejected_path=rejected_path,
+                                 checkpoint_path=checkpoint_path, progress=progress, has_header=has_header)
+    stats = importer.run(path)
+    if getattr(repository, 'journal', None) is not None:
+        repository.compact()
+    return stats
+
+def export_csv(repository, path, batch_size=10000):
+    """Выгружает клиентов в CSV потоково; формат строк совместим с BaseClient.from_string."""
+    started = time.monotonic()
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        for client in repository.iter_clients(batch_size):
+            writer.writerow(['' if value is None else value for value in client.to_dict().values()])
+            count += 1
+    elapsed = time.monotonic() - started
+    return {'exported': count, 'elapsed': elapsed, 'rows_per_second': count / elapsed if elapsed else 0.0}
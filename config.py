@@ -0,0 +1,71 @@
+import os
+import json
+
+# Файл настроек ищется по пути из CLIENTS_CONFIG, иначе — в текущем каталоге
+CONFIG_ENV = 'CLIENTS_CONFIG'
+DEFAULT_PATH = 'clients_config.json'
+
+DEFAULTS = {
+    'backend': 'postgres',
+    # Файл для хранилищ json, yaml и binary; None — имя по умолчанию для хранилища
+    'filename': None,
+    # Параметры psycopg2.connect; пароль не хранится в коде — он берётся из файла, окружения или ~/.pgpass
+    'db': {
+        'dbname': 'clients',
+        'user': 'postgres',
+        'host': 'localhost',
+        'port': '5432',
+    },
+    # Реплики для чтения: параметры, отличающиеся от 'db' (обычно host и port)
+    'replicas': [],
+}
+
+# Переменная окружения -> ключ настроек (для параметров подключения — ключ в 'db')
+ENVIRONMENT = {
+    'CLIENTS_BACKEND': 'backend',
+    'CLIENTS_FILE': 'filename',
+}
+DB_ENVIRONMENT = {
+    'CLIENTS_DB_NAME': 'dbname',
+    'CLIENTS_DB_USER': 'user',
+    'CLIENTS_DB_PASSWORD': 'password',
+    'CLIENTS_DB_HOST': 'host',
+    'CLIENTS_DB_PORT': 'port',
+}
+
+def load_config(path=None, environ=None):
+    """Настройки в порядке приоритета: переменные окружения, файл настроек, значения по умолчанию.
+
+    Файл — JSON с ключами 'backend', 'filename', 'db' и 'replicas'. Явно указанный (аргументом или CLIENTS_CONFIG)
+    файл обязан существовать; файл по умолчанию читается, только если он есть.
+    """
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULTS, db=dict(DEFAULTS['db']))
+    path = path or environ.get(CONFIG_ENV)
+    if path is None and os.path.exists(DEFAULT_PATH):
+        path = DEFAULT_PATH
+    if path is not None:
+        with open(path, 'r', encoding='utf-8') as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Malformed config file {path}: {e}")
+        if not isinstance(data, dict):
+            raise ValueError(f"Config file {path} must contain a JSON object.")
+        config['db'].update(data.pop('db', None) or {})
+        config.update(data)
+    for variable, key in ENVIRONMENT.items():
+        if variable in environ:
+            config[key] = environ[variable]
+    for variable, key in DB_ENVIRONMENT.items():
+        if variable in environ:
+            config['db'][key] = environ[variable]
+    if environ.get('CLIENTS_DB_REPLICAS'):
+        # Список вида host1:5433,host2:5434
+        config['replicas'] = [dict(zip(('host', 'port'), address.strip().split(':', 1)))
+                              for address in environ['CLIENTS_DB_REPLICAS'].split(',')]
+    return config
+
+def replica_configs(config):
+    """Полные параметры подключения к репликам: недостающие берутся из config['db']."""
+    return [dict(config['db'], **replica) for replica in config.get('replicas') or ()]
@@ -1,18 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+
 class ClientController:
-    def __init__(self, model, view):
+    def __init__(self, model, view, background=False, workers=4, prefetch=2):
         self.model = model
         self.view = view
         self.view.controller = self
+        # В фоновом режиме обращения к модели выполняются в пуле потоков,
+        # а результаты возвращаются в поток Tk через root.after
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='client-controller') if background else None
+        # Сколько соседних строк выше и ниже выбранной подгружать заранее
+        self.prefetch = prefetch
+        self._generations = {}
+        self._futures = {}
+        self._prefetching = []
 
         self.model.add_observer(self.view)
 
+    def _submit(self, kind, call, on_done):
+        """Выполняет call в фоне; результат устаревшего запроса того же вида отбрасывается."""
+        if self.executor is None:
+            on_done(call())
+            return
+        generation = self._generations.get(kind, 0) + 1
+        self._generations[kind] = generation
+        previous = self._futures.get(kind)
+        if previous is not None:
+            previous.cancel()
+        self.view.set_loading(True)
+        future = self.executor.submit(call)
+        self._futures[kind] = future
+        future.add_done_callback(
+            lambda future: self.view.root.after(0, self._deliver, kind, generation, future, on_done))
+
+    def _deliver(self, kind, generation, future, on_done):
+        if self._generations.get(kind) != generation:
+            return
+        del self._futures[kind]
+        if not self._futures:
+            self.view.set_loading(False)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.view.show_error(str(error))
+            return
+        on_done(future.result())
+
     def load_clients(self):
-        clients = self.model.get_all_clients()
-        self.view.display_clients(clients)
+        self._submit('clients', self.model.get_all_clients, self.view.display_clients)
+
+    def search_clients(self, query):
+        """Пустой запрос возвращает полный список."""
+        if not query.strip():
+            self.load_clients()
+            return
+        # Тот же вид, что и у load_clients: ответ на более ранний запрос не перетрёт более поздний
+        self._submit('clients', lambda: self.model.search_clients(query), self.view.show_search_results)
 
     def get_full_client_info(self, client_id):
         client_details = self.model.get_client_by_id(client_id)
         return client_details
 
+    def select_client(self, client_id):
+        """Показывает подробности клиента и заранее загружает соседние строки."""
+        self._submit('details', lambda: self.model.get_client_by_id(client_id),
+                     lambda details: self.view.show_client_details(client_id, details))
+        self._prefetch_neighbours(client_id)
+
+    def _prefetch_neighbours(self, client_id):
+        if self.executor is None or not self.prefetch:
+            return
+        # Ещё не начатая подгрузка для прежнего выбора больше не нужна
+        for future in self._prefetching:
+            future.cancel()
+        self._prefetching = [self.executor.submit(self.model.get_client_by_id, neighbour)
+                             for neighbour in self.view.get_neighbour_ids(client_id, self.prefetch)]
+
     def refresh_clients(self):
-        self.model.refresh_data()
+        if self.executor is None:
+            self.model.refresh_data()
+        else:
+            self.executor.submit(self.model.refresh_data)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,434 @@
+import time
+import uuid
+import logging
+import itertools
+import threading
+import psycopg2
+from collections import deque
+from contextlib import contextmanager
+from instrumentation import QueryMetrics, SlowQueryLog, InstrumentedConnection
+
+# Сообщения о соединениях идут в logging, а не в stdout: вывод CLI и cron-задач остаётся чистым
+logger = logging.getLogger('database')
+
+def parse_lsn(text):
+    """Позиция в WAL вида '16/B374D848' как целое; None (сервер не реплика) — 0."""
+    if text is None:
+        return 0
+    high, low = text.split('/')
+    return (int(high, 16) << 32) | int(low, 16)
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений с PostgreSQL."""
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, db_config, min_size=1, max_size=10, timeout=30.0, health_check_interval=30.0, metrics=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must satisfy 0 <= min_size <= max_size and max_size >= 1.")
+        self.db_config = db_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        # Запросы всех соединений пула учитываются в одном наборе метрик
+        self.metrics = metrics or QueryMetrics()
+        self._idle = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'reconnects': 0,
+            'checkout_time_total': 0.0,
+            'checkout_time_max': 0.0,
+        }
+        # Для реплики: до какого момента она исключена из чтения после ошибки соединения
+        # и до какой позиции WAL она точно доиграла изменения основного сервера
+        self.down_until = 0.0
+        self.replay_lsn = 0
+        # Для основного сервера: позиция WAL после последней записи из этого процесса
+        self.write_lsn = 0
+
+    @classmethod
+    def shared(cls, db_config, **options):
+        """Возвращает общий пул для данной конфигурации, создавая его при первом обращении."""
+        key = tuple(sorted(db_config.items()))
+        with cls._shared_lock:
+            pool = cls._shared.get(key)
+            if pool is None:
+                pool = cls._shared[key] = cls(db_config, **options)
+                pool.fill()
+            return pool
+
+    def _connect(self):
+        logger.info("Соединение с базой данных устанавливается...")
+        connection = psycopg2.connect(**self.db_config, connection_factory=InstrumentedConnection)
+        connection.metrics = self.metrics
+        return connection
+
+    def fill(self):
+        """Открывает соединения до min_size."""
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                raise
+            with self._condition:
+                self._idle.append((connection, time.monotonic()))
+                self._condition.notify()
+
+    def _is_healthy(self, connection, idle_since):
+        if connection.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, exclusive=False):
+        """Выдаёт соединение; повторный вызов в том же потоке возвращает то же соединение.
+
+        exclusive=True выдаёт отдельное соединение, не привязанное к потоку.
+        """
+        held = getattr(self._local, 'held', None)
+        if held is not None and not exclusive:
+            held[1] += 1
+            return held[0]
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        with self._condition:
+            while True:
+                if self._idle:
+                    connection, idle_since = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection = idle_since = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise TimeoutError(f"Could not get a database connection within {self.timeout} s.")
+                waited = True
+                self._condition.wait(remaining)
+
+        try:
+            if connection is None:
+                connection = self._connect()
+            elif not self._is_healthy(connection, idle_since):
+                self._discard(connection)
+                connection = self._connect()
+                with self._condition:
+                    self._stats['reconnects'] += 1
+                self.metrics.record_reconnect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._condition:
+            self._stats['checkouts'] += 1
+            self._stats['waits'] += waited
+            self._stats['checkout_time_total'] += elapsed
+            self._stats['checkout_time_max'] = max(self._stats['checkout_time_max'], elapsed)
+        if not exclusive:
+            self._local.held = [connection, 1]
+        return connection
+
+    def putconn(self, connection, discard=False):
+        held = getattr(self._local, 'held', None)
+        if held is not None and held[0] is connection:
+            held[1] -= 1
+            if held[1] > 0 and not discard:
+                return
+            self._local.held = None
+        if not discard and not connection.closed:
+            try:
+                # Незавершённая транзакция не должна достаться следующему потоку
+                connection.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or connection.closed:
+            self._discard(connection)
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    @contextmanager
+    def connection(self, exclusive=False):
+        connection = self.getconn(exclusive)
+        try:
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Соединение, скорее всего, разорвано: не возвращаем его в пул
+            self.putconn(connection, discard=True)
+            raise
+        except Exception:
+            self.putconn(connection)
+            raise
+        else:
+            self.putconn(connection)
+
+    def in_use(self):
+        with self._condition:
+            return self._size - len(self._idle)
+
+    def is_available(self):
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self, interval):
+        """Исключает реплику из чтения на interval секунд; её свободные соединения, скорее всего, разорваны."""
+        self.down_until = time.monotonic() + interval
+        self.close()
+
+    def remember_write(self, lsn):
+        with self._condition:
+            self.write_lsn = max(self.write_lsn, lsn)
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['checkout_time_avg'] = (stats['checkout_time_total'] / stats['checkouts']
+                                          if stats['checkouts'] else 0.0)
+            return stats
+
+    def close(self):
+        """Закрывает свободные соединения; пул остаётся рабочим и откроет новые по требованию."""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        if idle:
+            logger.info("Соединение с базой данных закрывается...")
+        for connection, _ in idle:
+            self._discard(connection)
+
+class DatabaseConnection:
+    """Запросы к PostgreSQL через общий пул соединений.
+
+    Запись и транзакции идут на основной сервер db_config. Если заданы replicas, чтения fetch_all,
+    fetch_one и iter_rows вне транзакции распределяются по репликам: первой выбирается наименее
+    загруженная, при равной загрузке — по кругу. Реплика, на которой произошла ошибка соединения,
+    исключается на replica_retry_interval секунд, а чтение повторяется на следующей или на основном
+    сервере. При read_your_writes после записи из этого процесса чтение идёт только на реплики, уже
+    доигравшие WAL до позиции этой записи, иначе — на основной сервер.
+    """
+    REPLICA_RETRY_INTERVAL = 5.0
+
+    def __init__(self, db_config, pool=None, replicas=(), replica_retry_interval=REPLICA_RETRY_INTERVAL,
+                 read_your_writes=True):
+        self.db_config = db_config
+        self.pool = pool or ConnectionPool.shared(db_config)
+        self.metrics = self.pool.metrics
+        self._local = threading.local()
+        # Пулы реплик открывают соединения при первом чтении: недоступная реплика не мешает запуску
+        self.replicas = [ConnectionPool.shared(replica, min_size=0, metrics=self.metrics) for replica in replicas]
+        self.replica_retry_interval = replica_retry_interval
+        self.read_your_writes = read_your_writes
+        self._rotation = itertools.count()
+
+    def connect(self):
+        """Открывает минимальное число соединений пула."""
+        self.pool.fill()
+
+    @contextmanager
+    def _cursor(self, commit=False, pool=None):
+        connection = getattr(self._local, 'transaction', None)
+        if connection is not None:
+            # Внутри transaction() фиксация выполняется при выходе из неё
+            with connection.cursor() as cursor:
+                yield cursor
+            return
+        with (pool or self.pool).connection() as connection:
+            with connection.cursor() as cursor:
+                yield cursor
+            if commit:
+                connection.commit()
+                self._remember_write(connection)
+
+    def _remember_write(self, connection):
+        if not self.replicas or not self.read_your_writes:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_current_wal_lsn()")
+            self.pool.remember_write(parse_lsn(cursor.fetchone()[0]))
+
+    def _retry_read(self, read):
+        # Чтение вне транзакции безопасно повторить на новом соединении
+        try:
+            return read()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            if getattr(self._local, 'transaction', None) is not None:
+                raise
+            self.metrics.record_reconnect()
+            return read()
+
+    def _replica_order(self):
+        if not self.replicas or getattr(self._local, 'transaction', None) is not None \
+                or getattr(self._local, 'primary', 0):
+            return []
+        available = [pool for pool in self.replicas if pool.is_available()]
+        if not available:
+            return []
+        start = next(self._rotation) % len(available)
+        # Сортировка устойчива, поэтому при равной загрузке порядок остаётся круговым
+        return sorted(available[start:] + available[:start], key=ConnectionPool.in_use)
+
+    def _caught_up(self, pool):
+        """Видны ли на реплике все записи, сделанные этим процессом на основном сервере."""
+        write_lsn = self.pool.write_lsn
+        if not self.read_your_writes or pool.replay_lsn >= write_lsn:
+            return True
+        with pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute("SELECT pg_last_wal_replay_lsn()")
+            pool.replay_lsn = max(pool.replay_lsn, parse_lsn(cursor.fetchone()[0]))
+        return pool.replay_lsn >= write_lsn
+
+    def _read(self, read):
+        """read(pool) на реплике, если есть подходящая, иначе на основном сервере."""
+        for pool in self._replica_order():
+            try:
+                if not self._caught_up(pool):
+                    continue
+                result = read(pool)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                pool.mark_down(self.replica_retry_interval)
+                self.metrics.record_failover()
+                logger.warning("Реплика %s:%s недоступна, чтение переключено.",
+                               pool.db_config.get('host'), pool.db_config.get('port'))
+                continue
+            self.metrics.record_replica_read()
+            return result
+        return self._retry_read(lambda: read(self.pool))
+
+    @contextmanager
+    def primary_reads(self):
+        """Чтения этого потока внутри блока идут на основной сервер."""
+        self._local.primary = getattr(self._local, 'primary', 0) + 1
+        try:
+            yield
+        finally:
+            self._local.primary -= 1
+
+    def execute_query(self, query, params=None):
+        with self._cursor(commit=True) as cursor:
+            cursor.execute(query, params or ())
+
+    def fetch_all(self, query, params=None):
+        def read(pool):
+            with self._cursor(pool=pool) as cursor:
+                cursor.execute(query, params or ())
+                return cursor.fetchall()
+        return self._read(read)
+
+    def fetch_one(self, query, params=None):
+        def read(pool):
+            with self._cursor(pool=pool) as cursor:
+                cursor.execute(query, params or ())
+                return cursor.fetchone()
+        return self._read(read)
+
+    def _stream_pool(self):
+        # Поток строк нельзя продолжить на другом сервере, поэтому сервер выбирается до начала чтения
+        for pool in self._replica_order():
+            try:
+                if self._caught_up(pool):
+                    return pool
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                pool.mark_down(self.replica_retry_interval)
+                self.metrics.record_failover()
+        return self.pool
+
+    def iter_rows(self, query, params=None, batch_size=1000):
+        """Читает результат запроса порциями по batch_size строк через серверный курсор."""
+        name = f"stream_{uuid.uuid4().hex}"
+        connection = getattr(self._local, 'transaction', None)
+        if connection is not None:
+            with connection.cursor(name=name) as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params or ())
+                yield from cursor
+            return
+        # Отдельное соединение: фиксация в этом потоке не должна закрыть курсор
+        with self._stream_pool().connection(exclusive=True) as connection:
+            with connection.cursor(name=name) as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params or ())
+                yield from cursor
+
+    @contextmanager
+    def transaction(self):
+        """Выполняет несколько запросов в одной транзакции и откатывает её при ошибке."""
+        if getattr(self._local, 'transaction', None) is not None:
+            with self._local.transaction.cursor() as cursor:
+                yield cursor
+            return
+        with self.pool.connection() as connection:
+            self._local.transaction = connection
+            try:
+                with connection.cursor() as cursor:
+                    yield cursor
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                self.metrics.record_rollback()
+                raise
+            else:
+                self._remember_write(connection)
+            finally:
+                self._local.transaction = None
+
+    def stats(self):
+        stats = self.pool.stats()
+        if self.replicas:
+            stats['replicas'] = [dict(pool.stats(), available=pool.is_available()) for pool in self.replicas]
+        return stats
+
+    def set_slow_query_log(self, threshold=0.5, path=None, include_params=False):
+        """Включает журнал медленных запросов (threshold=None выключает его) для всех пользователей пула."""
+        self.metrics.slow_query_log = (SlowQueryLog(threshold, path, include_params=include_params)
+                                       if threshold is not None else None)
+
+    def metrics_snapshot(self):
+        """Метрики запросов вместе с состоянием пула."""
+        snapshot = self.metrics.snapshot()
+        snapshot['pool'] = self.stats()
+        return snapshot
+
+    def close(self):
+        """Закрывает свободные соединения пула и пулов реплик."""
+        self.pool.close()
+        for pool in self.replicas:
+            pool.close()
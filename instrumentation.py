@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import time
+import bisect
+import logging
+import threading
+import psycopg2.extensions
+from functools import lru_cache
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?![\w$])")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_VALUE = r"(?:\?|NULL|TRUE|FALSE|DEFAULT)(?:\s*::\s*\w+)?"
+_TUPLE = re.compile(rf"\(\s*{_VALUE}(?:\s*,\s*{_VALUE})*\s*\)", re.IGNORECASE)
+_TUPLE_LIST = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_sql(query):
+    """Приводит запрос к виду без значений: одинаковые по смыслу запросы дают одну строку."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', errors='replace')
+    if len(query) > 2048:
+        # Длинные запросы (VALUES от execute_values) почти не повторяются, кэшировать их незачем
+        return _normalize(query)
+    return _normalize_cached(query)
+
+def _normalize(query):
+    query = _STRING_LITERAL.sub('?', query)
+    query = _PLACEHOLDER.sub('?', query)
+    query = _NUMBER.sub('?', query)
+    query = _TUPLE.sub('(?)', query)
+    query = _TUPLE_LIST.sub('(?), ...', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+_normalize_cached = lru_cache(maxsize=1024)(_normalize)
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными границами корзин (в секундах)."""
+    BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+              0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        # Последняя корзина — всё, что дольше BOUNDS[-1]
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Верхняя граница корзины, в которую попадает заданная доля наблюдений."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return self.BOUNDS[index] if index < len(self.BOUNDS) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'max_s': self.max,
+            'p50_s': self.percentile(0.50),
+            'p95_s': self.percentile(0.95),
+            'p99_s': self.percentile(0.99),
+            'buckets': {('+Inf' if index == len(self.BOUNDS) else str(self.BOUNDS[index])): count
+                        for index, count in enumerate(self.buckets)},
+        }
+
+class SlowQueryLog:
+    """Записывает запросы дольше threshold секунд: в файл JSON Lines или, если файл не задан, в logging."""
+
+    def __init__(self, threshold=0.5, path=None, logger=None, include_params=False):
+        self.threshold = threshold
+        self.path = path
+        self.logger = logger or logging.getLogger('database.slow_queries')
+        # Значения параметров могут содержать персональные данные, по умолчанию не пишутся
+        self.include_params = include_params
+        self._lock = threading.Lock()
+
+    def record(self, statement, elapsed, rows, params=None):
+        if elapsed < self.threshold:
+            return
+        entry = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'elapsed_s': round(elapsed, 6),
+                 'rows': rows, 'statement': statement}
+        if self.include_params and params is not None:
+            entry['params'] = repr(params)
+        if self.path is None:
+            self.logger.warning("Slow query (%.3f s, %s rows): %s", elapsed, rows, statement)
+            return
+        with self._lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+class QueryMetrics:
+    """Счётчики и гистограммы задержек запросов, сгруппированные по нормализованному SQL."""
+
+    def __init__(self, slow_query_log=None, max_statements=500):
+        self.slow_query_log = slow_query_log
+        # Ограничение числа различных запросов, чтобы память не росла без предела
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._exporters = []
+        self._export_thread = None
+        self._export_stop = threading.Event()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}
+            self._latency = LatencyHistogram()
+            self._totals = {'queries': 0, 'rows': 0, 'errors': 0, 'commits': 0, 'rollbacks': 0, 'reconnects': 0,
+                            'replica_reads': 0, 'failovers': 0}
+
+    def record_query(self, query, elapsed, rows, error=False, params=None):
+        statement = normalize_sql(query)
+        rows = max(rows or 0, 0)
+        with self._lock:
+            stats = self._statements.get(statement)
+            if stats is None:
+                if len(self._statements) >= self.max_statements:
+                    statement = '<other>'
+                    stats = self._statements.get(statement)
+                if stats is None:
+                    stats = self._statements[statement] = {'calls': 0, 'rows': 0, 'errors': 0,
+                                                           'latency': LatencyHistogram()}
+            stats['calls'] += 1
+            stats['rows'] += rows
+            stats['errors'] += error
+            stats['latency'].observe(elapsed)
+            self._latency.observe(elapsed)
+            self._totals['queries'] += 1
+            self._totals['rows'] += rows
+            self._totals['errors'] += error
+        if self.slow_query_log is not None:
+            self.slow_query_log.record(statement, elapsed, rows, params)
+
+    def record_commit(self):
+        with self._lock:
+            self._totals['commits'] += 1
+
+    def record_rollback(self):
+        with self._lock:
+            self._totals['rollbacks'] += 1
+
+    def record_reconnect(self):
+        with self._lock:
+            self._totals['reconnects'] += 1
+
+    def record_replica_read(self):
+        with self._lock:
+            self._totals['replica_reads'] += 1
+
+    def record_failover(self):
+        with self._lock:
+            self._totals['failovers'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'totals': dict(self._totals),
+                'latency': self._latency.snapshot(),
+                'statements': {statement: {'calls': stats['calls'], 'rows': stats['rows'], 'errors': stats['errors'],
+                                           'latency': stats['latency'].snapshot()}
+                               for statement, stats in self._statements.items()},
+            }
+
+    def add_exporter(self, exporter):
+        """exporter — объект с методом export(snapshot) или просто функция от snapshot."""
+        self._exporters.append(exporter)
+
+    def export(self):
+        snapshot = self.snapshot()
+        for exporter in self._exporters:
+            (exporter.export if hasattr(exporter, 'export') else exporter)(snapshot)
+        return snapshot
+
+    def start_exporting(self, interval=60.0):
+        """Периодически передаёт снимок всем экспортёрам из фонового потока."""
+        if self._export_thread is not None:
+            return
+        self._export_stop.clear()
+
+        def loop():
+            while not self._export_stop.wait(interval):
+                self.export()
+
+        self._export_thread = threading.Thread(target=loop, name='query-metrics-export', daemon=True)
+        self._export_thread.start()
+
+    def stop_exporting(self):
+        if self._export_thread is None:
+            return
+        self._export_stop.set()
+        self._export_thread.join()
+        self._export_thread = None
+
+class JsonFileExporter:
+    """Перезаписывает файл последним снимком метрик."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, snapshot):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file, ensure_ascii=False, indent=4)
+
+class LoggingExporter:
+    """Пишет в лог итоговые счётчики и самые медленные по суммарному времени запросы."""
+
+    def __init__(self, logger=None, top=5):
+        self.logger = logger or logging.getLogger('database.metrics')
+        self.top = top
+
+    def export(self, snapshot):
+        self.logger.info("Query totals: %s", snapshot['totals'])
+        statements = sorted(snapshot['statements'].items(), key=lambda item: item[1]['latency']['total_s'],
+                            reverse=True)
+        for statement, stats in statements[:self.top]:
+            self.logger.info("%d calls, %.3f s total, p99 %.4f s: %s", stats['calls'],
+                             stats['latency']['total_s'], stats['latency']['p99_s'], statement)
+
+class PrometheusTextExporter:
+    """Сохраняет метрики в текстовом формате Prometheus (для node_exporter textfile collector)."""
+
+    def __init__(self, path, prefix='clients_db'):
+        self.path = path
+        self.prefix = prefix
+
+    @staticmethod
+    def _label(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+    def export(self, snapshot):
+        lines = []
+        for name, value in snapshot['totals'].items():
+            lines.append(f"# TYPE {self.prefix}_{name}_total counter")
+            lines.append(f"{self.prefix}_{name}_total {value}")
+        metric = f"{self.prefix}_query_duration_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for statement, stats in snapshot['statements'].items():
+            label = f'statement="{self._label(statement)}"'
+            cumulative = 0
+            for bound, count in stats['latency']['buckets'].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label}}} {stats['latency']['total_s']}")
+            lines.append(f"{metric}_count{{{label}}} {stats['latency']['count']}")
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Курсор, сообщающий о каждом запросе в QueryMetrics своего соединения."""
+
+    def _timed(self, query, params, run):
+        metrics = getattr(self.connection, 'metrics', None)
+        if metrics is None:
+            return run()
+        started = time.perf_counter()
+        try:
+            result = run()
+        except Exception:
+            metrics.record_query(query, time.perf_counter() - started, 0, error=True, params=params)
+            raise
+        metrics.record_query(query, time.perf_counter() - started, self.rowcount, params=params)
+        return result
+
+    def execute(self, query, vars=None):
+        return self._timed(query, vars, lambda: super(InstrumentedCursor, self).execute(query, vars))
+
+    def executemany(self, query, vars_list):
+        return self._timed(query, None, lambda: super(InstrumentedCursor, self).executemany(query, vars_list))
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(sql, None, lambda: super(InstrumentedCursor, self).copy_expert(sql, file, size))
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """Соединение, чьи курсоры и фиксации учитываются в metrics."""
+    metrics = None
+
+    def cursor(self, *args, **kwargs):
+        kwargs.setdefault('cursor_factory', InstrumentedCursor)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        super().commit()
+        if self.metrics is not None:
+            self.metrics.record_commit()
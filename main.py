@@ -2,24 +2,28 @@ import tkinter as tk
 from model import ClientModel
 from view import ClientView
 from controller import ClientController
+from config import load_config, replica_configs
 
 def main():
-    db_config = {
-        'dbname': 'clients',
-        'user': 'postgres',
-        'password': '123',
-        'host': 'localhost',
-        'port': '5432',
-    }
+    config = load_config()
 
-    model = ClientModel(db_config)
+    model = ClientModel(config['db'], replicas=replica_configs(config))
     root = tk.Tk()
     view = ClientView(root)
-    controller = ClientController(model, view)
+    controller = ClientController(model, view, background=True)
 
     controller.load_clients()
+    try:
+        model.start_change_feed()
+    except Exception as e:
+        # Без ленты изменений приложение работает, таблица просто не обновляется сама
+        view.show_notice(f"Live updates are off: {e}")
 
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        model.stop_change_feed()
+        controller.close()
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,6 @@
-import psycopg2
+from cache import ClientCache
+from change_feed import ClientChangeFeed, ClientDelta
+from search import PostgresClientSearch
 
 class Observable:
     def __init__(self):
@@ -10,35 +12,65 @@ class Observable:
     def remove_observer(self, observer):
         self._observers.remove(observer)
 
-    def notify_observers(self):
+    def notify_observers(self, *args):
         for observer in self._observers:
-            observer.update()
+            observer.update(*args)
 
 class ClientModel(Observable):
-    def __init__(self, db_config):
+    def __init__(self, db_config, replicas=()):
         super().__init__()
         self.db_config = db_config
-        self.clients = []
+        # Драйвер PostgreSQL загружается при создании модели, импорт модуля не требует psycopg2
+        from database import DatabaseConnection
+        # Загрузка таблицы, карточки клиентов и поиск читают с реплик; запись и LISTEN — на основном сервере
+        self.db = DatabaseConnection(db_config, replicas=replicas)
+        self.cache = ClientCache.shared(db_config)
+        self.change_feed = None
+        self.search_engine = PostgresClientSearch(self.db)
+        # client_id -> (client_id, fullname, document)
+        self.clients = {}
 
     def get_all_clients(self):
-        connection = psycopg2.connect(**self.db_config)
-        cursor = connection.cursor()
-        cursor.execute("SELECT client_id, fullname, document FROM clients")
-        rows = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        self.clients = rows
+        rows = self.db.fetch_all("SELECT client_id, fullname, document FROM clients")
+        self.clients = {row[0]: row for row in rows}
         return rows
 
+    def search_clients(self, query, limit=100):
+        """Строки (client_id, fullname, document) лучших совпадений по ФИО, документу или телефону."""
+        return [row[:3] for row in self.search_engine.search(query, limit)]
+
+    def __fetch_client(self, client_id):
+        return self.db.fetch_one("SELECT client_id, fullname, document, age, phone_number, address, email FROM clients WHERE client_id = %s", (client_id,))
+
     def get_client_by_id(self, client_id):
-        connection = psycopg2.connect(**self.db_config)
-        cursor = connection.cursor()
-        cursor.execute("SELECT client_id, fullname, document, age, phone_number, address, email FROM clients WHERE client_id = %s", (client_id,))
-        row = cursor.fetchone()
-        cursor.close()
-        connection.close()
-        return row
+        return self.cache.get(client_id, self.__fetch_client)
 
     def refresh_data(self):
         self.get_all_clients()
         self.notify_observers()
+
+    def start_change_feed(self):
+        """Подписывается на изменения таблицы clients; наблюдатели получают ClientDelta в update(delta).
+
+        Только LISTEN: триггер устанавливается заранее командой python cli.py install-change-feed.
+        """
+        change_feed = ClientChangeFeed(self.db_config, self.apply_delta)
+        change_feed.start()
+        self.change_feed = change_feed
+
+    def stop_change_feed(self):
+        if self.change_feed is not None:
+            self.change_feed.stop()
+            self.change_feed = None
+
+    def apply_delta(self, delta):
+        if delta.op == ClientDelta.RESYNC:
+            self.cache.clear()
+            self.refresh_data()
+            return
+        self.cache.invalidate(delta.client_id)
+        if delta.op == ClientDelta.DELETE:
+            self.clients.pop(delta.client_id, None)
+        else:
+            self.clients[delta.client_id] = delta.row[:3]
+        self.notify_observers(delta)
@@ -0,0 +1,428 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+# Таблицы из diagrams/ER_Diagram1.dbml; первичные ключи названы, как client_id в clients
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS pledged_items (
+        item_id serial PRIMARY KEY,
+        client_id integer NOT NULL REFERENCES clients (client_id) ON DELETE RESTRICT,
+        item_name varchar(255) NOT NULL,
+        item_description text,
+        item_value numeric(10, 2),
+        appraisal_date date
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agreements (
+        agreement_id serial PRIMARY KEY,
+        pledged_item_id integer NOT NULL REFERENCES pledged_items (item_id) ON DELETE RESTRICT,
+        loan_amount numeric(10, 2) NOT NULL,
+        commission numeric(10, 2),
+        due_date date,
+        issue_date date,
+        status_agreements varchar NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payment_schedules (
+        payment_id serial PRIMARY KEY,
+        agreement_id integer NOT NULL REFERENCES agreements (agreement_id) ON DELETE RESTRICT,
+        payment_date date NOT NULL,
+        payment_amount numeric(10, 2) NOT NULL,
+        status_payment varchar(50) NOT NULL,
+        payment_type varchar(50)
+    )
+    """,
+    # Финансовые записи не удаляются вместе с владельцем: таблицы, созданные раньше с ON DELETE CASCADE,
+    # переводятся на RESTRICT
+    """
+    DO $$
+    DECLARE
+        fk record;
+    BEGIN
+        FOR fk IN
+            SELECT conname, conrelid::regclass AS table_name, pg_get_constraintdef(oid) AS definition
+            FROM pg_constraint
+            WHERE contype = 'f' AND confdeltype = 'c'
+              AND conrelid IN ('pledged_items'::regclass, 'agreements'::regclass, 'payment_schedules'::regclass)
+        LOOP
+            EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I, ADD CONSTRAINT %I %s',
+                           fk.table_name, fk.conname, fk.conname,
+                           replace(fk.definition, 'ON DELETE CASCADE', 'ON DELETE RESTRICT'));
+        END LOOP;
+    END $$
+    """,
+    # Внешние ключи: выборки по владельцу и проверка ссылок при удалении без полного просмотра таблиц
+    "CREATE INDEX IF NOT EXISTS pledged_items_client ON pledged_items (client_id)",
+    "CREATE INDEX IF NOT EXISTS agreements_item ON agreements (pledged_item_id)",
+    "CREATE INDEX IF NOT EXISTS payment_schedules_agreement ON payment_schedules (agreement_id, payment_date)",
+    # Аналитика читает только действующие соглашения и неоплаченные платежи; частичные индексы
+    # с нужными столбцами позволяют агрегировать их, не обращаясь к самим таблицам
+    """
+    CREATE INDEX IF NOT EXISTS agreements_active ON agreements (pledged_item_id)
+        INCLUDE (loan_amount, commission) WHERE status_agreements <> 'погашено'
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS payment_schedules_unpaid ON payment_schedules (agreement_id)
+        INCLUDE (payment_date, payment_amount) WHERE status_payment <> 'оплачено'
+    """,
+)
+
+def ensure_schema(db):
+    """Создаёт таблицы залогов, соглашений и графиков платежей с индексами, если их ещё нет."""
+    with db.transaction() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+class PawnshopValidator:
+    """Проверка полей залогов, соглашений и платежей; ошибки — как у ClientValidator, по-русски."""
+    MAX_MONEY = Decimal('99999999.99')
+    CENT = Decimal('0.01')
+
+    @staticmethod
+    def check_id(value, nullable=False):
+        if value is None and nullable:
+            return None
+        if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            raise ValueError("Идентификатор должен быть положительным целым числом.")
+        return value
+
+    @staticmethod
+    def check_text(value, max_length=None, required=False):
+        if value is None and not required:
+            return None
+        if not isinstance(value, str) or (required and not value.strip()):
+            raise ValueError("Текстовое поле не может быть пустым.")
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f"Текстовое поле длиннее {max_length} символов.")
+        return value
+
+    @classmethod
+    def check_money(cls, value, required=False):
+        """Сумма в numeric(10, 2): неотрицательная, не больше 99 999 999.99, округляется до копеек."""
+        if value is None and not required:
+            return None
+        try:
+            amount = Decimal(str(value)).quantize(cls.CENT)
+        except (InvalidOperation, ValueError):
+            raise ValueError("Сумма должна быть числом.")
+        if not amount.is_finite():
+            raise ValueError("Сумма должна быть числом.")
+        if amount < 0 or amount > cls.MAX_MONEY:
+            raise ValueError("Сумма должна быть от 0 до 99 999 999.99.")
+        return amount
+
+    @staticmethod
+    def check_date(value, required=False):
+        if value is None and not required:
+            return None
+        if isinstance(value, str):
+            try:
+                return date.fromisoformat(value)
+            except ValueError:
+                raise ValueError("Дата должна быть в формате ГГГГ-ММ-ДД.")
+        if not isinstance(value, date):
+            raise ValueError("Дата должна быть в формате ГГГГ-ММ-ДД.")
+        return value
+
+    @staticmethod
+    def check_status(value, allowed):
+        if value not in allowed:
+            raise ValueError(f"Недопустимый статус: {value}. Допустимые: {', '.join(allowed)}.")
+        return value
+
+class PledgedItem:
+    """Залоговый товар клиента."""
+    __slots__ = ('__item_id', '__client_id', '__item_name', '__item_description', '__item_value', '__appraisal_date')
+
+    def __init__(self, item_id, client_id, item_name, item_description=None, item_value=None, appraisal_date=None):
+        # item_id может быть None до сохранения: его назначает база
+        self.__item_id = PawnshopValidator.check_id(item_id, nullable=True)
+        self.__client_id = PawnshopValidator.check_id(client_id)
+        self.__item_name = PawnshopValidator.check_text(item_name, 255, required=True)
+        self.__item_description = PawnshopValidator.check_text(item_description)
+        self.__item_value = PawnshopValidator.check_money(item_value)
+        self.__appraisal_date = PawnshopValidator.check_date(appraisal_date)
+
+    @classmethod
+    def from_trusted(cls, item_id, client_id, item_name, item_description=None, item_value=None, appraisal_date=None):
+        """Создаёт объект без проверки полей — для строк из БД."""
+        item = cls.__new__(cls)
+        item.__item_id, item.__client_id, item.__item_name = item_id, client_id, item_name
+        item.__item_description, item.__item_value, item.__appraisal_date = item_description, item_value, appraisal_date
+        return item
+
+    def get_item_id(self):
+        return self.__item_id
+
+    def get_client_id(self):
+        return self.__client_id
+
+    def get_item_name(self):
+        return self.__item_name
+
+    def get_item_description(self):
+        return self.__item_description
+
+    def get_item_value(self):
+        return self.__item_value
+
+    def get_appraisal_date(self):
+        return self.__appraisal_date
+
+    def to_row(self):
+        return (self.__item_id, self.__client_id, self.__item_name, self.__item_description, self.__item_value,
+                self.__appraisal_date)
+
+    def __eq__(self, other):
+        return isinstance(other, PledgedItem) and self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return f"PledgedItem{self.to_row()}"
+
+class Agreement:
+    """Соглашение о займе под залог товара."""
+    ACTIVE = 'активно'
+    REPAID = 'погашено'
+    OVERDUE = 'просрочено'
+    STATUSES = (ACTIVE, REPAID, OVERDUE)
+    __slots__ = ('__agreement_id', '__pledged_item_id', '__loan_amount', '__commission', '__due_date', '__issue_date',
+                 '__status')
+
+    def __init__(self, agreement_id, pledged_item_id, loan_amount, commission=None, due_date=None, issue_date=None,
+                 status_agreements=ACTIVE):
+        self.__agreement_id = PawnshopValidator.check_id(agreement_id, nullable=True)
+        self.__pledged_item_id = PawnshopValidator.check_id(pledged_item_id)
+        self.__loan_amount = PawnshopValidator.check_money(loan_amount, required=True)
+        self.__commission = PawnshopValidator.check_money(commission)
+        self.__due_date = PawnshopValidator.check_date(due_date)
+        self.__issue_date = PawnshopValidator.check_date(issue_date)
+        if self.__due_date and self.__issue_date and self.__due_date < self.__issue_date:
+            raise ValueError("Срок возврата не может быть раньше даты оформления.")
+        self.__status = PawnshopValidator.check_status(status_agreements, self.STATUSES)
+
+    @classmethod
+    def from_trusted(cls, agreement_id, pledged_item_id, loan_amount, commission=None, due_date=None, issue_date=None,
+                     status_agreements=ACTIVE):
+        agreement = cls.__new__(cls)
+        agreement.__agreement_id, agreement.__pledged_item_id = agreement_id, pledged_item_id
+        agreement.__loan_amount, agreement.__commission = loan_amount, commission
+        agreement.__due_date, agreement.__issue_date, agreement.__status = due_date, issue_date, status_agreements
+        return agreement
+
+    def get_agreement_id(self):
+        return self.__agreement_id
+
+    def get_pledged_item_id(self):
+        return self.__pledged_item_id
+
+    def get_loan_amount(self):
+        return self.__loan_amount
+
+    def get_commission(self):
+        return self.__commission
+
+    def get_due_date(self):
+        return self.__due_date
+
+    def get_issue_date(self):
+        return self.__issue_date
+
+    def get_status(self):
+        return self.__status
+
+    def to_row(self):
+        return (self.__agreement_id, self.__pledged_item_id, self.__loan_amount, self.__commission, self.__due_date,
+                self.__issue_date, self.__status)
+
+    def __eq__(self, other):
+        return isinstance(other, Agreement) and self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return f"Agreement{self.to_row()}"
+
+class PaymentSchedule:
+    """Платёж по графику соглашения."""
+    PENDING = 'ожидается'
+    PAID = 'оплачено'
+    OVERDUE = 'просрочено'
+    STATUSES = (PENDING, PAID, OVERDUE)
+    __slots__ = ('__payment_id', '__agreement_id', '__payment_date', '__payment_amount', '__status', '__payment_type')
+
+    def __init__(self, payment_id, agreement_id, payment_date, payment_amount, status_payment=PENDING,
+                 payment_type=None):
+        self.__payment_id = PawnshopValidator.check_id(payment_id, nullable=True)
+        self.__agreement_id = PawnshopValidator.check_id(agreement_id)
+        self.__payment_date = PawnshopValidator.check_date(payment_date, required=True)
+        self.__payment_amount = PawnshopValidator.check_money(payment_amount, required=True)
+        self.__status = PawnshopValidator.check_status(status_payment, self.STATUSES)
+        self.__payment_type = PawnshopValidator.check_text(payment_type, 50)
+
+    @classmethod
+    def from_trusted(cls, payment_id, agreement_id, payment_date, payment_amount, status_payment=PENDING,
+                     payment_type=None):
+        payment = cls.__new__(cls)
+        payment.__payment_id, payment.__agreement_id = payment_id, agreement_id
+        payment.__payment_date, payment.__payment_amount = payment_date, payment_amount
+        payment.__status, payment.__payment_type = status_payment, payment_type
+        return payment
+
+    def get_payment_id(self):
+        return self.__payment_id
+
+    def get_agreement_id(self):
+        return self.__agreement_id
+
+    def get_payment_date(self):
+        return self.__payment_date
+
+    def get_payment_amount(self):
+        return self.__payment_amount
+
+    def get_status(self):
+        return self.__status
+
+    def get_payment_type(self):
+        return self.__payment_type
+
+    def to_row(self):
+        return (self.__payment_id, self.__agreement_id, self.__payment_date, self.__payment_amount, self.__status,
+                self.__payment_type)
+
+    def __eq__(self, other):
+        return isinstance(other, PaymentSchedule) and self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return f"PaymentSchedule{self.to_row()}"
+
+class PawnshopPostgresRep:
+    """Общая часть репозиториев таблиц ломбарда: операции по первичному ключу и выборка по внешнему ключу."""
+    TABLE = None
+    ID = None
+    FOREIGN_KEY = None
+    # Столбцы после первичного ключа, в порядке аргументов конструктора сущности
+    COLUMNS = ()
+    ENTITY = None
+    BATCH_SIZE = 1000
+
+    def __init__(self, db_config, db=None):
+        # Драйвер PostgreSQL загружается при создании репозитория, импорт модуля не требует psycopg2
+        from database import DatabaseConnection
+        self.db = db or DatabaseConnection(db_config)
+
+    def _select(self):
+        return f"SELECT {self.ID}, {', '.join(self.COLUMNS)} FROM {self.TABLE}"
+
+    def _row_to_entity(self, row):
+        return self.ENTITY.from_trusted(*row)
+
+    def get_by_id(self, entity_id):
+        row = self.db.fetch_one(f"{self._select()} WHERE {self.ID} = %s", (entity_id,))
+        if row is None:
+            raise ValueError(f"{self.ENTITY.__name__} with ID {entity_id} not found")
+        return self._row_to_entity(row)
+
+    def get_by_parent(self, parent_id):
+        rows = self.db.fetch_all(f"{self._select()} WHERE {self.FOREIGN_KEY} = %s ORDER BY {self.ID}", (parent_id,))
+        return [self._row_to_entity(row) for row in rows]
+
+    def add(self, entity):
+        """Сохраняет сущность и возвращает её с назначенным базой идентификатором."""
+        return self.add_many([entity])[0]
+
+    def add_many(self, entities):
+        """Вставляет сущности одним запросом на порцию и возвращает их с идентификаторами, в том же порядке."""
+        rows = [entity.to_row()[1:] for entity in entities]
+        if not rows:
+            return []
+        from psycopg2.extras import execute_values
+        with self.db.transaction() as cursor:
+            ids = execute_values(cursor, f"INSERT INTO {self.TABLE} ({', '.join(self.COLUMNS)}) VALUES %s "
+                                         f"RETURNING {self.ID}", rows, page_size=self.BATCH_SIZE, fetch=True)
+        return [self.ENTITY.from_trusted(entity_id, *row) for (entity_id,), row in zip(ids, rows)]
+
+    def replace_by_id(self, entity_id, entity):
+        assignments = ', '.join(f"{column} = %s" for column in self.COLUMNS)
+        with self.db.transaction() as cursor:
+            cursor.execute(f"UPDATE {self.TABLE} SET {assignments} WHERE {self.ID} = %s",
+                           (*entity.to_row()[1:], entity_id))
+            return cursor.rowcount > 0
+
+    def delete_by_id(self, entity_id):
+        """Удаляет сущность; ValueError, если на неё ссылаются соглашения или платежи."""
+        from psycopg2 import errors
+        try:
+            self.db.execute_query(f"DELETE FROM {self.TABLE} WHERE {self.ID} = %s", (entity_id,))
+        except errors.ForeignKeyViolation as e:
+            raise ValueError(f"{self.ENTITY.__name__} with ID {entity_id} cannot be deleted: "
+                             f"{e.diag.message_detail}") from None
+
+    def iter_all(self, batch_size=1000):
+        for row in self.db.iter_rows(f"{self._select()} ORDER BY {self.ID}", batch_size=batch_size):
+            yield self._row_to_entity(row)
+
+    def get_count(self):
+        return self.db.fetch_one(f"SELECT COUNT(*) FROM {self.TABLE}")[0]
+
+    def close(self):
+        self.db.close()
+
+class PledgedItemPostgresRep(PawnshopPostgresRep):
+    TABLE = 'pledged_items'
+    ID = 'item_id'
+    FOREIGN_KEY = 'client_id'
+    COLUMNS = ('client_id', 'item_name', 'item_description', 'item_value', 'appraisal_date')
+    ENTITY = PledgedItem
+
+    def get_by_client_id(self, client_id):
+        return self.get_by_parent(client_id)
+
+class AgreementPostgresRep(PawnshopPostgresRep):
+    TABLE = 'agreements'
+    ID = 'agreement_id'
+    FOREIGN_KEY = 'pledged_item_id'
+    COLUMNS = ('pledged_item_id', 'loan_amount', 'commission', 'due_date', 'issue_date', 'status_agreements')
+    ENTITY = Agreement
+
+    def get_by_pledged_item_id(self, item_id):
+        return self.get_by_parent(item_id)
+
+    def get_by_client_id(self, client_id):
+        columns = ', '.join(f"a.{column}" for column in (self.ID, *self.COLUMNS))
+        rows = self.db.fetch_all(f"""
+            SELECT {columns}
+            FROM agreements a JOIN pledged_items i ON i.item_id = a.pledged_item_id
+            WHERE i.client_id = %s
+            ORDER BY a.agreement_id
+        """, (client_id,))
+        return [self._row_to_entity(row) for row in rows]
+
+    def set_status(self, agreement_id, status):
+        PawnshopValidator.check_status(status, Agreement.STATUSES)
+        self.db.execute_query("UPDATE agreements SET status_agreements = %s WHERE agreement_id = %s",
+                              (status, agreement_id))
+
+class PaymentSchedulePostgresRep(PawnshopPostgresRep):
+    TABLE = 'payment_schedules'
+    ID = 'payment_id'
+    FOREIGN_KEY = 'agreement_id'
+    COLUMNS = ('agreement_id', 'payment_date', 'payment_amount', 'status_payment', 'payment_type')
+    ENTITY = PaymentSchedule
+
+    def get_by_agreement_id(self, agreement_id):
+        return self.get_by_parent(agreement_id)
+
+    def set_status(self, payment_id, status):
+        PawnshopValidator.check_status(status, PaymentSchedule.STATUSES)
+        self.db.execute_query("UPDATE payment_schedules SET status_payment = %s WHERE payment_id = %s",
+                              (status, payment_id))
+
+    def mark_overdue(self, as_of=None):
+        """Переводит ожидаемые платежи с датой раньше as_of в просроченные и возвращает их число."""
+        with self.db.transaction() as cursor:
+            cursor.execute("""
+                UPDATE payment_schedules SET status_payment = %s
+                WHERE status_payment = %s AND payment_date < %s
+            """, (PaymentSchedule.OVERDUE, PaymentSchedule.PENDING, as_of or date.today()))
+            return cursor.rowcount
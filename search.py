@@ -0,0 +1,263 @@
+import re
+import bisect
+import heapq
+from collections import defaultdict
+
+_SPACES = re.compile(r'\s+')
+_NON_DIGITS = re.compile(r'\D')
+_NON_WORD = re.compile(r'[^\w\s]')
+
+def fold(text):
+    """Приводит ФИО к виду для поиска: без регистра, «ё» как «е», одиночные пробелы."""
+    text = _NON_WORD.sub(' ', (text or '').casefold().replace('ё', 'е'))
+    return _SPACES.sub(' ', text).strip()
+
+def digits(text):
+    return _NON_DIGITS.sub('', text or '')
+
+def normalize_phone(phone):
+    """Только цифры; российские номера с 8 в начале приводятся к 7, как +7."""
+    value = digits(phone)
+    if len(value) == 11 and value[0] == '8':
+        return '7' + value[1:]
+    return value
+
+def phone_candidates(query_digits):
+    """Нормализованные префиксы телефона: номер могут начать с 8, с 7 или сразу с кода оператора."""
+    candidates = {normalize_phone(query_digits)}
+    if len(query_digits) < 11:
+        candidates.add('7' + query_digits)
+        if query_digits[0] == '8':
+            candidates.add('7' + query_digits[1:])
+    return sorted(candidates)
+
+def trigrams(text):
+    """Триграммы в духе pg_trgm: каждое слово дополняется двумя пробелами спереди и одним сзади."""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return result
+
+class ClientSearchIndex:
+    """Индекс в памяти для поиска по ФИО (префиксы и триграммы слов), документу и телефону.
+
+    Обновляется по одному клиенту, поэтому его можно держать в актуальном состоянии при каждом изменении.
+    """
+    MIN_SIMILARITY = 0.3
+    EXACT, DOCUMENT_PREFIX, NAME_PREFIX, PHONE_PREFIX = 1.0, 0.9, 0.85, 0.8
+
+    def __init__(self, clients=()):
+        # client_id -> (ФИО для поиска, цифры документа, телефон)
+        self._entries = {}
+        # Слова ФИО повторяются у многих клиентов, поэтому триграммы строятся по словарю слов
+        self._token_clients = defaultdict(set)
+        self._gram_tokens = defaultdict(set)
+        self._token_grams = {}
+        # Отсортированные слова и пары (значение, client_id) для поиска по префиксу
+        self._tokens = []
+        self._documents = []
+        self._phones = []
+        for client in clients:
+            self.__add(client, bulk=True)
+        self._tokens.sort()
+        self._documents.sort()
+        self._phones.sort()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, client):
+        if client.get_client_id() in self._entries:
+            self.remove(client.get_client_id())
+        self.__add(client, bulk=False)
+
+    def __add(self, client, bulk):
+        client_id = client.get_client_id()
+        name = fold(client.get_fullname())
+        document = digits(client.get_document())
+        phone = normalize_phone(client.get_phone_number())
+        self._entries[client_id] = (name, document, phone)
+        insert = list.append if bulk else bisect.insort
+        for token in set(name.split()):
+            clients = self._token_clients[token]
+            if not clients:
+                grams = trigrams(token)
+                self._token_grams[token] = len(grams)
+                for gram in grams:
+                    self._gram_tokens[gram].add(token)
+                insert(self._tokens, token)
+            clients.add(client_id)
+        insert(self._documents, (document, client_id))
+        if phone:
+            insert(self._phones, (phone, client_id))
+
+    def remove(self, client_id):
+        entry = self._entries.pop(client_id, None)
+        if entry is None:
+            return
+        name, document, phone = entry
+        for token in set(name.split()):
+            clients = self._token_clients[token]
+            clients.discard(client_id)
+            if not clients:
+                del self._token_clients[token]
+                del self._token_grams[token]
+                for gram in trigrams(token):
+                    self._gram_tokens[gram].discard(token)
+                    if not self._gram_tokens[gram]:
+                        del self._gram_tokens[gram]
+                position = bisect.bisect_left(self._tokens, token)
+                del self._tokens[position]
+        self.__remove_pair(self._documents, document, client_id)
+        if phone:
+            self.__remove_pair(self._phones, phone, client_id)
+
+    @staticmethod
+    def __remove_pair(pairs, value, client_id):
+        position = bisect.bisect_left(pairs, (value, client_id))
+        if position < len(pairs) and pairs[position] == (value, client_id):
+            del pairs[position]
+
+    @staticmethod
+    def __with_prefix(values, prefix, key=lambda value: value):
+        position = bisect.bisect_left(values, (prefix,) if values and isinstance(values[0], tuple) else prefix)
+        while position < len(values) and key(values[position]).startswith(prefix):
+            yield values[position]
+            position += 1
+
+    def search(self, query, limit=10):
+        """Лучшие limit совпадений в виде [(оценка, client_id)] по убыванию оценки."""
+        scores = {}
+
+        def offer(client_id, score):
+            if score > scores.get(client_id, 0.0):
+                scores[client_id] = score
+
+        query_digits = digits(query)
+        if query_digits:
+            for document, client_id in self.__with_prefix(self._documents, query_digits, key=lambda pair: pair[0]):
+                offer(client_id, self.EXACT if document == query_digits else self.DOCUMENT_PREFIX)
+            for phone in phone_candidates(query_digits):
+                for value, client_id in self.__with_prefix(self._phones, phone, key=lambda pair: pair[0]):
+                    offer(client_id, self.EXACT if value == phone else self.PHONE_PREFIX)
+
+        name = fold(''.join(char for char in query if not char.isdigit()))
+        if name:
+            self.__search_name(name, offer)
+        return heapq.nlargest(limit, ((score, client_id) for client_id, score in scores.items()),
+                              key=lambda item: (item[0], -item[1]))
+
+    def __word_scores(self, word):
+        """client_id -> насколько word совпадает с лучшим словом его ФИО (1.0 — префикс)."""
+        scores = {}
+        for token in self.__with_prefix(self._tokens, word):
+            for client_id in self._token_clients[token]:
+                scores[client_id] = 1.0
+        # Опечатки: похожесть слова на слова ФИО по триграммам, как в pg_trgm
+        grams = trigrams(word)
+        common = defaultdict(int)
+        for gram in grams:
+            for token in self._gram_tokens.get(gram, ()):
+                common[token] += 1
+        for token, count in common.items():
+            similarity = count / (len(grams) + self._token_grams[token] - count)
+            if similarity < self.MIN_SIMILARITY:
+                continue
+            for client_id in self._token_clients[token]:
+                if similarity > scores.get(client_id, 0.0):
+                    scores[client_id] = similarity
+        return scores
+
+    def __search_name(self, name, offer):
+        words = name.split()
+        word_scores = [self.__word_scores(word) for word in words]
+        totals = defaultdict(float)
+        for scores in word_scores:
+            for client_id, score in scores.items():
+                totals[client_id] += score
+        for client_id, total in totals.items():
+            score = total / len(words)
+            if score < self.MIN_SIMILARITY:
+                continue
+            offer(client_id, self.EXACT if self._entries[client_id][0] == name else score * self.NAME_PREFIX)
+
+class PostgresClientSearch:
+    """Поиск клиентов средствами PostgreSQL: pg_trgm для опечаток в ФИО, B-tree для префиксов."""
+    # lower() в базе с локалью C не меняет кириллицу, поэтому она переводится в нижний регистр явно
+    _UPPER = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯё'
+    _LOWER = 'абвгдеежзийклмнопрстуфхцчшщъыьэюяе'
+    NAME = f"translate(lower(fullname), '{_UPPER}', '{_LOWER}')"
+    DOCUMENT = "replace(document, ' ', '')"
+    PHONE = "regexp_replace(regexp_replace(coalesce(phone_number, ''), '\\D', '', 'g'), '^8(\\d{10})$', '7\\1')"
+    INDEXES = (
+        f"CREATE INDEX IF NOT EXISTS clients_search_name ON clients (({NAME}) text_pattern_ops)",
+        f"CREATE INDEX IF NOT EXISTS clients_search_document ON clients (({DOCUMENT}) text_pattern_ops)",
+        f"CREATE INDEX IF NOT EXISTS clients_search_phone ON clients (({PHONE}) text_pattern_ops)",
+    )
+    TRIGRAM_INDEX = f"CREATE INDEX IF NOT EXISTS clients_search_name_trgm ON clients USING gin (({NAME}) gin_trgm_ops)"
+
+    def __init__(self, db):
+        self.db = db
+        self._trigram = None
+
+    def ensure_indexes(self):
+        """Создаёт индексы поиска; без расширения pg_trgm ФИО ищется только по префиксу."""
+        import psycopg2
+        for statement in self.INDEXES:
+            self.db.execute_query(statement)
+        try:
+            self.db.execute_query("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            self.db.execute_query(self.TRIGRAM_INDEX)
+        except psycopg2.Error:
+            self._trigram = False
+        else:
+            self._trigram = True
+
+    def has_trigram(self):
+        if self._trigram is None:
+            self._trigram = self.db.fetch_one("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'") is not None
+        return self._trigram
+
+    @staticmethod
+    def _like_prefix(value):
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+    def search(self, query, limit=10, columns="client_id, fullname, document"):
+        """Строки (columns..., score) лучших limit совпадений по убыванию оценки."""
+        query_digits = digits(query)
+        name = fold(''.join(char for char in query if not char.isdigit()))
+        conditions, scores = [], []
+        params = {'limit': limit}
+        if query_digits:
+            params.update(document=query_digits, document_prefix=self._like_prefix(query_digits))
+            conditions.append(f"{self.DOCUMENT} LIKE %(document_prefix)s")
+            scores.append(f"CASE WHEN {self.DOCUMENT} = %(document)s THEN {ClientSearchIndex.EXACT} "
+                          f"WHEN {self.DOCUMENT} LIKE %(document_prefix)s THEN {ClientSearchIndex.DOCUMENT_PREFIX} END")
+            # Отдельное условие на каждый вариант префикса, чтобы каждое шло по B-tree
+            for index, phone in enumerate(phone_candidates(query_digits)):
+                params.update({f'phone{index}': phone, f'phone_prefix{index}': self._like_prefix(phone)})
+                conditions.append(f"{self.PHONE} LIKE %(phone_prefix{index})s")
+                scores.append(f"CASE WHEN {self.PHONE} = %(phone{index})s THEN {ClientSearchIndex.EXACT} "
+                              f"WHEN {self.PHONE} LIKE %(phone_prefix{index})s THEN {ClientSearchIndex.PHONE_PREFIX} END")
+        if name:
+            params.update(name=name, name_prefix=self._like_prefix(name))
+            # Префикс ФИО ищется по B-tree, опечатки и совпадения внутри ФИО — по триграммному индексу
+            name_prefix = f"{self.NAME} LIKE %(name_prefix)s"
+            conditions.append(name_prefix)
+            scores.append(f"CASE WHEN {self.NAME} = %(name)s THEN {ClientSearchIndex.EXACT} "
+                          f"WHEN {name_prefix} THEN {ClientSearchIndex.NAME_PREFIX} END")
+            if self.has_trigram():
+                # Похожесть на лучшее слово ФИО, а не на всю строку: опечатка в фамилии не тонет в длинном ФИО
+                conditions.append(f"%(name)s <%% {self.NAME}")
+                scores.append(f"word_similarity(%(name)s, {self.NAME}) * {ClientSearchIndex.NAME_PREFIX}")
+        if not conditions:
+            return []
+        sql = f"""
+            SELECT {columns}, GREATEST({', '.join(scores)}) AS score
+            FROM clients
+            WHERE {' OR '.join(conditions)}
+            ORDER BY score DESC, client_id
+            LIMIT %(limit)s
+        """
+        return self.db.fetch_all(sql, params)
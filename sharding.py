@@ -0,0 +1,749 @@
+import os
+import json
+import heapq
+import threading
+from itertools import chain, islice
+from contextlib import contextmanager, ExitStack
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from BaseClient import BaseClient, BaseClient_Rep_Strategy
+from search import ClientSearchIndex
+from sorting import SortedView, parse_sort_keys
+
+# client_id распределяются по корзинам, корзины — по шардам; при решардинге переезжают корзины целиком
+BUCKETS = 256
+
+def bucket_of(client_id):
+    # Умножение Фибоначчи, как в DiskHashIndex: блок последовательных id расходится по всем корзинам
+    return ((client_id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 32 & (BUCKETS - 1)
+
+class FileRoutingIndex:
+    """Индекс маршрутизации в файле JSON Lines: документ -> client_id, счётчик блоков id и карта корзин.
+
+    Каждое изменение дописывается в конец файла строкой; при открытии файл проигрывается целиком,
+    а когда устаревших строк становится больше живых, он переписывается заново.
+    """
+    COMPACT_RATIO = 2
+    COMPACT_MIN_RECORDS = 10000
+
+    def __init__(self, filename, fsync=False):
+        self.filename = filename
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._block = 0
+        self._buckets = None
+        self._records = 0
+        if os.path.exists(filename):
+            self.__replay()
+        self._file = open(filename, 'a', encoding='utf-8')
+
+    def __replay(self):
+        with open(self.filename, 'rb') as file:
+            position = 0
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Строка, недописанная при сбое: отбрасывается вместе с остатком файла
+                    break
+                self.__apply(record)
+                self._records += 1
+                position += len(line)
+        if position != os.path.getsize(self.filename):
+            os.truncate(self.filename, position)
+
+    def __apply(self, record):
+        kind = record[0]
+        if kind == '+':
+            self._documents[record[1]] = record[2]
+        elif kind == '-':
+            if self._documents.get(record[1]) == record[2]:
+                del self._documents[record[1]]
+        elif kind == 'block':
+            self._block = max(self._block, record[1])
+        elif kind == 'buckets':
+            self._buckets = record[1]
+        elif kind == 'reset':
+            self._documents = {}
+
+    def __append(self, records):
+        if not records:
+            return
+        self._file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._records += len(records)
+        if self._records > max(self.COMPACT_MIN_RECORDS, self.COMPACT_RATIO * len(self._documents)):
+            self.__compact()
+
+    def __compact(self):
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            records = [['block', self._block]]
+            if self._buckets is not None:
+                records.append(['buckets', self._buckets])
+            records += (['+', document, client_id] for document, client_id in self._documents.items())
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self._file.close()
+        os.replace(tmp_filename, self.filename)
+        self._file = open(self.filename, 'a', encoding='utf-8')
+        self._records = len(self._documents) + 2
+
+    def owner(self, document):
+        with self._lock:
+            return self._documents.get(document)
+
+    def count(self):
+        with self._lock:
+            return len(self._documents)
+
+    def claim(self, document, client_id):
+        """Закрепляет документ за client_id; False, если документ уже закреплён (в том числе за этим же клиентом)."""
+        return bool(self.claim_many([(document, client_id)]))
+
+    def claim_many(self, pairs):
+        """Закрепляет свободные документы пар (документ, client_id); возвращает множество пар, закреплённых
+        этим вызовом. Уже существующие закрепления не возвращаются: отменять их вызывающий не должен."""
+        claimed, records = set(), []
+        with self._lock:
+            for document, client_id in pairs:
+                if document in self._documents:
+                    continue
+                self._documents[document] = client_id
+                records.append(['+', document, client_id])
+                claimed.add((document, client_id))
+            self.__append(records)
+        return claimed
+
+    def release(self, document, client_id):
+        self.release_many([(document, client_id)])
+
+    def release_many(self, pairs):
+        with self._lock:
+            records = []
+            for document, client_id in pairs:
+                if self._documents.get(document) == client_id:
+                    del self._documents[document]
+                    records.append(['-', document, client_id])
+            self.__append(records)
+
+    def reset(self, pairs):
+        """Заменяет все закрепления документов переданными парами."""
+        with self._lock:
+            self._documents = dict(pairs)
+            self.__append([['reset']] + [['+', document, client_id] for document, client_id in pairs])
+
+    def next_block(self):
+        with self._lock:
+            self._block += 1
+            self.__append([['block', self._block]])
+            return self._block
+
+    def reserve_block(self, block):
+        """Следующие блоки id будут выдаваться после block."""
+        with self._lock:
+            if block > self._block:
+                self._block = block
+                self.__append([['block', block]])
+
+    def get_buckets(self):
+        with self._lock:
+            return None if self._buckets is None else list(self._buckets)
+
+    def set_buckets(self, buckets):
+        with self._lock:
+            self._buckets = list(buckets)
+            self.__append([['buckets', self._buckets]])
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+class PostgresRoutingIndex:
+    """Индекс маршрутизации в отдельной базе PostgreSQL, общий для всех процессов, работающих с шардами.
+
+    Уникальность документа обеспечивает первичный ключ client_routes, блоки id выдаёт последовательность.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS client_routes (
+            document varchar PRIMARY KEY,
+            client_id integer NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS client_routes_client_id ON client_routes (client_id);
+        CREATE TABLE IF NOT EXISTS client_buckets (
+            bucket integer PRIMARY KEY,
+            shard integer NOT NULL
+        );
+        CREATE SEQUENCE IF NOT EXISTS client_id_blocks;
+    """
+    BATCH_SIZE = 1000
+
+    def __init__(self, db_config):
+        from database import DatabaseConnection
+        self.db = DatabaseConnection(db_config)
+        self.db.execute_query(self.SCHEMA)
+
+    def owner(self, document):
+        row = self.db.fetch_one("SELECT client_id FROM client_routes WHERE document = %s", (document,))
+        return row and row[0]
+
+    def count(self):
+        return self.db.fetch_one("SELECT count(*) FROM client_routes")[0]
+
+    def claim(self, document, client_id):
+        """Закрепляет документ за client_id; False, если документ уже закреплён (в том числе за этим же клиентом)."""
+        return bool(self.claim_many([(document, client_id)]))
+
+    def claim_many(self, pairs):
+        """Закрепляет свободные документы пар (документ, client_id); возвращает множество пар, закреплённых
+        этим вызовом."""
+        from psycopg2.extras import execute_values
+        # В одном INSERT документ должен встречаться один раз
+        pairs = list(dict(reversed(list(pairs))).items())
+        with self.db.transaction() as cursor:
+            claimed = set(map(tuple, execute_values(cursor, """
+                INSERT INTO client_routes (document, client_id) VALUES %s
+                ON CONFLICT (document) DO NOTHING
+                RETURNING document, client_id
+            """, pairs, page_size=self.BATCH_SIZE, fetch=True)))
+        return claimed
+
+    def release(self, document, client_id):
+        self.db.execute_query("DELETE FROM client_routes WHERE document = %s AND client_id = %s", (document, client_id))
+
+    def release_many(self, pairs):
+        from psycopg2.extras import execute_values
+        with self.db.transaction() as cursor:
+            execute_values(cursor, """
+                DELETE FROM client_routes AS r USING (VALUES %s) AS v(document, client_id)
+                WHERE r.document = v.document AND r.client_id = v.client_id
+            """, list(pairs), page_size=self.BATCH_SIZE)
+
+    def reset(self, pairs):
+        """Заменяет все закрепления документов переданными парами."""
+        from psycopg2.extras import execute_values
+        with self.db.transaction() as cursor:
+            cursor.execute("TRUNCATE client_routes")
+            execute_values(cursor, "INSERT INTO client_routes (document, client_id) VALUES %s",
+                           list(pairs), page_size=self.BATCH_SIZE)
+
+    def next_block(self):
+        # Через transaction(), а не fetch_one: изменение последовательности должно идти на основной сервер
+        with self.db.transaction() as cursor:
+            cursor.execute("SELECT nextval('client_id_blocks')")
+            return cursor.fetchone()[0]
+
+    def reserve_block(self, block):
+        """Следующие блоки id будут выдаваться после block."""
+        with self.db.transaction() as cursor:
+            cursor.execute("SELECT setval('client_id_blocks', GREATEST(last_value, %s)) FROM client_id_blocks",
+                           (max(block, 1),))
+
+    def get_buckets(self):
+        rows = self.db.fetch_all("SELECT shard FROM client_buckets ORDER BY bucket")
+        return [row[0] for row in rows] or None
+
+    def set_buckets(self, buckets):
+        from psycopg2.extras import execute_values
+        with self.db.transaction() as cursor:
+            execute_values(cursor, """
+                INSERT INTO client_buckets (bucket, shard) VALUES %s
+                ON CONFLICT (bucket) DO UPDATE SET shard = EXCLUDED.shard
+            """, list(enumerate(buckets)), page_size=self.BATCH_SIZE)
+
+    def close(self):
+        self.db.close()
+
+class BaseClientShardedRep(BaseClient_Rep_Strategy):
+    """Клиенты, разнесённые по нескольким хранилищам (шардам) по хешу client_id.
+
+    Шардом может быть любое хранилище: базы PostgreSQL, файлы JSON, YAML или binary. Индекс маршрутизации
+    (FileRoutingIndex или PostgresRoutingIndex) хранит владельца каждого документа, счётчик блоков id и
+    карту корзин. Чтения по нескольким шардам выполняются параллельно и сливаются; строки, оставшиеся
+    в шарде после прерванного переноса, в результаты не попадают.
+    """
+    # Блок id, который процесс получает у индекса маршрутизации за раз (схема hi/lo)
+    ID_BLOCK = 1000
+    # Сколько корзин переносится за один шаг решардинга
+    MOVE_STEP = 32
+
+    def __init__(self, shards, routing, workers=None):
+        self.shards = list(shards)
+        if not self.shards:
+            raise ValueError("At least one shard is required.")
+        self.routing = routing
+        self._workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers or len(self.shards),
+                                            thread_name_prefix='clients-shard')
+        self._executor_size = workers or len(self.shards)
+        # Запись клиента держит блокировку его корзины; решардинг держит блокировки переносимых корзин
+        self._bucket_locks = [threading.Lock() for _ in range(BUCKETS)]
+        # Файловые шарды не рассчитаны на одновременные вызовы: id(шард) -> блокировка его вызовов
+        self._shard_locks = {}
+        self._id_lock = threading.Lock()
+        self._next_id = self._id_end = 0
+        # (n, k) -> client_id последнего клиента страницы k при размере страницы n
+        self._page_boundaries = {}
+        # Действия для отмены изменений индекса маршрутизации внутри batch(); None вне пакета
+        self._batch_undo = None
+        buckets = routing.get_buckets()
+        if buckets is None:
+            # Первое открытие: корзины раскладываются по шардам по кругу, индекс строится по их содержимому
+            self._buckets = [bucket % len(self.shards) for bucket in range(BUCKETS)]
+            self.rebuild_routing()
+            routing.set_buckets(self._buckets)
+        elif len(buckets) != BUCKETS or max(buckets) >= len(self.shards):
+            raise ValueError(f"Routing index refers to {max(buckets) + 1} shards, {len(self.shards)} given; "
+                             f"use reshard() to change the number of shards.")
+        else:
+            self._buckets = buckets
+
+    def shard_index(self, client_id):
+        return self._buckets[bucket_of(client_id)]
+
+    def _shard_of(self, client_id):
+        return self.shards[self.shard_index(client_id)]
+
+    @contextmanager
+    def _using(self, shard):
+        """Вызовы шарда внутри блока; шарды без THREAD_SAFE вызываются по одному потоку за раз.
+
+        Блокировка шарда берётся после блокировок корзин, поэтому внутри блока корзины не блокируются.
+        """
+        if shard.THREAD_SAFE:
+            yield shard
+            return
+        with self._shard_locks.setdefault(id(shard), threading.RLock()):
+            yield shard
+
+    def _fan_out(self, function):
+        """function(номер шарда, шард) для всех шардов параллельно; результаты в порядке шардов."""
+        def call(index, shard):
+            with self._using(shard):
+                return function(index, shard)
+        return list(self._executor.map(call, range(len(self.shards)), self.shards))
+
+    def _owned(self, index, clients, buckets=None):
+        buckets = buckets or self._buckets
+        return [client for client in clients if buckets[bucket_of(client.get_client_id())] == index]
+
+    @contextmanager
+    def _locked(self, buckets):
+        with ExitStack() as stack:
+            # Порядок захвата одинаков у всех, поэтому взаимных блокировок нет
+            for bucket in sorted(set(buckets)):
+                stack.enter_context(self._bucket_locks[bucket])
+            yield
+
+    def _allocate_id(self):
+        with self._id_lock:
+            if self._next_id >= self._id_end:
+                block = self.routing.next_block()
+                self._next_id, self._id_end = (block - 1) * self.ID_BLOCK + 1, block * self.ID_BLOCK + 1
+            self._next_id += 1
+            return self._next_id - 1
+
+    def _reserve_ids(self, clients):
+        """Исключает client_id переданных клиентов из выдачи; вызывается до их записи в шарды."""
+        max_id = max((client.get_client_id() for client in clients), default=0)
+        if not max_id:
+            return
+        with self._id_lock:
+            self.routing.reserve_block(-(-max_id // self.ID_BLOCK))
+            # Полученный ранее блок мог пересечься с импортированными id: выдача продолжается после них
+            if self._next_id <= max_id:
+                self._next_id = max_id + 1
+
+    def _claim(self, document, client_id):
+        if not self.routing.claim(document, client_id):
+            raise ValueError("Client with this document already exists.")
+        if self._batch_undo is not None:
+            self._batch_undo.append(lambda: self.routing.release(document, client_id))
+
+    def _release(self, document, client_id):
+        self.routing.release(document, client_id)
+        if self._batch_undo is not None:
+            self._batch_undo.append(lambda: self.routing.claim(document, client_id))
+
+    def rebuild_routing(self):
+        """Строит индекс маршрутизации по содержимому шардов и переносит клиентов, лежащих не в своём шарде.
+
+        Нужен при первом открытии уже заполненных хранилищ или после потери индекса.
+        """
+        contents = self._fan_out(lambda index, shard: list(shard.iter_clients()))
+        owners = {}
+        for client in chain.from_iterable(contents):
+            owner = owners.setdefault(client.get_document(), client.get_client_id())
+            if owner != client.get_client_id():
+                raise ValueError(f"Document {client.get_document()} belongs to clients {owner} "
+                                 f"and {client.get_client_id()}.")
+        self.routing.reset(owners.items())
+        self._reserve_ids(chain.from_iterable(contents))
+        for index, clients in enumerate(contents):
+            misplaced = defaultdict(list)
+            for client in clients:
+                target = self.shard_index(client.get_client_id())
+                if target != index:
+                    misplaced[target].append(client)
+            if misplaced:
+                # Копия в шарде, которому корзина принадлежит по карте, новее оставшейся от переноса
+                self.__move(misplaced, replace=False)
+                self.__drop(self.shards[index], chain.from_iterable(misplaced.values()))
+
+    def __move(self, targets, replace=True):
+        """Копирует клиентов {номер шарда: [клиенты]} в их шарды.
+
+        Клиенты, уже лежащие в шарде, заменяются при replace (копии от прерванного переноса) и остаются
+        как есть без него.
+        """
+        for target, clients in targets.items():
+            with self._using(self.shards[target]) as shard:
+                for client, _ in shard.add_clients(clients):
+                    if replace:
+                        moved = shard.replace_by_id(client.get_client_id(), client)
+                    else:
+                        moved = self.__holds(shard, client.get_client_id())
+                    if not moved:
+                        raise ValueError(f"Cannot move client {client.get_client_id()}: its document is taken.")
+
+    @staticmethod
+    def __holds(shard, client_id):
+        try:
+            shard.get_by_id(client_id)
+        except ValueError:
+            return False
+        return True
+
+    def __drop(self, source, clients):
+        with self._using(source), source.batch():
+            for client in clients:
+                source.delete_by_id(client.get_client_id())
+
+    def reshard(self, shards, step=None):
+        """Переносит клиентов на новый набор шардов, не останавливая работу с репозиторием.
+
+        shards — новый список: оставшиеся шарды передаются теми же объектами, добавленные — новыми,
+        отсутствующие в нём опустошаются. Корзины переносятся по step штук: на время переноса блокируется
+        запись только в переносимые корзины, чтение продолжает идти из старого шарда до переключения карты.
+        Прерванный решардинг продолжается повторным вызовом с тем же списком. После него репозиторий
+        следует открывать с shards в новом порядке.
+        """
+        step = step or self.MOVE_STEP
+        shards = list(shards)
+        if not shards:
+            raise ValueError("At least one shard is required.")
+        # Временный общий список: старые шарды на своих местах, новые — в конце
+        positions = {id(shard): index for index, shard in enumerate(self.shards)}
+        combined = self.shards + [shard for shard in shards if id(shard) not in positions]
+        positions = {id(shard): index for index, shard in enumerate(combined)}
+        self.shards = combined
+        if len(combined) > self._executor_size and not self._workers:
+            self._executor.shutdown()
+            self._executor = ThreadPoolExecutor(max_workers=len(combined), thread_name_prefix='clients-shard')
+            self._executor_size = len(combined)
+
+        # Копии, оставшиеся в шардах от прерванного решардинга, удаляются до нового переноса
+        for index, shard in enumerate(self.shards):
+            with self._using(shard):
+                stale = [client for client in shard.iter_clients() if self.shard_index(client.get_client_id()) != index]
+            if stale:
+                self.__drop(shard, stale)
+
+        targets = [positions[id(shard)] for shard in shards]
+        moves = self.__plan(targets)
+        by_source = defaultdict(list)
+        for bucket, target in moves.items():
+            by_source[self._buckets[bucket]].append(bucket)
+        for source_index, buckets in by_source.items():
+            source = self.shards[source_index]
+            for start in range(0, len(buckets), step):
+                chunk = set(buckets[start:start + step])
+                with self._locked(chunk):
+                    copies = defaultdict(list)
+                    with self._using(source):
+                        for client in source.iter_clients():
+                            bucket = bucket_of(client.get_client_id())
+                            if bucket in chunk:
+                                copies[moves[bucket]].append(client)
+                    self.__move(copies)
+                    buckets_map = list(self._buckets)
+                    for bucket in chunk:
+                        buckets_map[bucket] = moves[bucket]
+                    # Сначала сохраняется карта, затем удаляются старые копии: при сбое между ними
+                    # лишние строки остаются в старом шарде и отфильтровываются при чтении
+                    self.routing.set_buckets(buckets_map)
+                    self._buckets = buckets_map
+                    self.__drop(source, chain.from_iterable(copies.values()))
+
+        # Номера шардов в карте приводятся к порядку нового списка
+        renumber = {position: index for index, position in enumerate(targets)}
+        buckets_map = [renumber[shard] for shard in self._buckets]
+        with self._locked(range(BUCKETS)):
+            self.routing.set_buckets(buckets_map)
+            self.shards, self._buckets = shards, buckets_map
+        self._page_boundaries.clear()
+
+    def __plan(self, targets):
+        """Корзина -> новый шард: поровну между targets, с наименьшим числом переносов."""
+        quota = {target: BUCKETS // len(targets) + (number < BUCKETS % len(targets))
+                 for number, target in enumerate(targets)}
+        moves, homeless = {}, []
+        for bucket, shard in enumerate(self._buckets):
+            if quota.get(shard, 0) > 0:
+                quota[shard] -= 1
+            else:
+                homeless.append(bucket)
+        free = chain.from_iterable([target] * count for target, count in quota.items())
+        for bucket, target in zip(homeless, free):
+            moves[bucket] = target
+        return moves
+
+    @property
+    def clients(self):
+        return self.read_all()
+
+    def read_all(self):
+        parts = self._fan_out(lambda index, shard: self._owned(index, shard.read_all()))
+        return sorted(chain.from_iterable(parts), key=BaseClient.get_client_id)
+
+    def save_all(self, data):
+        """Заменяет содержимое всех шардов; каждый шард получает своих клиентов и сохраняет их параллельно."""
+        data = list(data)
+        owners = {}
+        for client in data:
+            if owners.setdefault(client.get_document(), client.get_client_id()) != client.get_client_id():
+                raise ValueError("Client with this document already exists.")
+        parts = defaultdict(list)
+        for client in data:
+            parts[self.shard_index(client.get_client_id())].append(client)
+        self._reserve_ids(data)
+        with self._locked(range(BUCKETS)):
+            self.routing.reset(owners.items())
+            self._fan_out(lambda index, shard: shard.save_all(parts[index]))
+        self._page_boundaries.clear()
+
+    def add_client(self, fullname, document, age, phone_number, address, email):
+        new_client = BaseClient(self._allocate_id(), fullname, document, age, phone_number, address, email)
+        client_id = new_client.get_client_id()
+        with self._locked([bucket_of(client_id)]):
+            self._claim(document, client_id)
+            try:
+                with self._using(self._shard_of(client_id)) as shard:
+                    rejected = shard.add_clients([new_client])
+            except Exception:
+                self.routing.release(document, client_id)
+                raise
+            if rejected:
+                self.routing.release(document, client_id)
+                raise ValueError(rejected[0][1])
+        self._page_boundaries.clear()
+
+    def add_clients(self, clients):
+        """Добавляет готовых клиентов с их client_id: документы закрепляются в индексе одним вызовом,
+        шарды записывают свои части параллельно.
+
+        Возвращает список отклонённых клиентов в виде пар (клиент, причина).
+        """
+        clients = list(clients)
+        claimed = self.routing.claim_many([(client.get_document(), client.get_client_id()) for client in clients])
+        rejected, parts = [], defaultdict(list)
+        for client in clients:
+            if (client.get_document(), client.get_client_id()) in claimed:
+                parts[self.shard_index(client.get_client_id())].append(client)
+                claimed.discard((client.get_document(), client.get_client_id()))
+            else:
+                rejected.append((client, "Client with this document already exists."))
+        self._reserve_ids(chain.from_iterable(parts.values()))
+        with self._locked(bucket_of(client.get_client_id()) for client in clients):
+            results = self._fan_out(lambda index, shard: shard.add_clients(parts[index]) if parts[index] else [])
+        refused = list(chain.from_iterable(results))
+        # Снимаются только закрепления, сделанные этим вызовом: у отклонённых они новые по построению
+        released = {(client.get_document(), client.get_client_id()) for client, _ in refused}
+        if released:
+            self.routing.release_many(released)
+        if self._batch_undo is not None:
+            added = [(client.get_document(), client.get_client_id()) for client in chain.from_iterable(parts.values())]
+            added = [pair for pair in added if pair not in released]
+            self._batch_undo.append(lambda: self.routing.release_many(added))
+        self._page_boundaries.clear()
+        return rejected + refused
+
+    def replace_by_id(self, client_id, new_client):
+        """Заменяет данные клиента; client_id определяет шард, поэтому он сохраняется прежним."""
+        with self._locked([bucket_of(client_id)]), self._using(self._shard_of(client_id)) as shard:
+            try:
+                old_client = shard.get_by_id(client_id)
+            except ValueError:
+                return False
+            client = BaseClient.from_trusted(client_id, new_client.get_fullname(), new_client.get_document(),
+                                              new_client.get_age(), new_client.get_phone_number(),
+                                              new_client.get_address(), new_client.get_email())
+            document, old_document = client.get_document(), old_client.get_document()
+            if document != old_document:
+                self._claim(document, client_id)
+            try:
+                shard.replace_by_id(client_id, client)
+            except Exception:
+                if document != old_document:
+                    self.routing.release(document, client_id)
+                raise
+            if document != old_document:
+                self._release(old_document, client_id)
+        return True
+
+    def delete_by_id(self, client_id):
+        with self._locked([bucket_of(client_id)]), self._using(self._shard_of(client_id)) as shard:
+            try:
+                client = shard.get_by_id(client_id)
+            except ValueError:
+                return
+            shard.delete_by_id(client_id)
+            self._release(client.get_document(), client_id)
+        self._page_boundaries.clear()
+
+    @contextmanager
+    def batch(self):
+        """Пакет изменений: каждый шард записывает свою часть одной операцией при выходе из блока.
+
+        При исключении в блоке ничего не записывается, а закрепления документов в индексе отменяются.
+        Атомарность гарантируется в пределах шарда: ошибка записи одного шарда не отменяет уже
+        записанные другие. Пакет с файловыми шардами не следует выполнять одновременно с записью
+        из других потоков: пакет файлового хранилища общий для всех его пользователей.
+        """
+        if self._batch_undo is not None:
+            yield self
+            return
+        self._batch_undo = []
+        try:
+            with ExitStack() as stack:
+                for shard in self.shards:
+                    stack.enter_context(shard.batch())
+                yield self
+        except BaseException:
+            for undo in reversed(self._batch_undo):
+                undo()
+            raise
+        finally:
+            self._batch_undo = None
+
+    def get_by_id(self, client_id):
+        with self._using(self._shard_of(client_id)) as shard:
+            return shard.get_by_id(client_id)
+
+    def get_count(self):
+        """Число клиентов по индексу маршрутизации: у каждого клиента ровно один документ, а строки,
+        оставшиеся в старом шарде после переноса, в индексе не учитываются."""
+        return self.routing.count()
+
+    def get_short_page(self, n, after_id=None):
+        """n клиентов с client_id больше after_id: первые n своих клиентов каждого шарда, слитые по client_id."""
+        if n <= 0:
+            return []
+        buckets = self._buckets
+
+        def owned_page(index, shard):
+            # Чужие строки отбрасываются, поэтому шард дочитывается, пока не наберётся n своих
+            page, after = [], after_id
+            while True:
+                rows = shard.get_short_page(n, after)
+                page += [info for info in rows if buckets[bucket_of(info.get_client_id())] == index]
+                if len(rows) < n or len(page) >= n:
+                    return page[:n]
+                after = rows[-1].get_client_id()
+
+        pages = self._fan_out(owned_page)
+        return list(islice(heapq.merge(*pages, key=lambda info: info.get_client_id()), n))
+
+    def get_k_n_short_list(self, k, n):
+        """Страница k по n клиентов; границы пройденных страниц запоминаются, как в BaseClientPostgresRep."""
+        if k < 1:
+            return []
+        known = max((page for size, page in self._page_boundaries if size == n and page < k), default=0)
+        after_id = self._page_boundaries.get((n, known))
+        page = []
+        for number in range(known + 1, k + 1):
+            page = self.get_short_page(n, after_id)
+            if not page:
+                return []
+            after_id = page[-1].get_client_id()
+            self._page_boundaries[(n, number)] = after_id
+        return page
+
+    def search(self, query, limit=10):
+        """Лучшие совпадения каждого шарда заново ранжируются вместе, чтобы оценки были сравнимы."""
+        buckets = self._buckets
+        results = self._fan_out(lambda index, shard: self._owned(index, shard.search(query, limit), buckets))
+        candidates = {client.get_client_id(): client for client in chain.from_iterable(results)}
+        ranked = [client_id for _, client_id in ClientSearchIndex(candidates.values()).search(query, limit)]
+        # Кандидаты, найденные шардом по своим правилам (например, pg_trgm), но не набравшие оценки здесь
+        seen = set(ranked)
+        ranked += [client_id for client_id in candidates if client_id not in seen]
+        return [candidates[client_id] for client_id in ranked[:limit]]
+
+    def sort_by_field(self, *fields, offset=0, limit=None):
+        """Каждый шард отдаёт первые offset + limit своих клиентов в нужном порядке, результаты сливаются."""
+        key = SortedView(parse_sort_keys(fields)).key
+        end = None if limit is None else offset + limit
+        buckets = self._buckets
+
+        def owned_sorted(index, shard):
+            if end is None:
+                return self._owned(index, shard.sort_by_field(*fields), buckets)
+            # Как в get_short_page: шард дочитывается, пока не наберётся end своих клиентов
+            page, fetched = [], 0
+            while len(page) < end:
+                rows = shard.sort_by_field(*fields, offset=fetched, limit=end)
+                page += self._owned(index, rows, buckets)
+                fetched += len(rows)
+                if len(rows) < end:
+                    break
+            return page[:end]
+
+        pages = self._fan_out(owned_sorted)
+        return list(islice(heapq.merge(*pages, key=key), offset, end))
+
+    def iter_clients(self, batch_size=1000):
+        """Перебирает клиентов шард за шардом; потокобезопасные шарды читаются потоком, не целиком."""
+        for index, shard in enumerate(self.shards):
+            if shard.THREAD_SAFE:
+                clients = shard.iter_clients(batch_size)
+            else:
+                # Между порциями вызывающий может сам изменять репозиторий, поэтому шард читается сразу
+                with self._using(shard):
+                    clients = list(shard.iter_clients(batch_size))
+            for client in clients:
+                if self._buckets[bucket_of(client.get_client_id())] == index:
+                    yield client
+
+    def close(self):
+        self._executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+        self.routing.close()
+
+def create_sharded_repository(config, **options):
+    """Шардированное хранилище по настройкам config.load_config().
+
+    config['shards'] — список настроек шардов ({'backend': 'json', 'filename': ...} или {'db': {...}});
+    недостающие параметры подключения берутся из config['db']. config['routing'] — {'filename': ...} для
+    индекса в файле или {'db': {...}} для индекса в PostgreSQL.
+    """
+    from backends import BACKENDS
+    shards = []
+    for shard in config.get('shards') or ():
+        shards.append(BACKENDS.create({'backend': shard.get('backend', 'postgres'),
+                                       'filename': shard.get('filename'),
+                                       'db': dict(config['db'], **shard.get('db', {})),
+                                       'replicas': shard.get('replicas', [])}))
+    routing = config.get('routing') or {}
+    if routing.get('filename'):
+        index = FileRoutingIndex(routing['filename'], fsync=routing.get('fsync', False))
+    else:
+        index = PostgresRoutingIndex(dict(config['db'], **routing.get('db', {})))
+    return BaseClientShardedRep(shards, index, **options)
@@ -0,0 +1,139 @@
+import bisect
+
+# Поля, по которым можно сортировать, и методы BaseClient, возвращающие их значения
+FIELDS = {
+    'client_id': 'get_client_id',
+    'fullname': 'get_fullname',
+    'document': 'get_document',
+    'age': 'get_age',
+    'phone_number': 'get_phone_number',
+    'address': 'get_address',
+    'email': 'get_email',
+}
+TEXT_FIELDS = ('fullname', 'document', 'phone_number', 'address', 'email')
+
+_UPPER = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+_LOWER = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+def collation_key(text):
+    """Ключ сравнения строк без учёта регистра, где «ё» идёт как «е» (при равенстве — после неё), а не после «я»."""
+    lowered = text.lower()
+    return (lowered.replace('ё', 'е'), lowered, text)
+
+def parse_sort_keys(fields):
+    """Приводит ('fullname', '-age', ('email', 'desc')) к кортежу пар (поле, по убыванию).
+
+    В конец добавляется client_id, чтобы порядок был полным и одинаковым во всех хранилищах.
+    """
+    keys = []
+    for field in fields:
+        if isinstance(field, str):
+            name, descending = field.lstrip('+-'), field.startswith('-')
+        else:
+            name, direction = field
+            if direction.lower() not in ('asc', 'desc'):
+                raise ValueError(f"Unknown sort direction: {direction}")
+            descending = direction.lower() == 'desc'
+        if name not in FIELDS:
+            raise ValueError(f"Unknown sort field: {name}")
+        keys.append((name, descending))
+    if all(name != 'client_id' for name, _ in keys):
+        keys.append(('client_id', False))
+    return tuple(keys)
+
+def order_by_sql(keys):
+    """ORDER BY для PostgreSQL с тем же порядком, что и у collation_key; пустые значения — в конце.
+
+    lower() в базе с локалью C не меняет кириллицу, поэтому регистр и «ё» приводятся через translate().
+    Имена полей берутся только из FIELDS, поэтому подставляются в текст запроса напрямую.
+    """
+    terms = []
+    for name, descending in keys:
+        direction = "DESC" if descending else "ASC"
+        if name in TEXT_FIELDS:
+            expressions = (f"translate(lower({name}), '{_UPPER}ё', '{_LOWER.replace('ё', 'е')}е')",
+                           f"translate(lower({name}), '{_UPPER}', '{_LOWER}')",
+                           name)
+            terms += [f'{expression} COLLATE "C" {direction} NULLS LAST' for expression in expressions]
+        else:
+            terms.append(f"{name} {direction} NULLS LAST")
+    return ', '.join(terms)
+
+class _Descending:
+    """Обёртка, обращающая сравнение значения."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+class SortedView:
+    """Клиенты в порядке ключей keys: отсортированный список пар (ключ, client_id).
+
+    При изменениях клиент вставляется и удаляется бинарным поиском, а не пересортировкой всего списка.
+    """
+
+    def __init__(self, keys, clients=()):
+        self.keys = keys
+        self._getters = [(FIELDS[name], name in TEXT_FIELDS, descending) for name, descending in keys]
+        self._entries = sorted((self.key(client), client.get_client_id()) for client in clients)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, client):
+        key = []
+        for getter, text, descending in self._getters:
+            value = getattr(client, getter)()
+            if value is None:
+                # Пустые значения в конце при любом направлении, как NULLS LAST
+                key.append((True, None))
+                continue
+            if text:
+                value = collation_key(value)
+            key.append((False, _Descending(value) if descending else value))
+        return tuple(key)
+
+    def add(self, client):
+        bisect.insort(self._entries, (self.key(client), client.get_client_id()))
+
+    def remove(self, client):
+        entry = (self.key(client), client.get_client_id())
+        position = bisect.bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def page(self, offset=0, limit=None):
+        end = None if limit is None else offset + limit
+        return [client_id for _, client_id in self._entries[offset:end]]
+
+class SortedViews:
+    """Несколько последних запрошенных порядков сортировки одного хранилища."""
+    MAX_VIEWS = 4
+
+    def __init__(self):
+        self._views = {}
+
+    def get(self, keys, clients):
+        """Представление для keys; если его нет, оно строится из clients."""
+        view = self._views.pop(keys, None)
+        if view is None:
+            if len(self._views) >= self.MAX_VIEWS:
+                del self._views[next(iter(self._views))]
+            view = SortedView(keys, clients)
+        # Последний запрошенный порядок вытесняется последним
+        self._views[keys] = view
+        return view
+
+    def add(self, client):
+        for view in self._views.values():
+            view.add(client)
+
+    def remove(self, client):
+        for view in self._views.values():
+            view.remove(client)
@@ -0,0 +1,39 @@
+import pytest
+from BaseClient import BaseClient, BaseClient_Rep_Binary, BaseClient_Rep_Json
+
+
+def make_client(client_id, document=None):
+    return BaseClient(client_id, f"Client {client_id}", document or f"{client_id:04d} {client_id:06d}", 30,
+                      "89991234567", "Moscow", f"client{client_id}@example.com")
+
+
+@pytest.fixture(params=['json', 'binary'])
+def repository(request, tmp_path):
+    if request.param == 'json':
+        repository = BaseClient_Rep_Json(str(tmp_path / "clients.json"))
+    else:
+        repository = BaseClient_Rep_Binary(str(tmp_path / "clients.bin"))
+    repository.add_clients([make_client(1), make_client(2)])
+    yield repository
+    repository.close()
+
+
+def test_replace_by_id_rejects_taken_client_id(repository):
+    with pytest.raises(ValueError, match="ID already exists"):
+        repository.replace_by_id(1, make_client(2, "9999 000001"))
+
+    assert repository.get_by_id(1).get_document() == make_client(1).get_document()
+    assert repository.get_by_id(2).get_document() == make_client(2).get_document()
+    # Документ второго клиента по-прежнему занят им, а не освобождён
+    with pytest.raises(ValueError, match="document already exists"):
+        repository.add_client("Copy", make_client(2).get_document(), 30, "89991234567", "Moscow", "c@example.com")
+
+
+def test_replace_by_id_can_move_client_to_free_id(repository):
+    assert repository.replace_by_id(1, make_client(3, "9999 000001"))
+
+    with pytest.raises(ValueError):
+        repository.get_by_id(1)
+    assert repository.get_by_id(3).get_document() == "9999 000001"
+    repository.add_client("Reuse", make_client(1).get_document(), 30, "89991234567", "Moscow", "r@example.com")
+    assert repository.get_count() == 3
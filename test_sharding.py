@@ -0,0 +1,106 @@
+import pytest
+from BaseClient import BaseClient, BaseClient_Rep_Binary, BaseClient_Rep_Json
+from sharding import BaseClientShardedRep, FileRoutingIndex
+
+
+def make_client(client_id):
+    return BaseClient(client_id, f"Client {client_id}", f"{client_id:04d} {client_id:06d}", 30,
+                      "89991234567", "Moscow", f"client{client_id}@example.com")
+
+
+def make_repository(tmp_path, shards=2, **options):
+    return BaseClientShardedRep([BaseClient_Rep_Binary(str(tmp_path / f"shard{index}.bin")) for index in range(shards)],
+                                FileRoutingIndex(str(tmp_path / "routing.jsonl")), **options)
+
+
+def all_pages(repository, n):
+    ids, after_id = [], None
+    while True:
+        page = repository.get_short_page(n, after_id)
+        if not page:
+            return ids
+        ids += [info.get_client_id() for info in page]
+        after_id = ids[-1]
+
+
+def test_add_client_after_bulk_import_into_cached_block(tmp_path):
+    repository = make_repository(tmp_path)
+    repository.add_client("First", "1000 000001", 30, "89991234567", "Moscow", "first@example.com")
+    first_id = repository.get_short_page(1)[0].get_client_id()
+
+    # Импортированные id попадают в блок, уже полученный процессом
+    assert repository.add_clients([make_client(first_id + offset) for offset in range(1, 50)]) == []
+    repository.add_client("Second", "1000 000002", 30, "89991234567", "Moscow", "second@example.com")
+    repository.save_all(repository.read_all() + [make_client(first_id + 100)])
+    repository.add_client("Third", "1000 000003", 30, "89991234567", "Moscow", "third@example.com")
+
+    ids = [client.get_client_id() for client in repository.read_all()]
+    assert len(ids) == len(set(ids)) == 53
+    assert max(ids) == first_id + 101
+    repository.close()
+
+
+def test_paging_skips_nothing_during_interrupted_reshard(tmp_path, monkeypatch):
+    repository = make_repository(tmp_path)
+    repository.add_clients([make_client(client_id) for client_id in range(1, 301)])
+    new_shard = BaseClient_Rep_Json(str(tmp_path / "shard2.json"))
+
+    def interrupted_drop(self, source, clients):
+        raise RuntimeError("interrupted")
+
+    # Первая порция корзин скопирована и карта переключена, но старые копии не удалены
+    monkeypatch.setattr(BaseClientShardedRep, '_BaseClientShardedRep__drop', interrupted_drop)
+    with pytest.raises(RuntimeError):
+        repository.reshard(repository.shards + [new_shard], step=8)
+    monkeypatch.undo()
+    stale = sum(shard.get_count() for shard in repository.shards) - 300
+    assert stale > 0
+
+    expected = list(range(1, 301))
+    assert repository.get_count() == 300
+    for n in (1, 7, 50):
+        assert all_pages(repository, n) == expected
+    assert [client.get_client_id() for client in repository.sort_by_field('client_id', offset=10, limit=20)] == \
+        expected[10:30]
+    assert [client.get_client_id() for client in repository.read_all()] == expected
+
+    repository.reshard(repository.shards, step=8)
+    assert all_pages(repository, 50) == expected
+    for index, shard in enumerate(repository.shards):
+        assert all(repository.shard_index(client.get_client_id()) == index for client in shard.iter_clients())
+    repository.close()
+
+
+def test_batch_rollback_restores_shards_and_routing(tmp_path):
+    repository = make_repository(tmp_path)
+    repository.add_clients([make_client(client_id) for client_id in range(1, 11)])
+    with pytest.raises(RuntimeError):
+        with repository.batch():
+            repository.add_client("New", "2000 000001", 30, "89991234567", "Moscow", "new@example.com")
+            repository.add_clients([make_client(client_id) for client_id in range(11, 21)])
+            repository.delete_by_id(1)
+            raise RuntimeError("rollback")
+
+    assert repository.get_count() == 10
+    assert [client.get_client_id() for client in repository.read_all()] == list(range(1, 11))
+    assert repository.get_by_id(1).get_document() == make_client(1).get_document()
+    # Документы отменённых клиентов снова свободны, а удаление первого клиента отменено
+    repository.add_client("New", "2000 000001", 30, "89991234567", "Moscow", "new@example.com")
+    assert repository.add_clients([make_client(11)]) == []
+    assert repository.routing.owner(make_client(1).get_document()) == 1
+    repository.close()
+
+
+def test_re_adding_existing_client_keeps_its_route(tmp_path):
+    repository = make_repository(tmp_path)
+    client = make_client(1)
+    assert repository.add_clients([client]) == []
+    # Повтор той же порции, например при продолжении импорта после сбоя
+    rejected = repository.add_clients([client, make_client(2)])
+    assert [rejected_client.get_client_id() for rejected_client, _ in rejected] == [1]
+
+    assert repository.get_count() == 2
+    assert repository.routing.owner(client.get_document()) == 1
+    with pytest.raises(ValueError):
+        repository.add_client("Copy", client.get_document(), 30, "89991234567", "Moscow", "copy@example.com")
+    repository.close()
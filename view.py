@@ -1,42 +1,228 @@
+import bisect
 import tkinter as tk
 from tkinter import ttk, Toplevel
+from change_feed import ClientDelta
+from sorting import collation_key
 
 class ClientView:
+    COLUMNS = ("ID", "Full Name", "Document")
+    # Сколько строк держать в Treeview сверх видимых, чтобы прокрутка не мигала
+    OVERSCAN = 5
+    SEARCH_DELAY_MS = 250
+
     def __init__(self, root):
         self.root = root
         self.root.title("Client Database Viewer")
 
-        self.tree = ttk.Treeview(self.root, columns=("ID", "Full Name", "Document"), show="headings")
-        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.status = tk.Label(self.root, anchor=tk.W)
+        # Постоянное сообщение строки состояния, видимое, пока ничего не загружается
+        self.notice = ""
+        self.status.pack(side=tk.BOTTOM, fill=tk.X)
+
+        self.search_entry = tk.Entry(self.root)
+        self.search_entry.pack(fill=tk.X)
+        self.search_entry.bind("<KeyRelease>", self.on_search_changed)
+
+        frame = tk.Frame(self.root)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        self.tree = ttk.Treeview(frame, columns=self.COLUMNS, show="headings", selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        for index, column in enumerate(self.COLUMNS):
+            self.tree.heading(column, text=column, command=lambda index=index: self.sort_by(index))
 
-        self.tree.heading("ID", text="ID")
-        self.tree.heading("Full Name", text="Full Name")
-        self.tree.heading("Document", text="Document")
-        
         self.tree.bind("<ButtonRelease-1>", self.on_client_select)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_rows(-1 if event.delta > 0 else 1))
+        self.tree.bind("<Button-4>", lambda event: self.scroll_rows(-1))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_rows(1))
+        self.tree.bind("<Prior>", lambda event: self.scroll_rows(-self.visible_rows))
+        self.tree.bind("<Next>", lambda event: self.scroll_rows(self.visible_rows))
+
+        # Все строки хранятся кортежами (client_id, fullname, document);
+        # в Treeview создаются элементы только для видимого окна
+        self.rows = {}
+        self.order = []
+        self.offset = 0
+        self.visible_rows = 20
+        self.sort_column = None
+        self.sort_descending = False
+        self.selected_id = None
+        # Значения, которые сейчас показаны в Treeview, по iid
+        self._rendered = {}
+        # Пока показаны результаты поиска, новые клиенты из ленты изменений в таблицу не добавляются
+        self.searching = False
+        self._search_job = None
 
         self.details_window = None
 
     def display_clients(self, clients):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+        """Применяет новый набор строк как разницу по client_id, не пересоздавая таблицу."""
+        self.searching = False
+        self.rows = {row[0]: tuple(row[:3]) for row in clients}
+        if self.sort_column is None:
+            self.order = list(self.rows)
+        else:
+            self.order = sorted(self.rows, key=self._sort_key, reverse=self.sort_descending)
+        self._render()
+
+    def show_search_results(self, clients):
+        """Показывает найденные строки в порядке релевантности."""
+        self.rows = {row[0]: tuple(row[:3]) for row in clients}
+        self.order = list(self.rows)
+        self.searching = True
+        self.sort_column = None
+        self.sort_descending = False
+        for name in self.COLUMNS:
+            self.tree.heading(name, text=name)
+        self.offset = 0
+        self._render()
+
+    def on_search_changed(self, event=None):
+        # Запрос уходит, когда пользователь перестал печатать, а не на каждую клавишу
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(self.SEARCH_DELAY_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_job = None
+        self.controller.search_clients(self.search_entry.get())
+
+    def apply_delta(self, delta):
+        if self.searching and delta.client_id not in self.rows:
+            return
+        if delta.op == ClientDelta.DELETE:
+            if self.rows.pop(delta.client_id, None) is not None:
+                self.order.remove(delta.client_id)
+        else:
+            if delta.client_id in self.rows:
+                self.order.remove(delta.client_id)
+            self.rows[delta.client_id] = tuple(delta.row[:3])
+            self._insert_ordered(delta.client_id)
+        self._render()
 
-        for row in clients:
-            self.tree.insert("", tk.END, values=(row[0], row[1], row[2]))
+    def _insert_ordered(self, client_id):
+        if self.sort_column is None:
+            self.order.append(client_id)
+        elif self.sort_descending:
+            # bisect работает только с возрастающим порядком
+            keys = [self._sort_key(other) for other in reversed(self.order)]
+            position = len(self.order) - bisect.bisect_right(keys, self._sort_key(client_id))
+            self.order.insert(position, client_id)
+        else:
+            bisect.insort(self.order, client_id, key=self._sort_key)
+
+    def _sort_key(self, client_id):
+        value = self.rows[client_id][self.sort_column]
+        return collation_key(value) if isinstance(value, str) else value
+
+    def sort_by(self, column):
+        """Сортирует загруженные строки по столбцу; повторный щелчок меняет направление."""
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        self.order.sort(key=self._sort_key, reverse=self.sort_descending)
+        for index, name in enumerate(self.COLUMNS):
+            arrow = (" ▼" if self.sort_descending else " ▲") if index == column else ""
+            self.tree.heading(name, text=name + arrow)
+        self.offset = 0
+        self._render()
+
+    def on_resize(self, event):
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or 20
+        # Заголовок занимает примерно одну строку
+        visible_rows = max(1, event.height // int(row_height) - 1)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self._render()
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == tk.MOVETO:
+            self.offset = int(float(amount) * len(self.order))
+            self._render()
+        elif unit == tk.PAGES:
+            self.scroll_rows(int(amount) * self.visible_rows)
+        else:
+            self.scroll_rows(int(amount))
+
+    def scroll_rows(self, count):
+        self.offset += count
+        self._render()
+        return "break"
+
+    def _render(self):
+        """Приводит элементы Treeview к текущему окну строк, трогая только изменившиеся."""
+        total = len(self.order)
+        self.offset = max(0, min(self.offset, total - self.visible_rows))
+        window = self.order[self.offset:self.offset + self.visible_rows + self.OVERSCAN]
+        wanted = {str(client_id) for client_id in window}
+        stale = [iid for iid in self.tree.get_children() if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self._rendered[iid]
+        for index, client_id in enumerate(window):
+            iid = str(client_id)
+            values = self.rows[client_id]
+            if iid not in self._rendered:
+                self.tree.insert("", index, iid=iid, values=values)
+                self._rendered[iid] = values
+                continue
+            if self._rendered[iid] != values:
+                self.tree.item(iid, values=values)
+                self._rendered[iid] = values
+            if self.tree.index(iid) != index:
+                self.tree.move(iid, "", index)
+        if self.selected_id is not None and str(self.selected_id) in wanted:
+            self.tree.selection_set(str(self.selected_id))
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
 
     def on_client_select(self, event):
         selected_item = self.tree.selection()
         if not selected_item:
             return
         
-        client_id = self.tree.item(selected_item[0])["values"][0]
-        self.show_client_details(client_id)
+        client_id = int(selected_item[0])
+        self.selected_id = client_id
+        self.controller.select_client(client_id)
 
-    def show_client_details(self, client_id):
+    def get_neighbour_ids(self, client_id, count):
+        """client_id строк, стоящих в текущем порядке не дальше count позиций от client_id."""
+        try:
+            position = self.order.index(client_id)
+        except ValueError:
+            return []
+        return (self.order[position + 1:position + 1 + count]
+                + self.order[max(0, position - count):position][::-1])
+
+    def set_loading(self, loading):
+        self.status.config(text="Loading..." if loading else self.notice)
+        self.root.config(cursor="watch" if loading else "")
+
+    def show_error(self, message):
+        self.status.config(text=f"Error: {message}")
+
+    def show_notice(self, message):
+        self.notice = message
+        self.status.config(text=message)
+
+    def show_client_details(self, client_id, client_details):
         if self.details_window:
             self.details_window.destroy()
+            self.details_window = None
 
-        client_details = self.get_client_details(client_id)
+        if client_details is None:
+            # Клиента удалили, пока данные загружались в фоне; повторный запрос заблокировал бы поток Tk
+            self.show_error("Client not found")
+            return
 
         self.details_window = Toplevel(self.root)
         self.details_window.title("Client Details")
@@ -46,8 +232,10 @@ class ClientView:
             label = tk.Label(self.details_window, text=f"{labels[idx]}: {detail}")
             label.pack(pady=5)
 
-    def get_client_details(self, client_id):
-        return self.controller.get_full_client_info(client_id)
-
-    def update(self):
-        self.controller.load_clients()
+    def update(self, delta=None):
+        # Уведомления приходят из потока подписки, а с виджетами работаем только в потоке Tk
+        if delta is None:
+            # Полное обновление при открытом поиске повторяет поиск, а не сбрасывает его
+            self.root.after(0, lambda: self._run_search() if self.searching else self.controller.load_clients())
+        else:
+            self.root.after(0, self.apply_delta, delta)